@@ -0,0 +1,161 @@
+"""Сборка бота: диспетчер с роутерами и middleware, запуск и остановка сервисов.
+
+Общая для обычного запуска (main.py) и процессов-воркеров (utils/sharding.py).
+Время каждой фазы старта пишется в utils.startup.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import User
+from aiohttp import web
+
+from core.config import (
+    ADMIN_IDS, BOT_API_CHAT_BURST, BOT_API_CHAT_RATE, BOT_API_MAX_RETRIES, BOT_API_RATE, BOT_API_URL,
+    BOT_TOKEN, FAST_START, METRICS_HOST, METRICS_PORT, PHOTO_WARMUP_CHAT_ID,
+)
+from database.catalog import catalog
+from database.db import init_db, pool
+from database.fsm_storage import create_storage
+from database.order_writer import order_writer
+from handlers.user_handlers import router as user_router
+from middlewares.dedup import setup_dedup
+from middlewares.metrics import setup_metrics
+from utils.broadcast import broadcaster
+from utils.images import images
+from utils.metrics import start_metrics_server
+from utils.photos import photos
+from utils.rate_limiter import RateLimiter
+from utils.startup import startup
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Фоновые задачи старта (ссылки держат их от сборщика мусора до конца работы)
+_background: Set[asyncio.Task] = set()
+
+
+def setup_logging(fmt: str = LOG_FORMAT):
+    logging.basicConfig(level=logging.INFO, format=fmt)
+
+
+def create_bot() -> Bot:
+    # Инициализация бота с токеном из .env (и своим сервером Bot API, если задан)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_URL)) if BOT_API_URL else None
+    return Bot(token=BOT_TOKEN, session=session)
+
+
+def routers() -> List[Router]:
+    """Роутеры бота по порядку подключения.
+
+    Админ-роутер (Admin идет первым, чтобы админ-команды перехватывались им)
+    импортируется, только если заданы ADMIN_IDS: без админов он не нужен, и
+    модуль со всеми его зависимостями не загружается при старте.
+    """
+    if not ADMIN_IDS:
+        return [user_router]
+    from handlers.admin_handlers import router as admin_router
+    return [admin_router, user_router]
+
+
+def used_update_types() -> List[str]:
+    """Типы апдейтов, на которые есть обработчики (для allowed_updates)."""
+    return sorted({update_type for router in routers() for update_type in router.resolve_used_update_types()})
+
+
+def create_dispatcher(bot: Bot, api_rate: float = BOT_API_RATE) -> Dispatcher:
+    # Постоянное хранилище FSM (выбирается через FSM_STORAGE в .env), диалоги переживают рестарт
+    dp = Dispatcher(storage=create_storage(pool))
+    # Метрики подключаются первыми: время Bot API включает ожидание в планировщике
+    setup_metrics(dp, bot)
+    # Повторные доставки апдейтов и двойные нажатия отсекаются до обработчиков
+    setup_dedup(dp)
+    # Все исходящие запросы идут через общий планировщик с лимитами Telegram
+    bot.session.middleware(RateLimiter(
+        global_rate=api_rate, chat_rate=BOT_API_CHAT_RATE, chat_burst=BOT_API_CHAT_BURST,
+        max_retries=BOT_API_MAX_RETRIES, admin_chats=ADMIN_IDS,
+    ))
+
+    dp.include_routers(*routers())
+    return dp
+
+
+def _finished(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Startup task failed: {task.exception()!r}")
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+async def _warm_up(bot: Bot, primary: bool):
+    # Кэши каталога и file_id фото загружаются одновременно; дальше просмотр товаров идет без SQL
+    await asyncio.gather(startup.timed("catalog cache", catalog.load()), startup.timed("photo ids", photos.load()))
+    if primary:
+        # Фото каталога сжимаются в пуле процессов и загружаются в Telegram в фоне, не задерживая старт
+        products = await catalog.get_products()
+        photos.schedule_prepare(products)
+        if PHOTO_WARMUP_CHAT_ID:
+            _spawn(photos.warm_up(bot, PHOTO_WARMUP_CHAT_ID, products))
+
+
+async def start_services(bot: Bot, primary: bool = True, metrics_port: int = METRICS_PORT,
+                         fast: bool = FAST_START) -> Optional[web.AppRunner]:
+    """Открывает базу, прогревает кэши и запускает фоновые задачи.
+
+    primary=False — один из нескольких воркеров: очередь рассылок и прогрев
+    фото ведет только основной процесс. fast=True — кэши прогреваются в фоне,
+    а бот уже принимает апдейты (до загрузки каталог читается из базы).
+    Возвращает сервер /metrics (или None).
+    """
+    # Открываем пул соединений и проверяем схему базы SQLite
+    async with startup.phase("database"):
+        await pool.open()
+        await init_db()
+    logging.info("Database initialized successfully.")
+
+    warm_up = _spawn(_warm_up(bot, primary))
+    order_writer.start()
+    metrics_runner = await start_metrics_server(METRICS_HOST, metrics_port) if metrics_port else None
+    if primary:
+        # Очередь рассылок, включая прерванные прошлым запуском
+        broadcaster.start(bot)
+    if not fast:
+        await warm_up
+    return metrics_runner
+
+
+async def start_bot(bot: Bot, polling: bool = True) -> Tuple[Optional[web.AppRunner], User]:
+    """Старт одного процесса: база и кэши готовятся одновременно с запросами к Bot API.
+
+    bot.me() кэширует ответ, поэтому start_polling не делает второй getMe.
+    polling=True — перед long polling сбрасывается вебхук. Возвращает сервер
+    /metrics (или None) и профиль бота.
+    """
+    calls = [startup.timed("get_me", bot.me())]
+    if polling:
+        calls.append(startup.timed("delete_webhook", bot.delete_webhook(drop_pending_updates=True)))
+    metrics_runner, bot_info, *_ = await asyncio.gather(start_services(bot), *calls)
+    startup.ready()
+    logging.info("Startup time by phase:\n" + startup.report())
+    return metrics_runner, bot_info
+
+
+async def stop_services(metrics_runner: Optional[web.AppRunner]):
+    # Прогрев, который еще идет, прерывается: пул соединений сейчас закроется
+    for task in list(_background):
+        task.cancel()
+    # Останавливаем рассылку (прогресс сохранен), дописываем очередь заказов, затем закрываем соединения
+    await broadcaster.close()
+    await order_writer.close()
+    await images.close()
+    await pool.close()
+    if metrics_runner:
+        await metrics_runner.cleanup()
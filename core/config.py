@@ -5,3 +5,83 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
+
+# Файл базы SQLite
+DB_PATH = os.getenv("DB_PATH", "shop.sqlite3")
+# Количество соединений-читателей в пуле SQLite
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+
+# Сколько секунд держится бронь товара между нажатием "Купить" и вводом адреса
+RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", "900"))
+
+# Количество товаров на одной странице каталога
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "10"))
+
+# Хранилище FSM-состояний: sqlite (по умолчанию), redis или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Через сколько секунд бездействия незавершенный диалог сбрасывается
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600)))
+
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько апдейтов обрабатывается одновременно в режиме webhook
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "100"))
+
+# Быстрый старт: бот начинает принимать апдейты, не дожидаясь прогрева кэшей каталога
+# и фото (пока они грузятся, каталог читается из базы); 0 — сначала прогрев
+FAST_START = os.getenv("FAST_START", "1") != "0"
+
+# Отсев повторов (middlewares/dedup.py): сколько секунд помнить update_id, чтобы не обработать
+# повторную доставку, и сколько секунд после обработки считать то же нажатие или тот же
+# текст в чате повтором (двойное нажатие), 0 — не отсеивать; предел числа запомненных ключей
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "60"))
+DEDUP_REPEAT_WINDOW = float(os.getenv("DEDUP_REPEAT_WINDOW", "1"))
+DEDUP_MAX_KEYS = int(os.getenv("DEDUP_MAX_KEYS", "100000"))
+
+# Число процессов-обработчиков: при WORKERS > 1 основной процесс только принимает
+# апдейты и раздает их воркерам по chat_id (см. utils/sharding.py)
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Как часто воркеры подхватывают изменения каталога из других процессов, секунд
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", "2"))
+
+# Чат, куда при старте заранее загружаются фото каталога (по умолчанию — первый админ; 0 — отключить)
+PHOTO_WARMUP_CHAT_ID = int(os.getenv("PHOTO_WARMUP_CHAT_ID", str(ADMIN_IDS[0] if ADMIN_IDS else 0)))
+
+# Сжатые варианты локальных фото (utils/images.py, нужен Pillow): каталог кэша на диске,
+# длинная сторона фото и миниатюры в пикселях, форматы, из которых при отправке
+# выбирается самый легкий, и число процессов, которые сжимают фото
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "media_cache")
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+IMAGE_THUMB_SIDE = int(os.getenv("IMAGE_THUMB_SIDE", "320"))
+IMAGE_FORMATS = [x.strip().lower() for x in os.getenv("IMAGE_FORMATS", "jpeg,webp").split(",") if x.strip()]
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "1"))
+
+# Свой сервер Bot API (пусто — api.telegram.org)
+BOT_API_URL = os.getenv("BOT_API_URL", "")
+# Лимиты исходящих запросов к Bot API (см. utils/rate_limiter.py)
+BOT_API_RATE = float(os.getenv("BOT_API_RATE", "30"))
+BOT_API_CHAT_RATE = float(os.getenv("BOT_API_CHAT_RATE", "1"))
+BOT_API_CHAT_BURST = float(os.getenv("BOT_API_CHAT_BURST", "3"))
+# Сколько раз повторять запрос после ответа 429
+BOT_API_MAX_RETRIES = int(os.getenv("BOT_API_MAX_RETRIES", "3"))
+
+# Рассылки: сообщений в секунду (остальная часть лимита Telegram остается живым ответам),
+# число параллельных отправок и размер пачки получателей между сохранениями прогресса
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "10"))
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "500"))
+
+# Импорт каталога из CSV/JSONL: товаров в одной транзакции записи и как часто (секунды)
+# обновлять сообщение с прогрессом
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "1000"))
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "2"))
+
+# HTTP-эндпоинт /metrics в формате Prometheus (0 — не поднимать)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
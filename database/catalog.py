@@ -0,0 +1,122 @@
+import logging
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional
+
+from core.config import CATALOG_PAGE_SIZE
+from database import db
+from database.db import Product, ProductsPage
+
+
+class CatalogCache:
+    """Каталог товаров в памяти процесса.
+
+    Товары загружаются один раз при старте и дальше отдаются без SQL.
+    Запись идет через кэш (write-through): add_product пишет в БД и сразу
+    патчит словарь. Любое изменение увеличивает version, по которому
+    сбрасываются производные кэши (клавиатуры, карточки). Правки из других
+    процессов подхватывает sync() по счетчику catalog_version в базе.
+    """
+
+    def __init__(self):
+        self._products: Dict[int, Product] = {}
+        self._ordered: List[Product] = []
+        # Отсортированные id для постраничного просмотра через bisect
+        self._ids: List[int] = []
+        self.loaded = False
+        self.version = 0
+        # Значение catalog_version в базе на момент загрузки
+        self.db_version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """Загружает (или принудительно перезагружает) весь каталог из БД."""
+        # Счетчик читается до товаров: правка между двумя чтениями даст лишнюю перезагрузку, а не пропуск
+        self.db_version = await db.get_catalog_version()
+        rows = await db.get_products()
+        self._products = {row.id: row for row in rows}
+        self._ordered = list(rows)
+        self._ids = [row.id for row in rows]
+        self.loaded = True
+        self.version += 1
+        logging.info(f"Catalog cache loaded: {len(rows)} products (version {self.version})")
+
+    reload = load
+
+    async def sync(self) -> bool:
+        """Перезагружает каталог, если товары менялись в базе после загрузки (True — перезагружен)."""
+        if not self.loaded or await db.get_catalog_version() == self.db_version:
+            return False
+        await self.load()
+        return True
+
+    def invalidate(self):
+        """Сбрасывает кэш: следующие обращения пойдут в БД до вызова load()."""
+        self._products = {}
+        self._ordered = []
+        self._ids = []
+        self.loaded = False
+        self.version += 1
+
+    async def get_products(self) -> List[Product]:
+        if self.loaded:
+            self.hits += 1
+            return self._ordered
+        self.misses += 1
+        return await db.get_products()
+
+    async def get_product(self, product_id: int) -> Optional[Product]:
+        if self.loaded:
+            # Загруженный каталог авторитетен: отсутствие id означает, что товара нет
+            product = self._products.get(product_id)
+            if product is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return product
+        self.misses += 1
+        return await db.get_product(product_id)
+
+    async def get_page(self, after_id: int = 0, before_id: Optional[int] = None,
+                       limit: int = CATALOG_PAGE_SIZE) -> ProductsPage:
+        """Страница каталога по курсору: из памяти, а до загрузки — keyset-запросом в БД."""
+        if not self.loaded:
+            self.misses += 1
+            return await db.get_products_page(after_id, before_id, limit)
+        self.hits += 1
+        if before_id is not None:
+            end = bisect_left(self._ids, before_id)
+            start = max(0, end - limit)
+        else:
+            start = bisect_right(self._ids, after_id)
+            end = min(len(self._ids), start + limit)
+        items = [(pid, self._products[pid].name) for pid in self._ids[start:end]]
+        return ProductsPage(items, start > 0, end < len(self._ids))
+
+    def put(self, product: Product):
+        """Добавляет или заменяет товар в кэше на месте."""
+        if not self.loaded:
+            return
+        if product.id in self._products:
+            self._ordered = [product if row.id == product.id else row for row in self._ordered]
+        else:
+            self._ordered = self._ordered + [product]
+            insort(self._ids, product.id)
+        self._products[product.id] = product
+        self.version += 1
+
+    async def add_product(self, name: str, description: str, price: float, sizes: str, photo_id: str) -> int:
+        product_id = await db.add_product(name, description, price, sizes, photo_id)
+        self.put(Product(product_id, name, description, price, sizes, photo_id))
+        return product_id
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._products),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+catalog = CatalogCache()
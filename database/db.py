@@ -1,10 +1,86 @@
-import aiosqlite
-from typing import List, Tuple, Optional
+import json
+import re
+import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
-DB_NAME = "shop.sqlite3"
+from core.config import DB_PATH, DB_READERS, RESERVATION_TTL
+from database import inventory, migrations, stats
+from database.pool import ConnectionPool
+
+DB_NAME = DB_PATH
+
+class Product(NamedTuple):
+    """Товар каталога (поля в порядке колонок products)."""
+    id: int
+    name: str
+    description: str
+    price: float
+    sizes: str
+    photo_id: Optional[str]
+
+    @property
+    def size_list(self) -> List[str]:
+        return [s.strip() for s in self.sizes.split(",") if s.strip()]
+
+    @property
+    def has_photo(self) -> bool:
+        return bool(self.photo_id) and self.photo_id != "none"
+
+class ProductsPage(NamedTuple):
+    """Страница каталога: пары (id, name) и признаки наличия соседних страниц."""
+    items: List[Tuple[int, str]]
+    has_prev: bool
+    has_next: bool
+
+class Broadcast(NamedTuple):
+    """Задание рассылки и его прогресс."""
+    id: int
+    text: str
+    status: str
+    last_user_id: int
+    total: int
+    sent: int
+    failed: int
+    blocked: int
+    created_at: str
+    finished_at: Optional[str]
+
+class CartItem(NamedTuple):
+    """Строка корзины или заказа: товар, размер, количество и брони его единиц."""
+    product_id: int
+    size: str
+    quantity: int = 1
+    reservations: Tuple[int, ...] = ()
+
+class PlacedOrder(NamedTuple):
+    """Результат оформления: id заказа (None — ничего не досталось), сумма и строки, которых не хватило."""
+    order_id: Optional[int]
+    total: float
+    sold_out: List[CartItem]
+
+class StatusChange(NamedTuple):
+    """Результат смены статуса: id покупателя, если статус изменился; refused — снять отмену нельзя, размер закончился."""
+    user_id: Optional[int]
+    refused: bool = False
+
+# Заказ для записи: покупатель, адрес, строки корзины и ключ идемпотентности (None — без ключа)
+NewOrder = Tuple[int, str, str, Sequence[CartItem], Optional[str]]
+
+PRODUCT_COLUMNS = 'id, name, description, price, sizes, photo_id'
+BROADCAST_COLUMNS = 'id, text, status, last_user_id, total, sent, failed, blocked, created_at, finished_at'
+
+# Общий пул соединений: открывается в main.py перед init_db и закрывается при остановке
+pool = ConnectionPool(DB_NAME, readers=DB_READERS)
+
+async def schema_is_current() -> bool:
+    async with pool.read() as db:
+        return await migrations.is_current(db)
 
 async def init_db(seed_data: bool = False):
-    async with aiosqlite.connect(DB_NAME) as db:
+    # Обычный перезапуск: схема уже последней версии, проверка одним чтением без блокировки записи
+    if not seed_data and await schema_is_current():
+        return
+    async with pool.write() as db:
         await db.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY,
@@ -37,7 +113,9 @@ async def init_db(seed_data: bool = False):
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
         ''')
-        await db.commit()
+        
+        # Все изменения схемы после базовых таблиц — версионированные миграции
+        await migrations.migrate(db)
         
         if seed_data:
             # Заполнение случайными товарами, если каталог пуст
@@ -55,52 +133,445 @@ async def init_db(seed_data: bool = False):
                         'INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
                         mock_products
                     )
-                    await db.commit()
 
 async def ensure_user_exists(user_id: int, username: Optional[str]):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute('INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)', (user_id, username))
-        await db.commit()
 
-async def add_product(name: str, description: str, price: float, sizes: str, photo_id: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute('INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
-                         (name, description, price, sizes, photo_id))
-        await db.commit()
+async def add_product(name: str, description: str, price: float, sizes: str, photo_id: str) -> int:
+    async with pool.write() as db:
+        cursor = await db.execute('INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
+                                  (name, description, price, sizes, photo_id))
+        return cursor.lastrowid
 
-async def get_products() -> List[Tuple]:
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT * FROM products') as cursor:
-            return await cursor.fetchall()
+async def upsert_products(products: Sequence[Product]) -> int:
+    """Добавляет и обновляет товары одной транзакцией (импорт каталога). Возвращает число измененных строк.
+
+    Товар с id добавляется или обновляется по id, без id (None) — добавляется как новый.
+    Строки, где ничего не поменялось, не переписываются: индекс поиска и версия каталога их не замечают.
+    """
+    existing = [tuple(p) for p in products if p.id is not None]
+    new = [tuple(p)[1:] for p in products if p.id is None]
+    async with pool.write() as db:
+        # Триггер версии каталога срабатывает на каждую вставленную или измененную строку
+        async with db.execute('SELECT version FROM catalog_version WHERE id = 1') as cursor:
+            before = (await cursor.fetchone())[0]
+        # Новые строки попадают в поисковый индекс одним запросом в конце (см. миграцию 11)
+        await db.execute('INSERT INTO catalog_bulk_load (id) VALUES (1)')
+        inserted_ids = []
+        if existing:
+            ids = json.dumps([row[0] for row in existing])
+            async with db.execute('SELECT value FROM json_each(?) WHERE value NOT IN (SELECT id FROM products)',
+                                  (ids,)) as cursor:
+                inserted_ids = [row[0] for row in await cursor.fetchall()]
+            # Измененные строки переиндексирует триггер обновления
+            await db.executemany(
+                'INSERT INTO products (id, name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET name = excluded.name, description = excluded.description, '
+                'price = excluded.price, sizes = excluded.sizes, photo_id = excluded.photo_id '
+                'WHERE name IS NOT excluded.name OR description IS NOT excluded.description '
+                'OR price IS NOT excluded.price OR sizes IS NOT excluded.sizes OR photo_id IS NOT excluded.photo_id',
+                existing
+            )
+        # AUTOINCREMENT: товары без id получат id больше всех существующих
+        async with db.execute('SELECT COALESCE(MAX(id), 0) FROM products') as cursor:
+            last_id = (await cursor.fetchone())[0]
+        if new:
+            await db.executemany('INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
+                                 new)
+        index = 'INSERT INTO products_fts (rowid, name, description, sizes) SELECT id, name, description, sizes FROM products '
+        if new:
+            await db.execute(index + 'WHERE id > ?', (last_id,))
+        if inserted_ids:
+            await db.execute(index + 'WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(inserted_ids),))
+        await db.execute('DELETE FROM catalog_bulk_load')
+        async with db.execute('SELECT version FROM catalog_version WHERE id = 1') as cursor:
+            return (await cursor.fetchone())[0] - before
+
+async def get_products() -> List[Product]:
+    async with pool.read() as db:
+        async with db.execute(f'SELECT {PRODUCT_COLUMNS} FROM products ORDER BY id') as cursor:
+            return [Product(*row) for row in await cursor.fetchall()]
+
+async def iter_products(batch: int = 1000) -> AsyncIterator[List[Product]]:
+    """Потоково отдает товары пачками по id (экспорт каталога): в памяти только одна пачка."""
+    last_id = 0
+    while True:
+        # Соединение на чтение берется на пачку и не держится, пока пачку пишут в файл
+        async with pool.read() as db:
+            async with db.execute(f'SELECT {PRODUCT_COLUMNS} FROM products WHERE id > ? ORDER BY id LIMIT ?',
+                                  (last_id, batch)) as cursor:
+                rows = [Product(*row) for row in await cursor.fetchall()]
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+async def get_catalog_version() -> int:
+    """Счетчик изменений товаров (увеличивается триггерами на products)."""
+    async with pool.read() as db:
+        async with db.execute('SELECT version FROM catalog_version WHERE id = 1') as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+async def get_products_page(after_id: int = 0, before_id: Optional[int] = None, limit: int = 10) -> ProductsPage:
+    """Keyset-пагинация каталога по id: время выборки не зависит от номера страницы."""
+    async with pool.read() as db:
+        if before_id is not None:
+            # Листаем назад: берем limit записей перед курсором и разворачиваем
+            query = 'SELECT id, name FROM products WHERE id < ? ORDER BY id DESC LIMIT ?'
+            cursor_id = before_id
+        else:
+            query = 'SELECT id, name FROM products WHERE id > ? ORDER BY id LIMIT ?'
+            cursor_id = after_id
+        async with db.execute(query, (cursor_id, limit + 1)) as cursor:
+            rows = await cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before_id is not None:
+            rows.reverse()
+        if not rows:
+            return ProductsPage([], False, False)
+        # Соседняя страница с другой стороны проверяется точечным запросом по индексу
+        if before_id is not None:
+            other_query, other_id = 'SELECT EXISTS(SELECT 1 FROM products WHERE id > ?)', rows[-1][0]
+        else:
+            other_query, other_id = 'SELECT EXISTS(SELECT 1 FROM products WHERE id < ?)', rows[0][0]
+        async with db.execute(other_query, (other_id,)) as cursor:
+            other = bool((await cursor.fetchone())[0])
+        if before_id is not None:
+            return ProductsPage(rows, has_more, other)
+        return ProductsPage(rows, other, has_more)
             
-async def get_product(product_id: int) -> Optional[Tuple]:
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT * FROM products WHERE id = ?', (product_id,)) as cursor:
-            return await cursor.fetchone()
-
-async def create_order(user_id: int, username: str, product_id: int, size: str, address: str) -> int:
-    await ensure_user_exists(user_id, username)
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute('INSERT INTO orders (user_id, username, product_id, size, address) VALUES (?, ?, ?, ?, ?)',
-                                  (user_id, username, product_id, size, address))
-        await db.commit()
-        return cursor.lastrowid
+async def get_product(product_id: int) -> Optional[Product]:
+    async with pool.read() as db:
+        async with db.execute(f'SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ?', (product_id,)) as cursor:
+            row = await cursor.fetchone()
+        return Product(*row) if row else None
 
-async def update_order_status(order_id: int, status: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
-        await db.commit()
+# Не больше стольких слов из запроса: длинный запрос почти всегда опечатка или вставка текста
+SEARCH_MAX_TERMS = 6
+# Совпадения ранжируются bm25, если их не больше стольких (все сразу, одним проходом).
+# bm25 по всем совпадениям частого слова (десятки тысяч товаров из 200k) стоит 30-120 мс
+# против бюджета 10 мс (scripts/bench_search.py); такие запросы листаются от новых к старым
+SEARCH_RANK_LIMIT = 300
+CYRILLIC = re.compile(r"[а-яё]+$")
 
-async def get_stats() -> dict:
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT COUNT(*), SUM(p.price) FROM orders o JOIN products p ON o.product_id = p.id') as cursor:
+def search_query(text: str) -> Optional[str]:
+    """Запрос пользователя в выражение FTS5: каждое слово ищется по префиксу, все слова обязательны."""
+    terms = re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    # Грубое отсечение окончаний у русских слов: "черная" найдет "черный", "футболки" — "футболка".
+    # Латиница ищется как есть: "hoodie" не должно превращаться в "hood"
+    terms = [term[:-2] if len(term) >= 6 and CYRILLIC.match(term) else term for term in terms]
+    # Слова берутся в кавычки, поэтому операторы FTS5 (OR, NEAR, *) из ввода не работают
+    return " ".join(f'"{term}"*' for term in terms)
+
+async def search_products(text: str, limit: int = 10, offset: int = 0) -> List[Tuple[int, str]]:
+    """Поиск товаров по названию, описанию и размерам: пары (id, name).
+
+    Не больше SEARCH_RANK_LIMIT совпадений — самые релевантные (bm25) первыми,
+    иначе новые первыми. В обоих случаях страницы идут по всем совпадениям.
+    """
+    query = search_query(text)
+    if query is None:
+        return []
+    async with pool.read() as db:
+        # Один проход по самым новым совпадениям: если это все совпадения, их порядок — по bm25
+        async with db.execute(
+            'SELECT p.id, p.name, m.rank FROM ('
+            '  SELECT rowid, rank FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid DESC LIMIT ?'
+            ') AS m JOIN products p ON p.id = m.rowid ORDER BY m.rowid DESC',
+            (query, SEARCH_RANK_LIMIT + 1),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if len(rows) <= SEARCH_RANK_LIMIT:
+            rows.sort(key=lambda row: row[2])
+        elif offset + limit > len(rows):
+            async with db.execute(
+                'SELECT p.id, p.name FROM ('
+                '  SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?'
+                ') AS m JOIN products p ON p.id = m.rowid ORDER BY m.rowid DESC',
+                (query, limit, offset),
+            ) as cursor:
+                return await cursor.fetchall()
+        return [(product_id, name) for product_id, name, _ in rows[offset:offset + limit]]
+
+async def get_photo_file_ids() -> Dict[str, str]:
+    async with pool.read() as db:
+        async with db.execute('SELECT content_hash, file_id FROM photo_cache') as cursor:
+            return {content_hash: file_id for content_hash, file_id in await cursor.fetchall()}
+
+async def save_photo_file_id(content_hash: str, file_id: str):
+    async with pool.write() as db:
+        await db.execute('INSERT OR REPLACE INTO photo_cache (content_hash, file_id) VALUES (?, ?)', (content_hash, file_id))
+
+async def create_order(user_id: int, username: str, product_id: int, size: str, address: str,
+                       reservation_id: Optional[int] = None, idempotency_key: Optional[str] = None) -> Optional[int]:
+    """Заказ из одной единицы товара; None — размер закончился."""
+    item = CartItem(product_id, size, 1, (reservation_id,) if reservation_id else ())
+    return (await create_orders([(user_id, username, address, [item], idempotency_key)]))[0].order_id
+
+async def create_orders(orders: Sequence[NewOrder]) -> List[PlacedOrder]:
+    """Пишет пачку заказов (user_id, username, address, строки, ключ) одной транзакцией.
+
+    Каждый заказ — заголовок в orders и строки в order_items; брони строк
+    забираются в той же транзакции. Строки, которых не хватило на складе,
+    в заказ не попадают (или попадают с меньшим количеством) и возвращаются
+    в sold_out. Сумма заказа считается в SQL по записанным строкам.
+
+    Заказ с ключом идемпотентности, который уже записан (или повторяется в
+    пачке), не пишется второй раз и склад не трогает: возвращается исходный
+    заказ. Ключ в orders уникален (миграция 12).
+    """
+    async with pool.write() as db:
+        # Уже записанные заказы с ключами из пачки: повтор вернет их (строки sold_out не хранятся)
+        keys = list({order[4] for order in orders if order[4] is not None})
+        existing = {}
+        if keys:
+            async with db.execute(
+                'SELECT idempotency_key, id, total FROM orders '
+                'WHERE idempotency_key IN (SELECT value FROM json_each(?))', (json.dumps(keys),)
+            ) as cursor:
+                existing = {key: PlacedOrder(order_id, float(total or 0), [])
+                            for key, order_id, total in await cursor.fetchall()}
+        # ключ -> номер первого заказа с ним в пачке
+        first = {}
+        claimed = []
+        for n, (user_id, username, address, items, key) in enumerate(orders):
+            if key is not None and (key in existing or key in first):
+                claimed.append(None)
+                continue
+            if key is not None:
+                first[key] = n
+            lines, sold_out = [], []
+            for item in items:
+                # Бронь каждой строки забирается в той же транзакции, что и запись заказа
+                quantity, reserved = await inventory.claim(db, item.reservations, item.product_id, item.size,
+                                                           item.quantity)
+                if quantity:
+                    lines.append((item.product_id, item.size, quantity, reserved))
+                if quantity < item.quantity:
+                    sold_out.append(item._replace(quantity=item.quantity - quantity, reservations=()))
+            claimed.append((lines, sold_out))
+        placed = [(*order[:3], order[4]) for order, claim in zip(orders, claimed) if claim and claim[0]]
+        totals = {}
+        if placed:
+            await db.executemany('INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)',
+                                 {(user_id, username) for user_id, username, _, _ in placed})
+            await db.executemany('INSERT INTO orders (user_id, username, address, idempotency_key) '
+                                 'VALUES (?, ?, ?, ?)', placed)
+            # Писатель один и держит блокировку всю транзакцию, поэтому id вставленных заказов идут подряд
+            async with db.execute('SELECT last_insert_rowid()') as cursor:
+                last_id = (await cursor.fetchone())[0]
+            first_id = last_id - len(placed) + 1
+            order_ids = iter(range(first_id, last_id + 1))
+            rows = []
+            for claim in claimed:
+                if claim and claim[0]:
+                    order_id = next(order_ids)
+                    rows.extend((order_id, n, *line) for n, line in enumerate(claim[0], 1))
+            # Цена фиксируется в строке на момент покупки, сумма заказа — по строкам
+            await db.executemany(
+                'INSERT INTO order_items (order_id, line, product_id, size, quantity, reserved, unit_price) '
+                'VALUES (?, ?, ?, ?, ?, ?, (SELECT price FROM products WHERE id = ?))',
+                [(*row, row[2]) for row in rows]
+            )
+            async with db.execute(
+                'UPDATE orders SET total = (SELECT COALESCE(SUM(quantity * unit_price), 0) FROM order_items '
+                'WHERE order_id = orders.id) WHERE id BETWEEN ? AND ? RETURNING id, total',
+                (first_id, last_id)
+            ) as cursor:
+                # RETURNING отдает значение до приведения к REAL: целая сумма пришла бы как int
+                totals = {order_id: float(total) for order_id, total in await cursor.fetchall()}
+
+            # Итоги продаж обновляются в той же транзакции
+            await stats.record_orders(db, first_id, last_id)
+            order_ids = iter(range(first_id, last_id + 1))
+        results = []
+        for order, claim in zip(orders, claimed):
+            if claim is None:
+                # Повтор: исходный заказ из базы или из этой же пачки (он в results раньше)
+                key = order[4]
+                results.append(existing[key] if key in existing else results[first[key]])
+                continue
+            lines, sold_out = claim
+            order_id = next(order_ids) if lines else None
+            results.append(PlacedOrder(order_id, totals.get(order_id, 0.0), sold_out))
+        return results
+
+async def update_order_status(order_id: int, status: str) -> StatusChange:
+    """Меняет статус заказа. user_id в результате — id покупателя, если статус действительно изменился.
+
+    Отмена возвращает списанные единицы в остаток; снять отмену нельзя, если какой-то
+    размер уже закончился (refused=True, статус не меняется).
+    """
+    # Повторное нажатие той же кнопки статуса (статус уже такой) не ждет блокировку записи
+    async with pool.read() as db:
+        async with db.execute('SELECT status FROM orders WHERE id = ?', (order_id,)) as cursor:
             row = await cursor.fetchone()
-            return {
-                "total_orders": row[0] or 0,
-                "total_sales": row[1] or 0.0
-            }
-
-async def get_orders(limit: int = 10) -> List[Tuple]:
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT * FROM orders ORDER BY created_at DESC LIMIT ?', (limit,)) as cursor:
+    if not row or row[0] == status:
+        return StatusChange(None)
+    async with pool.write() as db:
+        async with db.execute('SELECT status, user_id FROM orders WHERE id = ?', (order_id,)) as cursor:
+            row = await cursor.fetchone()
+        if not row or row[0] == status:
+            return StatusChange(None)
+        async with db.execute(
+            'SELECT product_id, size, reserved FROM order_items WHERE order_id = ? AND reserved > 0', (order_id,)
+        ) as cursor:
+            lines = await cursor.fetchall()
+        if lines:
+            if not await inventory.on_status_change(db, lines, row[0], status):
+                return StatusChange(None, refused=True)
+            for product_id, size, _ in lines:
+                _sold_out.pop((product_id, size), None)
+        await db.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
+        await stats.record_status_change(db, row[0], status)
+        return StatusChange(row[1])
+
+# Размер, который только что закончился, столько секунд отклоняется без запроса к базе:
+# во время дропа почти все нажатия "Купить" приходятся на уже раскупленный размер
+SOLD_OUT_TTL = 1.0
+_sold_out: Dict[Tuple[int, str], float] = {}
+
+async def reserve_stock(user_id: int, product_id: int, size: str, ttl: float = RESERVATION_TTL) -> Optional[int]:
+    """Бронирует единицу размера на ttl секунд: id брони, 0 — размер без учета остатков, None — закончился."""
+    key = (product_id, size)
+    if _sold_out.get(key, 0) > time.monotonic():
+        return None
+    async with pool.write() as db:
+        # Проверка повторяется под блокировкой: очередь писателя могла ждать, пока размер раскупали
+        if _sold_out.get(key, 0) > time.monotonic():
+            return None
+        now = time.time()
+        reservation_id = await inventory.reserve(db, user_id, product_id, size, now + ttl, now)
+    if reservation_id is None:
+        _sold_out[key] = time.monotonic() + SOLD_OUT_TTL
+    return reservation_id
+
+async def release_reservations(reservation_ids: Sequence[int]):
+    """Отпускает брони (строку убрали из корзины или корзину очистили)."""
+    if not reservation_ids:
+        return
+    async with pool.write() as db:
+        released = await inventory.release(db, reservation_ids)
+    for product_id, size, _ in released:
+        _sold_out.pop((product_id, size), None)
+
+async def get_inventory() -> List[Tuple[int, str, str, int, int]]:
+    """Учитываемые размеры: (product_id, название, размер, свободный остаток, активных броней)."""
+    async with pool.read() as db:
+        async with db.execute(
+            'SELECT i.product_id, p.name, i.size, i.stock, '
+            '(SELECT COUNT(*) FROM reservations r WHERE r.product_id = i.product_id AND r.size = i.size AND r.expires_at >= ?) '
+            'FROM inventory i LEFT JOIN products p ON p.id = i.product_id ORDER BY i.product_id, i.size',
+            (time.time(),)
+        ) as cursor:
             return await cursor.fetchall()
+
+async def set_stock(product_id: int, size: str, stock: Optional[int]):
+    """Задает свободный остаток размера; None снимает размер с учета."""
+    _sold_out.pop((product_id, size), None)
+    async with pool.write() as db:
+        if stock is None:
+            await db.execute('DELETE FROM inventory WHERE product_id = ? AND size = ?', (product_id, size))
+        else:
+            await db.execute(
+                'INSERT INTO inventory (product_id, size, stock) VALUES (?, ?, ?) '
+                'ON CONFLICT(product_id, size) DO UPDATE SET stock = excluded.stock',
+                (product_id, size, stock)
+            )
+
+async def get_stats() -> dict:
+    """Итоги продаж из сводных таблиц: время ответа не зависит от числа заказов."""
+    async with pool.read() as db:
+        return await stats.read_stats(db)
+
+async def rebuild_stats() -> Tuple[dict, dict]:
+    """Пересчитывает итоги продаж с нуля (для сверки с нарастающими итогами)."""
+    async with pool.write() as db:
+        return await stats.rebuild(db)
+
+async def iter_orders(status: Optional[str] = None, cursor_id: int = 0, direction: str = "older",
+                      limit: int = 10) -> AsyncIterator[Tuple]:
+    """Потоково отдает заказы от новых к старым вместе с составом заказа.
+
+    Keyset-пагинация по (created_at, id) относительно заказа cursor_id:
+    direction="older" — заказы старше курсора, "newer" — новее, "from" — начиная с него.
+    Строка: (id, username, address, status, created_at, total, состав), где состав —
+    строки заказа через "; " в виде "название (размер) ×количество".
+    """
+    conditions, params = [], []
+    if status:
+        conditions.append('o.status = ?')
+        params.append(status)
+    if cursor_id:
+        op = {"older": "<", "newer": ">", "from": "<="}[direction]
+        conditions.append(f'(o.created_at, o.id) {op} (SELECT created_at, id FROM orders WHERE id = ?)')
+        params.append(cursor_id)
+    order = "ASC" if direction == "newer" else "DESC"
+    # Состав собирается подзапросом по первичному ключу order_items только для заказов страницы
+    query = (
+        "SELECT o.id, o.username, o.address, o.status, o.created_at, o.total, "
+        "(SELECT group_concat(COALESCE(p.name, '#' || i.product_id) || ' (' || i.size || ') ×' || i.quantity, '; ') "
+        "FROM order_items i LEFT JOIN products p ON p.id = i.product_id WHERE i.order_id = o.id) "
+        "FROM orders o"
+        + (' WHERE ' + ' AND '.join(conditions) if conditions else '')
+        + f' ORDER BY o.created_at {order}, o.id {order} LIMIT ?'
+    )
+    params.append(limit)
+    async with pool.read() as db:
+        async with db.execute(query, params) as cursor:
+            if direction == "newer":
+                # Более новые заказы выбираются по возрастанию, отдаем их в обычном порядке
+                for row in reversed(await cursor.fetchall()):
+                    yield row
+            else:
+                while rows := await cursor.fetchmany(100):
+                    for row in rows:
+                        yield row
+
+async def create_broadcast(text: str) -> int:
+    async with pool.write() as db:
+        cursor = await db.execute('INSERT INTO broadcasts (text, total) SELECT ?, COUNT(*) FROM users', (text,))
+        return cursor.lastrowid
+
+async def get_broadcasts(limit: int = 5) -> List[Broadcast]:
+    async with pool.read() as db:
+        async with db.execute(f'SELECT {BROADCAST_COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT ?', (limit,)) as cursor:
+            return [Broadcast(*row) for row in await cursor.fetchall()]
+
+async def get_unfinished_broadcasts() -> List[Broadcast]:
+    async with pool.read() as db:
+        async with db.execute(
+            f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE status IN ('pending', 'running') ORDER BY id"
+        ) as cursor:
+            return [Broadcast(*row) for row in await cursor.fetchall()]
+
+async def get_user_ids(after_id: int = 0, limit: int = 500) -> List[int]:
+    """Следующая пачка id пользователей после after_id (keyset по первичному ключу)."""
+    async with pool.read() as db:
+        async with db.execute('SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+async def save_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int):
+    """Сохраняет точку, до которой дошла рассылка, и прибавляет счетчики доставки."""
+    async with pool.write() as db:
+        await db.execute(
+            'UPDATE broadcasts SET last_user_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ? '
+            'WHERE id = ?',
+            (last_user_id, sent, failed, blocked, broadcast_id)
+        )
+
+async def set_broadcast_status(broadcast_id: int, status: str) -> bool:
+    """Ставит статус незавершенной рассылке; running/pending -> done/cancelled фиксирует время окончания."""
+    async with pool.write() as db:
+        cursor = await db.execute(
+            "UPDATE broadcasts SET status = ?, "
+            "finished_at = CASE WHEN ? IN ('done', 'cancelled') THEN CURRENT_TIMESTAMP END "
+            "WHERE id = ? AND status IN ('pending', 'running')",
+            (status, status, broadcast_id)
+        )
+        return cursor.rowcount > 0
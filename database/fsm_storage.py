@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from core.config import FSM_STORAGE, FSM_TTL, REDIS_URL
+from database.pool import ConnectionPool
+from utils.metrics import detach
+
+# Запись FSM: (state, data, время последнего изменения)
+Record = Tuple[Optional[str], Dict[str, Any], float]
+
+
+class BufferedStorage(BaseStorage, ABC):
+    """Общая часть постоянных FSM-хранилищ.
+
+    Перед хранилищем стоит LRU-кэш горячих диалогов, а изменения копятся
+    в буфере и сбрасываются пачкой фоновой задачей (по размеру пачки или
+    по таймеру). Записи старше ttl секунд считаются пустыми.
+    close() дописывает буфер до конца, поэтому при штатной остановке
+    состояния не теряются; при аварийном падении теряется не больше
+    flush_interval секунд изменений.
+
+    Кэш рассчитан на то, что диалог одного чата обслуживает один процесс.
+    """
+
+    def __init__(self, ttl: int = FSM_TTL, cache_size: int = 10_000, batch_size: int = 500,
+                 flush_interval: float = 0.05, key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._cache: "OrderedDict[str, Record]" = OrderedDict()
+        self._dirty: Dict[str, Record] = {}
+        self._wakeup = asyncio.Event()
+        self._pending_reads: Dict[str, asyncio.Future] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    # --- Методы конкретного хранилища ---
+
+    @abstractmethod
+    async def _fetch_many(self, keys: List[str]) -> Dict[str, Record]:
+        """Записи по ключам; отсутствующих ключей в результате нет."""
+
+    @abstractmethod
+    async def _store(self, records: List[Tuple[str, Record]]):
+        """Пишет пачку записей; пустые записи (см. _split) удаляются."""
+
+    async def _purge_expired(self, deadline: float):
+        """Удаляет записи, не менявшиеся с момента deadline."""
+
+    async def _close_backend(self):
+        pass
+
+    # --- Кэш и буфер записи ---
+
+    def _remember(self, key: str, record: Record):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, key: str) -> Optional[Record]:
+        """Промахи кэша, случившиеся в одной итерации цикла, читаются одним запросом."""
+        future = self._pending_reads.get(key)
+        if future is None:
+            if not self._pending_reads:
+                asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._read_batch()))
+            future = self._pending_reads[key] = asyncio.get_running_loop().create_future()
+        return await future
+
+    async def _read_batch(self):
+        pending, self._pending_reads = self._pending_reads, {}
+        try:
+            records = await self._fetch_many(list(pending))
+        except Exception as e:
+            for future in pending.values():
+                future.set_exception(e)
+            return
+        for key, future in pending.items():
+            future.set_result(records.get(key))
+
+    async def _load(self, key: str) -> Record:
+        record = self._cache.get(key)
+        if record is None:
+            record = self._dirty.get(key)
+        if record is None:
+            record = await self._fetch(key)
+            # Пока шло чтение, запись могла появиться в кэше
+            record = self._cache.get(key) or self._dirty.get(key) or record
+        if record is None or (self.ttl and record[2] + self.ttl < time.time()):
+            record = (None, {}, time.time())
+        self._remember(key, record)
+        return record
+
+    async def _save(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        if self._closed:
+            raise RuntimeError("FSM storage is closed")
+        record = (state, data, time.time())
+        self._remember(key, record)
+        self._dirty[key] = record
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        try:
+            await self._store(list(batch.items()))
+        except Exception:
+            # Возвращаем неудачную пачку в буфер, не затирая более свежие изменения
+            for key, record in batch.items():
+                self._dirty.setdefault(key, record)
+            raise
+
+    async def _flush_loop(self):
+        # Задача может быть создана внутри апдейта, но ее записи к нему не относятся
+        detach()
+        last_purge = time.time()
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush()
+                if self.ttl and time.time() - last_purge > min(self.ttl, 60):
+                    last_purge = time.time()
+                    await self._purge_expired(last_purge - self.ttl)
+            except Exception as e:
+                logging.error(f"Error flushing FSM storage: {e}")
+
+    # --- Интерфейс BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self.key_builder.build(key)
+        _, data, _ = await self._load(k)
+        await self._save(k, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        k = self.key_builder.build(key)
+        state, _, _ = await self._load(k)
+        await self._save(k, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self.key_builder.build(key)))[1].copy()
+
+    async def flush(self) -> None:
+        """Сразу записывает накопленные изменения, не дожидаясь фоновой записи."""
+        await self._flush()
+
+    async def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        await self._flush()
+        await self._close_backend()
+
+
+class SQLiteStorage(BufferedStorage):
+    """FSM-хранилище в таблице fsm_states той же базы, что и магазин."""
+
+    def __init__(self, pool: ConnectionPool, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    async def _fetch_many(self, keys: List[str]) -> Dict[str, Record]:
+        records = {}
+        async with self.pool.read() as db:
+            # Ограничение SQLite на число параметров в одном запросе
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                query = f'SELECT key, state, data, updated_at FROM fsm_states WHERE key IN ({",".join("?" * len(chunk))})'
+                async with db.execute(query, chunk) as cursor:
+                    for key, state, data, ts in await cursor.fetchall():
+                        records[key] = (state, json.loads(data), ts)
+        return records
+
+    async def _store(self, records: List[Tuple[str, Record]]):
+        upserts, deletes = _split(records)
+        async with self.pool.write() as db:
+            if upserts:
+                await db.executemany(
+                    'INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, '
+                    'updated_at = excluded.updated_at',
+                    [(key, state, json.dumps(data, ensure_ascii=False), ts) for key, (state, data, ts) in upserts]
+                )
+            if deletes:
+                await db.executemany('DELETE FROM fsm_states WHERE key = ?', [(key,) for key in deletes])
+
+    async def _purge_expired(self, deadline: float):
+        async with self.pool.write() as db:
+            await db.execute('DELETE FROM fsm_states WHERE updated_at < ?', (deadline,))
+
+
+class RedisStorage(BufferedStorage):
+    """FSM-хранилище в Redis: пачка пишется одним pipeline, TTL выставляет сам Redis."""
+
+    def __init__(self, redis, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisStorage":
+        from redis.asyncio import Redis
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def _fetch_many(self, keys: List[str]) -> Dict[str, Record]:
+        records = {}
+        for key, raw in zip(keys, await self.redis.mget(keys)):
+            if raw is not None:
+                state, data, ts = json.loads(raw)
+                records[key] = (state, data, ts)
+        return records
+
+    async def _store(self, records: List[Tuple[str, Record]]):
+        upserts, deletes = _split(records)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, (state, data, ts) in upserts:
+                pipe.set(key, json.dumps([state, data, ts], ensure_ascii=False), ex=self.ttl or None)
+            if deletes:
+                pipe.delete(*deletes)
+            await pipe.execute()
+
+    async def _close_backend(self):
+        await self.redis.aclose()
+
+
+def _split(records: Iterable[Tuple[str, Record]]) -> Tuple[List[Tuple[str, Record]], List[str]]:
+    """Пустые записи (нет состояния и данных) удаляются, остальные сохраняются."""
+    upserts, deletes = [], []
+    for key, record in records:
+        if record[0] is None and not record[1]:
+            deletes.append(key)
+        else:
+            upserts.append((key, record))
+    return upserts, deletes
+
+
+def create_storage(pool: ConnectionPool) -> BaseStorage:
+    """Создает FSM-хранилище по настройке FSM_STORAGE (sqlite / redis / memory)."""
+    if FSM_STORAGE == "redis":
+        return RedisStorage.from_url(REDIS_URL)
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage(pool)
@@ -0,0 +1,151 @@
+"""Остатки по размерам и брони.
+
+Учет ведется только для размеров, у которых есть строка в inventory (их
+заводит админ командой /stock), остальные продаются без ограничений.
+Единицы списываются условным UPDATE ... WHERE stock >= n: проверка и
+уменьшение — один оператор под блокировкой записи SQLite, поэтому
+одновременные покупатели (в том числе из разных процессов) не продадут
+больше, чем есть. Каждая единица, добавленная в корзину, бронируется до
+оформления заказа; заказ забирает брони своих строк, а просроченные брони
+возвращаются в остаток при следующем бронировании. Функции принимают
+соединение-писатель внутри уже открытой транзакции.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+CANCELLED_STATUS = "Отменён"
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS inventory (
+        product_id INTEGER NOT NULL,
+        size TEXT NOT NULL,
+        stock INTEGER NOT NULL CHECK (stock >= 0),
+        PRIMARY KEY (product_id, size)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS reservations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        size TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_reservations_expires_at ON reservations (expires_at)',
+    'CREATE INDEX IF NOT EXISTS idx_reservations_user_id ON reservations (user_id)',
+)
+
+
+async def create_tables(db: aiosqlite.Connection):
+    for statement in SCHEMA:
+        await db.execute(statement)
+
+
+async def _put_back(db: aiosqlite.Connection, lines: Iterable[Tuple[int, str, int]]):
+    """Возвращает в остаток единицы: тройки (product_id, size, количество)."""
+    await db.executemany('UPDATE inventory SET stock = stock + ? WHERE product_id = ? AND size = ?',
+                         [(units, product_id, size) for product_id, size, units in lines])
+
+
+async def take(db: aiosqlite.Connection, product_id: int, size: str, units: int = 1) -> Optional[bool]:
+    """Списывает units единиц: True — списаны, False — столько нет, None — размер без учета остатков."""
+    cursor = await db.execute(
+        'UPDATE inventory SET stock = stock - ? WHERE product_id = ? AND size = ? AND stock >= ?',
+        (units, product_id, size, units)
+    )
+    if cursor.rowcount:
+        return True
+    async with db.execute('SELECT 1 FROM inventory WHERE product_id = ? AND size = ?', (product_id, size)) as cursor:
+        return False if await cursor.fetchone() else None
+
+
+async def release_expired(db: aiosqlite.Connection, now: float) -> int:
+    """Возвращает в остаток просроченные брони."""
+    async with db.execute('DELETE FROM reservations WHERE expires_at < ? RETURNING product_id, size, 1', (now,)) as cursor:
+        units = await cursor.fetchall()
+    await _put_back(db, units)
+    return len(units)
+
+
+async def release(db: aiosqlite.Connection, reservation_ids: Sequence[int]) -> List[Tuple[int, str, int]]:
+    """Отпускает брони (строку убрали из корзины) и возвращает их единицы в остаток."""
+    if not reservation_ids:
+        return []
+    async with db.execute(
+        f'DELETE FROM reservations WHERE id IN ({",".join("?" * len(reservation_ids))}) RETURNING product_id, size, 1',
+        tuple(reservation_ids)
+    ) as cursor:
+        units = await cursor.fetchall()
+    await _put_back(db, units)
+    return units
+
+
+async def reserve(db: aiosqlite.Connection, user_id: int, product_id: int, size: str,
+                  expires_at: float, now: float) -> Optional[int]:
+    """Бронирует единицу для покупателя.
+
+    Возвращает id брони, 0 для размера без учета остатков или None, если размер закончился.
+    """
+    await release_expired(db, now)
+    taken = await take(db, product_id, size)
+    if taken is None:
+        return 0
+    if not taken:
+        return None
+    cursor = await db.execute(
+        'INSERT INTO reservations (user_id, product_id, size, expires_at) VALUES (?, ?, ?, ?)',
+        (user_id, product_id, size, expires_at)
+    )
+    return cursor.lastrowid
+
+
+async def claim(db: aiosqlite.Connection, reservation_ids: Sequence[int], product_id: int, size: str,
+                quantity: int) -> Tuple[int, int]:
+    """Забирает под строку заказа quantity единиц: сначала брони строки, остальное — из остатка.
+
+    Брони могли истечь и вернуться в остаток (или покупка начата до появления
+    учета) — тогда единицы списываются заново, сколько осталось. Возвращает
+    (сколько единиц досталось, сколько из них списано из учитываемого остатка).
+    """
+    claimed = 0
+    if reservation_ids:
+        cursor = await db.execute(
+            f'DELETE FROM reservations WHERE id IN ({",".join("?" * len(reservation_ids))}) '
+            'AND product_id = ? AND size = ?',
+            (*reservation_ids, product_id, size)
+        )
+        claimed = cursor.rowcount
+    needed = quantity - claimed
+    if needed <= 0:
+        return quantity, quantity
+    async with db.execute('SELECT stock FROM inventory WHERE product_id = ? AND size = ?', (product_id, size)) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return quantity, claimed
+    # Под блокировкой записи остаток не изменится между SELECT и UPDATE
+    taken = min(row[0], needed)
+    if taken:
+        await db.execute('UPDATE inventory SET stock = stock - ? WHERE product_id = ? AND size = ?',
+                         (taken, product_id, size))
+    return claimed + taken, claimed + taken
+
+
+async def on_status_change(db: aiosqlite.Connection, lines: Sequence[Tuple[int, str, int]], old: str, new: str) -> bool:
+    """Отмена заказа возвращает списанные единицы в остаток, снятие отмены списывает их снова.
+
+    lines — (product_id, size, списанных единиц) по строкам заказа. False —
+    снять отмену нельзя: какой-то размер уже закончился (остаток не меняется).
+    """
+    if new == CANCELLED_STATUS and old != CANCELLED_STATUS:
+        await _put_back(db, lines)
+    elif old == CANCELLED_STATUS and new != CANCELLED_STATUS:
+        taken = []
+        for product_id, size, units in lines:
+            if await take(db, product_id, size, units) is False:
+                await _put_back(db, taken)
+                return False
+            taken.append((product_id, size, units))
+    return True
@@ -0,0 +1,242 @@
+"""Версионированные миграции схемы базы.
+
+Базовые таблицы (users, products, orders) создаются в init_db, все
+последующие изменения схемы — только новой миграцией в конце списка
+MIGRATIONS. Применённые версии записываются в таблицу schema_version,
+каждая миграция выполняется в своей транзакции.
+"""
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+from database import inventory, stats
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+async def _order_indexes(db: aiosqlite.Connection):
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id, created_at)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at)')
+
+
+async def _order_unit_price(db: aiosqlite.Connection):
+    # Цена продажи хранится в заказе; для старых заказов берем текущую цену товара
+    await db.execute('ALTER TABLE orders ADD COLUMN unit_price REAL')
+    await db.execute('UPDATE orders SET unit_price = (SELECT price FROM products WHERE products.id = orders.product_id)')
+
+
+async def _stats_tables(db: aiosqlite.Connection):
+    await stats.create_tables(db)
+
+
+async def _photo_cache(db: aiosqlite.Connection):
+    # Telegram file_id загруженных фото по хэшу содержимого файла (см. utils/photos.py)
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS photo_cache (
+        content_hash TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+async def _fsm_states(db: aiosqlite.Connection):
+    # Состояния FSM (см. database/fsm_storage.py)
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+
+async def _broadcasts(db: aiosqlite.Connection):
+    # Задания рассылок (см. utils/broadcast.py): last_user_id — до какого пользователя рассылка дошла
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        blocked INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    ''')
+
+
+async def _product_search(db: aiosqlite.Connection):
+    # Полнотекстовый индекс товаров (FTS5, external content): хранит только токены,
+    # сами строки читаются из products. Триггеры держат индекс в синхроне с таблицей.
+    await db.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, sizes,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    )
+    ''')
+    await db.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description, sizes)
+        VALUES (new.id, new.name, new.description, new.sizes);
+    END
+    ''')
+    await db.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, sizes)
+        VALUES ('delete', old.id, old.name, old.description, old.sizes);
+    END
+    ''')
+    await db.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description, sizes ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, sizes)
+        VALUES ('delete', old.id, old.name, old.description, old.sizes);
+        INSERT INTO products_fts (rowid, name, description, sizes)
+        VALUES (new.id, new.name, new.description, new.sizes);
+    END
+    ''')
+    # Совпадение в названии весит больше, чем в размерах и описании
+    await db.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')")
+    await db.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+async def _inventory(db: aiosqlite.Connection):
+    # Остатки и брони (см. database/inventory.py); reserved — заказ списал единицу из остатка
+    await inventory.create_tables(db)
+    await db.execute('ALTER TABLE orders ADD COLUMN reserved INTEGER NOT NULL DEFAULT 0')
+
+
+async def _catalog_version(db: aiosqlite.Connection):
+    # Счетчик изменений товаров: по нему процессы-воркеры замечают правки каталога,
+    # сделанные другими процессами, и перечитывают свой кэш (см. CatalogCache.sync)
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    await db.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        await db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_{event.lower()} AFTER {event} ON products BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+
+async def _order_items(db: aiosqlite.Connection):
+    # Заказ — заголовок в orders и строки в order_items (корзина из нескольких товаров).
+    # reserved — сколько единиц строки списано из учитываемого остатка.
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_id INTEGER NOT NULL REFERENCES orders (id),
+        line INTEGER NOT NULL,
+        product_id INTEGER,
+        size TEXT,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        unit_price REAL,
+        reserved INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (order_id, line)
+    ) WITHOUT ROWID
+    ''')
+    # Старые заказы становятся заказами из одной строки; столбцы товара в orders больше не заполняются
+    await db.execute('''
+    INSERT INTO order_items (order_id, line, product_id, size, quantity, unit_price, reserved)
+    SELECT id, 1, product_id, size, 1, unit_price, reserved FROM orders WHERE product_id IS NOT NULL
+    ''')
+    await db.execute('ALTER TABLE orders ADD COLUMN total REAL')
+    await db.execute('''
+    UPDATE orders SET total = (SELECT SUM(quantity * unit_price) FROM order_items WHERE order_id = orders.id)
+    ''')
+    # Продажи товаров теперь в штуках по строкам заказов
+    await stats.rebuild(db)
+
+
+async def _catalog_bulk_load(db: aiosqlite.Connection):
+    # Массовый импорт (db.upsert_products) индексирует новые товары одним INSERT ... SELECT
+    # на пачку: построчный триггер FTS5 в разы медленнее. Пока в catalog_bulk_load есть
+    # строка (только внутри транзакции импорта), триггер вставки не срабатывает.
+    await db.execute('CREATE TABLE IF NOT EXISTS catalog_bulk_load (id INTEGER PRIMARY KEY CHECK (id = 1))')
+    await db.execute('DROP TRIGGER IF EXISTS products_fts_insert')
+    await db.execute('''
+    CREATE TRIGGER products_fts_insert AFTER INSERT ON products
+    WHEN NOT EXISTS (SELECT 1 FROM catalog_bulk_load) BEGIN
+        INSERT INTO products_fts (rowid, name, description, sizes)
+        VALUES (new.id, new.name, new.description, new.sizes);
+    END
+    ''')
+
+
+async def _order_idempotency(db: aiosqlite.Connection):
+    # Ключ оформления (один на корзину): повторная отправка того же заказа не создает второй
+    await db.execute('ALTER TABLE orders ADD COLUMN idempotency_key TEXT')
+    await db.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency_key ON orders (idempotency_key) '
+        'WHERE idempotency_key IS NOT NULL'
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "indexes on orders(created_at, user_id, status)", _order_indexes),
+    (2, "unit price on orders", _order_unit_price),
+    (3, "sales summary tables", _stats_tables),
+    (4, "photo file_id cache", _photo_cache),
+    (5, "fsm states", _fsm_states),
+    (6, "broadcast jobs", _broadcasts),
+    (7, "product full-text search", _product_search),
+    (8, "inventory and reservations", _inventory),
+    (9, "catalog version counter", _catalog_version),
+    (10, "order items", _order_items),
+    (11, "bulk catalog load", _catalog_bulk_load),
+    (12, "order idempotency key", _order_idempotency),
+]
+
+
+async def current_version(db: aiosqlite.Connection) -> int:
+    async with db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version') as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def is_current(db: aiosqlite.Connection) -> bool:
+    """База уже на последней версии схемы (только чтение, подходит соединение-читатель)."""
+    try:
+        return await current_version(db) >= MIGRATIONS[-1][0]
+    except aiosqlite.OperationalError:
+        # Таблицы schema_version еще нет — новая база
+        return False
+
+
+async def migrate(db: aiosqlite.Connection) -> List[int]:
+    """Применяет по порядку все миграции новее текущей версии схемы."""
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    await db.commit()
+    version = await current_version(db)
+    applied = []
+    for number, name, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        await db.execute('BEGIN')
+        try:
+            await apply(db)
+            await db.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (number, name))
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+        logging.info(f"Applied migration {number}: {name}")
+        applied.append(number)
+    return applied
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional
+
+import aiosqlite
+
+from utils.metrics import count_query, current, record_db
+
+# PRAGMA, применяемые к каждому соединению пула
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+class PoolConnection:
+    """Соединение, выданное пулом на время блока: считает запросы.
+
+    Каждый execute/executemany засчитывается апдейту, который держит
+    соединение (метрики обработчиков), и общему счетчику пула. Остальные
+    атрибуты — как у aiosqlite.Connection.
+    """
+
+    __slots__ = ("_conn", "_pool", "_timings")
+
+    def __init__(self, conn: aiosqlite.Connection, pool: "ConnectionPool"):
+        self._conn = conn
+        self._pool = pool
+        self._timings = current()
+
+    def _count(self):
+        self._pool.queries += 1
+        count_query(self._timings)
+
+    def execute(self, sql: str, parameters: Any = None):
+        self._count()
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Any):
+        self._count()
+        return self._conn.executemany(sql, parameters)
+
+    def executescript(self, sql: str):
+        self._count()
+        return self._conn.executescript(sql)
+
+    def execute_fetchall(self, sql: str, parameters: Any = None):
+        self._count()
+        return self._conn.execute_fetchall(sql, parameters)
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """Долгоживущие соединения с SQLite: один писатель и несколько читателей.
+
+    В режиме WAL читатели не блокируют писателя и друг друга, поэтому чтения
+    раздаются по пулу, а все записи сериализуются через единственное
+    соединение-писатель под asyncio.Lock. Транзакция записи начинается с
+    BEGIN IMMEDIATE: блокировка файла берется сразу, и при записи из
+    нескольких процессов транзакция ждет (busy_timeout), а не падает с
+    SQLITE_BUSY при переходе от чтения к записи.
+    """
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self.readers_count = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        # SQL-запросов через пул с открытия (включая фоновые задачи)
+        self.queries = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        if self.is_open:
+            return
+        # Писатель открывается первым: он переводит файл базы в режим WAL
+        self._writer = await self._connect()
+        self._idle = asyncio.Queue()
+        for _ in range(self.readers_count):
+            conn = await self._connect()
+            await conn.execute("PRAGMA query_only = ON")
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+        logging.info(f"SQLite pool opened: {self.path} (1 writer, {self.readers_count} readers)")
+
+    async def close(self):
+        if not self.is_open:
+            return
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        self._idle = None
+        async with self._write_lock:
+            await self._writer.close()
+            self._writer = None
+        logging.info("SQLite pool closed.")
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[PoolConnection]:
+        """Выдает свободное соединение-читатель на время блока."""
+        if not self.is_open:
+            raise RuntimeError("Connection pool is not open, call pool.open() first")
+        start = time.perf_counter_ns()
+        conn = await self._idle.get()
+        try:
+            yield PoolConnection(conn, self)
+        finally:
+            self._idle.put_nowait(conn)
+            # Время с ожиданием свободного соединения засчитывается текущему апдейту
+            record_db(time.perf_counter_ns() - start)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[PoolConnection]:
+        """Эксклюзивный доступ к писателю: commit при успехе, rollback при ошибке."""
+        if not self.is_open:
+            raise RuntimeError("Connection pool is not open, call pool.open() first")
+        start = time.perf_counter_ns()
+        try:
+            async with self._write_lock:
+                if not self._writer.in_transaction:
+                    await self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    yield PoolConnection(self._writer, self)
+                except BaseException:
+                    await self._writer.rollback()
+                    raise
+                else:
+                    await self._writer.commit()
+        finally:
+            record_db(time.perf_counter_ns() - start)
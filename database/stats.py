@@ -0,0 +1,139 @@
+"""Нарастающие итоги продаж.
+
+Сводные таблицы обновляются в той же транзакции, что и запись заказа или
+смена его статуса, поэтому /stats читает готовые числа вместо агрегации по
+всей истории заказов. Итоги считаются по заказам (orders.total), продажи
+товаров — в штуках по строкам заказов (order_items). Функции record_*
+принимают соединение-писатель внутри уже открытой транзакции.
+"""
+from datetime import datetime, timezone
+from typing import Tuple
+
+import aiosqlite
+
+DEFAULT_STATUS = "Новый"
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_status (
+        status TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_products (
+        product_id INTEGER PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )
+    ''',
+)
+
+
+async def create_tables(db: aiosqlite.Connection):
+    # Итоги по уже существующим заказам пересчитывает миграция строк заказов (order_items)
+    for statement in SCHEMA:
+        await db.execute(statement)
+
+
+async def record_orders(db: aiosqlite.Connection, first_id: int, last_id: int):
+    """Учитывает новые заказы с id от first_id до last_id (заказы и их строки уже записаны)."""
+    day = datetime.now(timezone.utc).date().isoformat()
+    span = (first_id, last_id)
+    await db.execute(
+        'INSERT INTO stats_totals (id, orders, revenue) '
+        'SELECT 1, COUNT(*), COALESCE(SUM(total), 0) FROM orders WHERE id BETWEEN ? AND ? '
+        'ON CONFLICT(id) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+        span
+    )
+    await db.execute(
+        'INSERT INTO stats_status (status, orders) VALUES (?, ?) '
+        'ON CONFLICT(status) DO UPDATE SET orders = orders + excluded.orders',
+        (DEFAULT_STATUS, last_id - first_id + 1)
+    )
+    await db.execute(
+        'INSERT INTO stats_products (product_id, orders, revenue) '
+        'SELECT product_id, SUM(quantity), COALESCE(SUM(quantity * unit_price), 0) FROM order_items '
+        'WHERE order_id BETWEEN ? AND ? AND product_id IS NOT NULL GROUP BY product_id '
+        'ON CONFLICT(product_id) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+        span
+    )
+    await db.execute(
+        'INSERT INTO stats_daily (day, orders, revenue) '
+        'SELECT ?, COUNT(*), COALESCE(SUM(total), 0) FROM orders WHERE id BETWEEN ? AND ? '
+        'ON CONFLICT(day) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+        (day, *span)
+    )
+
+
+async def record_status_change(db: aiosqlite.Connection, old_status: str, new_status: str):
+    if old_status == new_status:
+        return
+    await db.execute('UPDATE stats_status SET orders = orders - 1 WHERE status = ?', (old_status,))
+    await db.execute(
+        'INSERT INTO stats_status (status, orders) VALUES (?, 1) '
+        'ON CONFLICT(status) DO UPDATE SET orders = orders + 1',
+        (new_status,)
+    )
+
+
+async def read_stats(db: aiosqlite.Connection) -> dict:
+    async with db.execute('SELECT orders, revenue FROM stats_totals WHERE id = 1') as cursor:
+        row = await cursor.fetchone()
+    async with db.execute('SELECT status, orders FROM stats_status WHERE orders > 0 ORDER BY orders DESC') as cursor:
+        by_status = dict(await cursor.fetchall())
+    async with db.execute(
+        'SELECT s.product_id, p.name, s.orders, s.revenue FROM stats_products s '
+        'LEFT JOIN products p ON p.id = s.product_id ORDER BY s.revenue DESC LIMIT 5'
+    ) as cursor:
+        top_products = await cursor.fetchall()
+    async with db.execute('SELECT day, orders, revenue FROM stats_daily ORDER BY day DESC LIMIT 7') as cursor:
+        daily = await cursor.fetchall()
+    return {
+        "total_orders": row[0] if row else 0,
+        "total_sales": row[1] if row else 0.0,
+        "by_status": by_status,
+        "top_products": top_products,
+        "daily": daily,
+    }
+
+
+async def _rebuild(db: aiosqlite.Connection):
+    for table in ("stats_totals", "stats_status", "stats_products", "stats_daily"):
+        await db.execute(f'DELETE FROM {table}')
+    # Выручка считается по цене продажи из строк заказа, а не по текущей цене товара
+    await db.execute(
+        'INSERT INTO stats_totals (id, orders, revenue) '
+        'SELECT 1, COUNT(*), COALESCE(SUM(total), 0) FROM orders'
+    )
+    await db.execute('INSERT INTO stats_status (status, orders) SELECT status, COUNT(*) FROM orders GROUP BY status')
+    await db.execute(
+        'INSERT INTO stats_products (product_id, orders, revenue) '
+        'SELECT product_id, SUM(quantity), COALESCE(SUM(quantity * unit_price), 0) FROM order_items '
+        'WHERE product_id IS NOT NULL GROUP BY product_id'
+    )
+    await db.execute(
+        'INSERT INTO stats_daily (day, orders, revenue) '
+        'SELECT date(created_at), COUNT(*), COALESCE(SUM(total), 0) FROM orders GROUP BY date(created_at)'
+    )
+
+
+async def rebuild(db: aiosqlite.Connection) -> Tuple[dict, dict]:
+    """Пересчитывает итоги с нуля. Возвращает (итоги до пересчета, итоги после)."""
+    before = await read_stats(db)
+    await _rebuild(db)
+    return before, await read_stats(db)
@@ -1,7 +1,8 @@
+from aiogram.filters import Filter
 from aiogram.types import Message
 from core.config import ADMIN_IDS
 
-class IsAdmin:
+class IsAdmin(Filter):
     """Фильтр для проверки прав администратора."""
-    def __call__(self, message: Message) -> bool:
+    async def __call__(self, message: Message) -> bool:
         return message.from_user.id in ADMIN_IDS
@@ -0,0 +1,20 @@
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+
+class CallbackPrefix(Filter):
+    """Фильтр callback_data по префиксу (или точному значению при exact=True).
+
+    Асинхронный, в отличие от F.data: синхронные фильтры aiogram вызывает
+    через asyncio.to_thread, то есть с переходом в поток на каждую проверку.
+    """
+    def __init__(self, *values: str, exact: bool = False):
+        self.values = frozenset(values) if exact else tuple(values)
+        self.exact = exact
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        if callback.data is None:
+            return False
+        if self.exact:
+            return callback.data in self.values
+        return callback.data.startswith(self.values)
@@ -0,0 +1,18 @@
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+from locales.manager import locales
+
+
+class LocalizedText(Filter):
+    """Фильтр текста кнопки по ключу локали: совпадает с вариантом на любом загруженном языке."""
+    def __init__(self, key: str):
+        self.key = key
+
+    async def __call__(self, message: Message) -> bool:
+        if message.text is None:
+            return False
+        if message.from_user:
+            # Клавиатура могла остаться от прошлого запуска: язык пользователя догружается здесь
+            locales.get(locales.resolve(message.from_user.language_code))
+        return message.text in locales.variants(self.key)
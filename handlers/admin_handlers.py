@@ -1,85 +1,334 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from core.config import IMPORT_PROGRESS_INTERVAL
 from filters.admin import IsAdmin
+from filters.callback import CallbackPrefix
+from filters.text import LocalizedText
 from states.user_states import AdminState
-from database.db import add_product, get_stats, get_orders, update_order_status
+from database.db import (
+    get_stats, get_broadcasts, get_inventory, iter_orders, update_order_status, rebuild_stats, set_stock,
+)
+from database.catalog import catalog
 from utils.wait_states import show_loading_animation, finish_loading_animation
+from utils.images import best_photo_size
+from utils.photos import photos
+from utils.broadcast import broadcaster
+from utils.catalog_io import FORMATS, ImportReport, detect_format, export_file, import_file
+from utils.metrics import metrics
+from keyboards.admin_kbs import ORDER_FILTERS, get_orders_console_kb
 from locales.manager import get_text
+from typing import Tuple
+import asyncio
+import html
 import logging
+import os
+import tempfile
+import time
 
 router = Router()
 router.message.filter(IsAdmin())
+router.callback_query.filter(IsAdmin())
 
 def get_admin_lang(event: Message | CallbackQuery) -> str:
     return "ru" # For admin we can fix it to RU or use user lang
 
 
 @router.message(Command("admin"))
-@router.message(F.text.in_(["⚙️ Админ панель", "⚙️ Admin Panel"]))
+@router.message(LocalizedText("admin_panel"))
 async def admin_panel(message: Message):
     await message.answer(
         "🔧 <b>Панель администратора</b>\n\n"
         "/add_product - Добавить новый товар\n"
+        "/import_catalog - Загрузить товары из CSV/JSONL\n"
+        "/export_catalog - Выгрузить каталог (csv или jsonl)\n"
         "/orders - Список последних заказов\n"
-        "/stats - Статистика продаж",
+        "/stats - Статистика продаж\n"
+        "/stats_rebuild - Пересчитать статистику с нуля\n"
+        "/stock - Остатки по размерам\n"
+        "/reload_catalog - Перечитать каталог из базы\n"
+        "/warm_photos - Заранее загрузить фото каталога в Telegram\n"
+        "/broadcast текст - Рассылка всем пользователям\n"
+        "/broadcasts - Прогресс рассылок\n"
+        "/perf - Задержки обработчиков",
         parse_mode="HTML"
     )
 
+def _format_stats(stats: dict) -> str:
+    text = (
+        f"📦 Всего заказов: <b>{stats['total_orders']}</b>\n"
+        f"💰 Общая сумма: <b>{stats['total_sales']}$</b>"
+    )
+    if stats["by_status"]:
+        text += "\n\n🔄 <b>По статусам:</b>\n" + "\n".join(
+            f"• {status}: {count}" for status, count in stats["by_status"].items()
+        )
+    if stats["top_products"]:
+        text += "\n\n👕 <b>Топ товаров:</b>\n" + "\n".join(
+            f"• {name or f'ID {product_id}'}: {orders} шт., {revenue}$"
+            for product_id, name, orders, revenue in stats["top_products"]
+        )
+    if stats["daily"]:
+        text += "\n\n📅 <b>По дням:</b>\n" + "\n".join(
+            f"• {day}: {orders} заказов, {revenue}$" for day, orders, revenue in stats["daily"]
+        )
+    return text
+
 @router.message(Command("stats"))
 async def cmd_stats(message: Message):
     stats = await get_stats()
     await message.answer(
-        f"📊 <b>Статистика магазина:</b>\n\n"
-        f"📦 Всего заказов: <b>{stats['total_orders']}</b>\n"
-        f"💰 Общая сумма: <b>{stats['total_sales']}$</b>",
+        "📊 <b>Статистика магазина:</b>\n\n" + _format_stats(stats),
         parse_mode="HTML"
     )
 
-@router.message(Command("orders"))
-async def cmd_orders(message: Message):
-    orders = await get_orders(limit=10)
+@router.message(Command("stats_rebuild"))
+async def cmd_stats_rebuild(message: Message):
+    before, after = await rebuild_stats()
+    same = (before["total_orders"], round(before["total_sales"], 2), before["by_status"]) == \
+           (after["total_orders"], round(after["total_sales"], 2), after["by_status"])
+    await message.answer(
+        f"🧮 <b>Статистика пересчитана с нуля</b>\n"
+        f"{'✅ Совпадает с нарастающими итогами' if same else '⚠️ Расхождение, итоги исправлены'}\n\n"
+        f"<b>Было:</b> {before['total_orders']} заказов, {before['total_sales']}$\n"
+        f"<b>Стало:</b> {after['total_orders']} заказов, {after['total_sales']}$",
+        parse_mode="HTML"
+    )
+
+ORDERS_PAGE_SIZE = 8
+
+async def _render_orders(filter_key: str, cursor_id: int = 0, direction: str = "older") -> Tuple[str, InlineKeyboardMarkup, int]:
+    """Собирает страницу консоли заказов. Возвращает текст, клавиатуру и id первого заказа на странице."""
+    status = ORDER_FILTERS[filter_key][0]
+    orders = [row async for row in iter_orders(status, cursor_id, direction, limit=ORDERS_PAGE_SIZE + 1)]
+    more = len(orders) > ORDERS_PAGE_SIZE
+    if direction == "newer":
+        orders = orders[-ORDERS_PAGE_SIZE:]
+        has_newer, has_older = more, True
+    else:
+        orders = orders[:ORDERS_PAGE_SIZE]
+        has_newer, has_older = bool(cursor_id), more
+    if not orders and cursor_id:
+        # Страница опустела (например, заказы ушли из фильтра) — возвращаемся к началу
+        return await _render_orders(filter_key)
+
+    title = f"📦 <b>Заказы</b> • {ORDER_FILTERS[filter_key][1]}"
     if not orders:
-        await message.answer("Заказов пока нет.")
-        return
-        
-    for order in orders:
-        # order: (id, user_id, username, product_id, size, address, status, created_at)
-        text = (
-            f"📦 <b>Заказ #{order[0]}</b>\n"
-            f"👤 Покупатель: @{order[2]}\n"
-            f"🏠 Адрес: {order[5]}\n"
-            f"👕 Товар ID: {order[3]} (Размер {order[4]})\n"
-            f"🕒 Дата: {order[7]}\n"
-            f"🔄 Статус: <b>{order[6]}</b>"
+        return f"{title}\n\nЗаказов пока нет.", get_orders_console_kb([], filter_key, False, False), 0
+    blocks = []
+    for order_id, username, address, order_status, created_at, total, items in orders:
+        price = f" • {total}$" if total is not None else ""
+        blocks.append(
+            f"<b>#{order_id}</b> • <b>{order_status}</b> • 🕒 {created_at}{price}\n"
+            f"👕 {html.escape(items or '—')}\n"
+            f"👤 @{html.escape(username or '')} • 🏠 {html.escape(address or '')}"
         )
-        
-        builder = InlineKeyboardBuilder()
-        builder.button(text="✅ Завершить", callback_data=f"status_{order[0]}_Завершён")
-        builder.button(text="❌ Отменить", callback_data=f"status_{order[0]}_Отменён")
-        builder.adjust(2)
-        
-        await message.answer(text, reply_markup=builder.as_markup(), parse_mode="HTML")
-
-@router.callback_query(F.data.startswith("status_"))
-async def change_status(callback: CallbackQuery):
+    text = title + "\n\n" + "\n\n".join(blocks)
+    return text, get_orders_console_kb(orders, filter_key, has_newer, has_older), orders[0][0]
+
+@router.message(Command("orders"))
+async def cmd_orders(message: Message, state: FSMContext):
+    text, kb, anchor = await _render_orders("all")
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    await state.update_data(orders_view=["all", anchor])
+
+@router.callback_query(CallbackPrefix("orders_"))
+async def orders_page(callback: CallbackQuery, state: FSMContext):
+    _, filter_key, direction, cursor_id = callback.data.split("_")
+    if filter_key not in ORDER_FILTERS:
+        await callback.answer()
+        return
+    text, kb, anchor = await _render_orders(filter_key, int(cursor_id), direction)
+    await _edit_console(callback, text, kb)
+    await state.update_data(orders_view=[filter_key, anchor])
+    await callback.answer()
+
+@router.callback_query(CallbackPrefix("status_"))
+async def change_status(callback: CallbackQuery, state: FSMContext, bot: Bot):
     parts = callback.data.split("_")
     order_id = int(parts[1])
     new_status = parts[2]
     
-    await update_order_status(order_id, new_status)
-    await callback.answer(f"Статус заказа #{order_id} изменен на {new_status}")
-    
-    # Обновляем сообщение
-    text = callback.message.text
-    # Очень простой способ обновить статус в тексте (для MVP)
-    if "Статус:" in text:
-        text = text.split("Статус:")[0] + f"Статус: <b>{new_status}</b>"
+    change = await update_order_status(order_id, new_status)
+    if change.refused:
+        await callback.answer(f"❌ Нельзя снять отмену заказа #{order_id}: нужного размера больше нет на складе",
+                              show_alert=True)
+        return
+    if change.user_id is None:
+        # Статус уже такой (повторное нажатие) или заказа нет
+        await callback.answer(f"Статус заказа #{order_id} не изменился")
+    else:
+        await callback.answer(f"Статус заказа #{order_id} изменен на {new_status}")
+        # Язык покупателя не хранится в заказе, уведомление уходит на русском
+        broadcaster.notify(bot, change.user_id,
+                           get_text("order_status_changed", "ru", order_id=order_id, status=new_status))
     
-    await callback.message.edit_text(text, parse_mode="HTML")
+    # Перерисовываем текущую страницу консоли с того же заказа
+    filter_key, anchor = (await state.get_data()).get("orders_view", ["all", 0])
+    text, kb, anchor = await _render_orders(filter_key, anchor, "from")
+    await _edit_console(callback, text, kb)
+    await state.update_data(orders_view=[filter_key, anchor])
+
+async def _edit_console(callback: CallbackQuery, text: str, kb: InlineKeyboardMarkup):
+    try:
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # Повторное нажатие той же кнопки: содержимое не изменилось
+        if "message is not modified" not in str(e):
+            raise
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    rows = metrics.summary()
+    if not rows:
+        await message.answer("Метрик пока нет.")
+        return
+    # Миллисекунды: p50 и p99 полного времени, p50 времени в базе и в Bot API
+    lines = [f"{'handler':<20} {'n':>6} {'p50':>7} {'p99':>7} {'db50':>6} {'api50':>6}"]
+    for name, count, wall, db, api, errors in rows[:15]:
+        lines.append(
+            f"{name[:20]:<20} {count:>6} {wall[0] / 1000:>7.1f} {wall[2] / 1000:>7.1f} "
+            f"{db[0] / 1000:>6.1f} {api[0] / 1000:>6.1f}" + (f" ⚠️{errors}" if errors else "")
+        )
+    await message.answer(
+        "⏱ <b>Задержки обработчиков, мс</b>\n<pre>" + html.escape("\n".join(lines)) + "</pre>",
+        parse_mode="HTML"
+    )
+
+@router.message(Command("stock"))
+async def cmd_stock(message: Message, command: CommandObject):
+    args = (command.args or "").split()
+    if not args:
+        rows = await get_inventory()
+        if not rows:
+            await message.answer(
+                "Остатки не ведутся: все размеры продаются без ограничений.\n"
+                "Задать остаток: <code>/stock id_товара размер количество</code>",
+                parse_mode="HTML"
+            )
+            return
+        lines = [
+            f"• #{product_id} {html.escape(name or '?')}, {html.escape(size)}: <b>{stock}</b>"
+            + (f" (+{held} в брони)" if held else "")
+            for product_id, name, size, stock, held in rows
+        ]
+        await message.answer("📦 <b>Остатки</b>\n\n" + "\n".join(lines), parse_mode="HTML")
+        return
+    if len(args) != 3 or not args[0].isdigit() or not (args[2].isdigit() or args[2] == "-"):
+        await message.answer(
+            "Формат: <code>/stock id_товара размер количество</code>\n"
+            "<code>/stock id_товара размер -</code> — снять размер с учета",
+            parse_mode="HTML"
+        )
+        return
+    product_id, size = int(args[0]), args[1]
+    product = await catalog.get_product(product_id)
+    if not product:
+        await message.answer(f"Товар #{product_id} не найден.")
+        return
+    sizes = product.size_list
+    if size not in sizes:
+        await message.answer(f"У товара #{product_id} нет размера {html.escape(size)}. Размеры: {html.escape(', '.join(sizes))}",
+                             parse_mode="HTML")
+        return
+    stock = None if args[2] == "-" else int(args[2])
+    await set_stock(product_id, size, stock)
+    if stock is None:
+        await message.answer(f"Размер {html.escape(size)} товара #{product_id} снят с учета остатков.", parse_mode="HTML")
+    else:
+        await message.answer(f"✅ Остаток #{product_id} {html.escape(size)}: <b>{stock}</b> шт.", parse_mode="HTML")
+
+@router.message(Command("reload_catalog"))
+async def cmd_reload_catalog(message: Message):
+    await catalog.reload()
+    stats = catalog.stats()
+    await message.answer(
+        f"🔄 <b>Каталог перезагружен</b>\n\n"
+        f"📦 Товаров: <b>{stats['size']}</b> (версия {stats['version']})\n"
+        f"🎯 Попаданий в кэш: <b>{stats['hits']}</b>, промахов: <b>{stats['misses']}</b>",
+        parse_mode="HTML"
+    )
+
+@router.message(Command("warm_photos"))
+async def cmd_warm_photos(message: Message, bot: Bot):
+    loading_id = await show_loading_animation(bot, message.chat.id, "⏳ <i>Загружаем фото каталога...</i>")
+    uploaded = await photos.warm_up(bot, message.chat.id, await catalog.get_products())
+    await finish_loading_animation(bot, message.chat.id, loading_id)
+    stats = photos.stats()
+    await message.answer(
+        f"📸 <b>Фото каталога</b>\n\n"
+        f"⬆️ Загружено сейчас: <b>{uploaded}</b>\n"
+        f"🗂 В реестре file_id: <b>{stats['cached']}</b>\n"
+        f"📤 Загрузок с диска: <b>{stats['uploads']}</b> ({stats['bytes_uploaded'] // 1024} КБ), "
+        f"повторных отправок по file_id: <b>{stats['reuses']}</b>",
+        parse_mode="HTML"
+    )
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject, state: FSMContext):
+    if not command.args:
+        await message.answer("✍️ Укажите текст: <code>/broadcast текст рассылки</code> (можно с HTML-разметкой)", parse_mode="HTML")
+        return
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🚀 Отправить всем", callback_data="broadcast_send")
+    builder.button(text="✖️ Отмена", callback_data="broadcast_drop")
+    try:
+        # Предпросмотр заодно проверяет разметку до отправки всем пользователям
+        await message.answer(command.args, reply_markup=builder.as_markup(), parse_mode="HTML")
+    except TelegramBadRequest as e:
+        await message.answer(f"❌ Telegram не принял текст: {html.escape(str(e))}", parse_mode="HTML")
+        return
+    await state.update_data(broadcast_text=command.args)
+
+@router.callback_query(CallbackPrefix("broadcast_send", "broadcast_drop", exact=True))
+async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    text = data.get("broadcast_text")
+    await state.update_data(broadcast_text=None)
+    await callback.message.edit_reply_markup(reply_markup=None)
+    if callback.data == "broadcast_drop" or not text:
+        await callback.answer("Рассылка отменена")
+        return
+    broadcast_id = await broadcaster.submit(text)
+    await callback.answer()
+    await callback.message.answer(
+        f"📣 Рассылка <b>#{broadcast_id}</b> поставлена в очередь.\n"
+        f"Прогресс: /broadcasts, остановить: <code>/broadcast_cancel {broadcast_id}</code>",
+        parse_mode="HTML"
+    )
+
+@router.message(Command("broadcasts"))
+async def cmd_broadcasts(message: Message):
+    jobs = await get_broadcasts()
+    if not jobs:
+        await message.answer("Рассылок пока не было.")
+        return
+    lines = []
+    for job in jobs:
+        done = job.sent + job.failed + job.blocked
+        percent = done * 100 // job.total if job.total else 100
+        preview = html.escape(job.text[:40]) + ("…" if len(job.text) > 40 else "")
+        lines.append(
+            f"<b>#{job.id}</b> • {job.status} • {percent}% ({done}/{job.total})\n"
+            f"✅ {job.sent} • 🚫 заблокировали: {job.blocked} • ❌ ошибки: {job.failed}\n"
+            f"<i>{preview}</i>"
+        )
+    await message.answer("📣 <b>Рассылки</b>\n\n" + "\n\n".join(lines), parse_mode="HTML")
+
+@router.message(Command("broadcast_cancel"))
+async def cmd_broadcast_cancel(message: Message, command: CommandObject):
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Укажите номер рассылки: /broadcast_cancel 1")
+        return
+    broadcast_id = int(command.args)
+    if await broadcaster.cancel(broadcast_id):
+        await message.answer(f"⏹ Рассылка #{broadcast_id} остановлена.")
+    else:
+        await message.answer(f"Рассылка #{broadcast_id} не найдена или уже завершена.")
 
 @router.message(Command("add_product"))
 async def cmd_add_product(message: Message, state: FSMContext):
@@ -116,7 +365,8 @@ async def admin_add_sizes(message: Message, state: FSMContext):
 
 @router.message(AdminState.waiting_for_photo, F.photo)
 async def admin_add_photo(message: Message, state: FSMContext, bot: Bot):
-    photo_id = message.photo[-1].file_id
+    # Для карточки хватает размера до IMAGE_MAX_SIDE: самый большой вариант покупателям не нужен
+    photo_id = best_photo_size(message.photo).file_id
     await _save_product(message, state, bot, photo_id)
 
 @router.message(AdminState.waiting_for_photo, F.text == "none")
@@ -128,7 +378,7 @@ async def _save_product(message: Message, state: FSMContext, bot: Bot, photo_id:
     
     loading_id = await show_loading_animation(bot, message.chat.id, "⏳ <i>Сохраняем товар в базу данных...</i>")
     
-    await add_product(
+    await catalog.add_product(
         name=data['name'], 
         description=data['desc'], 
         price=data['price'], 
@@ -140,3 +390,104 @@ async def _save_product(message: Message, state: FSMContext, bot: Bot, photo_id:
     
     await message.answer("✅ <b>Товар успешно добавлен в каталог!</b>", parse_mode="HTML")
     await state.clear()
+
+@router.message(Command("import_catalog"))
+async def cmd_import_catalog(message: Message, state: FSMContext):
+    await message.answer(
+        "📥 Отправьте файл <b>CSV</b> или <b>JSONL</b> с товарами.\n\n"
+        "Колонки: <code>id, name, description, price, sizes, photo_id</code>. "
+        "Товар с id обновляется, без id — добавляется новым. "
+        "Пример файла — /export_catalog.",
+        parse_mode="HTML"
+    )
+    await state.set_state(AdminState.waiting_for_import)
+
+class _ImportProgress:
+    """Прогресс импорта в одном сообщении: правится не чаще IMPORT_PROGRESS_INTERVAL."""
+
+    def __init__(self, bot: Bot, message: Message):
+        self.bot = bot
+        self.message = message
+        self.last = time.monotonic()
+
+    async def update(self, report: ImportReport):
+        if not report.finished and time.monotonic() - self.last < IMPORT_PROGRESS_INTERVAL:
+            return
+        self.last = time.monotonic()
+        rate = report.rows / report.elapsed if report.elapsed else 0
+        if report.failed:
+            title = '❌ <b>Импорт прерван</b>'
+        elif report.finished:
+            title = '✅ <b>Импорт завершен</b>'
+        else:
+            title = '⏳ <b>Импорт каталога...</b>'
+        text = (
+            f"{title}\n\n"
+            f"📄 Прочитано строк: <b>{report.rows}</b> ({rate:.0f}/с)\n"
+            f"📦 Загружено товаров: <b>{report.imported}</b>, изменено в базе: <b>{report.changed}</b>\n"
+            f"⚠️ Пропущено с ошибками: <b>{report.skipped}</b>"
+        )
+        if report.finished and report.errors:
+            text += "\n\n" + "\n".join(f"• {html.escape(error)}" for error in report.errors)
+            if report.skipped > len(report.errors):
+                text += f"\n… и еще {report.skipped - len(report.errors)}"
+        if report.failed:
+            text += f"\n\n❌ {html.escape(report.failed)}\nТовары из уже загруженных пачек сохранены."
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.message.chat.id, message_id=self.message.message_id,
+                                             parse_mode="HTML")
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+
+@router.message(AdminState.waiting_for_import, F.document)
+async def admin_import_document(message: Message, state: FSMContext, bot: Bot):
+    fmt = detect_format(message.document.file_name or "")
+    if fmt is None:
+        await message.answer("❌ Нужен файл .csv или .jsonl")
+        return
+    await state.clear()
+    status = await message.answer("⏳ <i>Скачиваем файл...</i>", parse_mode="HTML")
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    report = ImportReport()
+    try:
+        try:
+            # Файл пишется на диск потоком и читается оттуда построчно
+            await bot.download(message.document, destination=path)
+        except TelegramBadRequest as e:
+            await bot.edit_message_text(f"❌ Не удалось скачать файл: {html.escape(str(e))}", chat_id=message.chat.id,
+                                        message_id=status.message_id, parse_mode="HTML")
+            return
+        await import_file(path, fmt, progress=_ImportProgress(bot, status).update, report=report)
+    finally:
+        os.remove(path)
+        # Записанные пачки остаются в базе и при прерванном импорте: кэш перечитывается в любом случае
+        if report.changed:
+            await _reload_after_import()
+    logging.info(f"Catalog import: {report.imported} rows, {report.changed} changed, {report.skipped} skipped"
+                 + (f", stopped: {report.failed}" if report.failed else ""))
+
+async def _reload_after_import():
+    # Кэш каталога перечитывается один раз после импорта, новые локальные фото сжимаются в фоне
+    await catalog.load()
+    products = await catalog.get_products()
+    local = await asyncio.to_thread(lambda: [p for p in products if p.has_photo and os.path.isfile(p.photo_id)])
+    if local:
+        photos.schedule_prepare(local)
+
+@router.message(Command("export_catalog"))
+async def cmd_export_catalog(message: Message, command: CommandObject):
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in FORMATS:
+        await message.answer("Формат: <code>/export_catalog csv</code> или <code>/export_catalog jsonl</code>",
+                             parse_mode="HTML")
+        return
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        count = await export_file(path, fmt)
+        await message.answer_document(FSInputFile(path, filename=f"catalog.{fmt}"),
+                                      caption=f"📦 Товаров в выгрузке: {count}")
+    finally:
+        os.remove(path)
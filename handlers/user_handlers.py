@@ -1,43 +1,75 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile
-import os
-from aiogram.filters import CommandStart
+from aiogram.types import (
+    Message, CallbackQuery, InlineQuery, InlineQueryResultArticle, InputTextMessageContent,
+    InlineKeyboardMarkup, InlineKeyboardButton,
+)
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 
-from keyboards.user_kbs import get_main_kb, get_catalog_kb, get_product_sizes_kb, get_buy_kb
-from database.db import get_products, get_product, create_order
+from core.config import CATALOG_PAGE_SIZE, RESERVATION_TTL
+from keyboards.user_kbs import get_main_kb, get_catalog_kb, get_search_kb, get_cart_kb
+from database.order_writer import order_writer
+from database.catalog import catalog
+from database.db import CartItem, ProductsPage, search_products
 from utils.wait_states import show_loading_animation, finish_loading_animation
-from states.user_states import OrderState
+from utils.photos import photos
+from utils.cards import ProductCard, cards
+from utils.cart import CART_MAX_UNITS, add_to_cart, cart_items, cart_units, clear_cart, get_cart, remove_line
+from states.user_states import OrderState, SearchState
 from filters.admin import IsAdmin
-from locales.manager import get_text
+from filters.callback import CallbackPrefix
+from filters.text import LocalizedText
+from locales.manager import get_text, locales
+from typing import List, Tuple
+import html
 import logging
+import uuid
 
 router = Router()
 
+# Результатов на одну порцию inline-режима
+INLINE_PAGE_SIZE = 20
+
 def get_lang(event: Message | CallbackQuery) -> str:
     """Helper to get user language."""
-    if event.from_user.language_code == "en":
-        return "en"
-    return "ru"
+    return locales.resolve(event.from_user.language_code)
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, command: CommandObject, bot: Bot):
     lang = get_lang(message)
-    is_admin = IsAdmin()(message)
+    is_admin = await IsAdmin()(message)
     await message.answer(
         get_text("welcome", lang),
         reply_markup=get_main_kb(is_admin, lang),
         parse_mode="HTML"
     )
+    # Ссылка из inline-режима: t.me/<bot>?start=prod_<id> сразу открывает карточку товара
+    if command.args and command.args.startswith("prod_") and command.args[5:].isdigit():
+        card = await cards.render(int(command.args[5:]), lang)
+        if not card:
+            await message.answer(get_text("product_not_found", lang))
+            return
+        await send_product_card(bot, message.chat.id, card)
 
-@router.message(F.text.in_(["🛍 Каталог", "🛍 Catalog"]))
-@router.callback_query(F.data == "catalog")
+@router.message(LocalizedText("catalog"))
+@router.callback_query(CallbackPrefix("catalog", exact=True))
+@router.callback_query(CallbackPrefix("catalog_"))
 async def show_catalog(event: Message | CallbackQuery, bot: Bot):
     lang = get_lang(event)
-    products = await get_products()
+    
+    # Курсор страницы: catalog_next_<последний id> или catalog_prev_<первый id>
+    after_id, before_id = 0, None
+    if isinstance(event, CallbackQuery) and event.data.startswith("catalog_"):
+        _, direction, cursor_id = event.data.split("_")
+        if direction == "prev":
+            before_id = int(cursor_id)
+        else:
+            after_id = int(cursor_id)
+    page = await catalog.get_page(after_id=after_id, before_id=before_id)
+    products = page.items
     
     text = get_text("catalog_title", lang)
-    kb = get_catalog_kb(products, lang)
+    kb = get_catalog_kb(page, lang)
     
     if isinstance(event, Message):
         if not products:
@@ -63,17 +95,17 @@ async def show_catalog(event: Message | CallbackQuery, bot: Bot):
             
         await event.answer()
 
-@router.message(F.text.in_(["ℹ️ Помощь", "ℹ️ Help"]))
+@router.message(LocalizedText("help"))
 async def cmd_help(message: Message):
     lang = get_lang(message)
     await message.answer(get_text("help_text", lang), parse_mode="HTML")
 
-@router.message(F.text.in_(["📞 Менеджер", "📞 Manager"]))
+@router.message(LocalizedText("manager"))
 async def cmd_manager(message: Message):
     lang = get_lang(message)
     await message.answer(get_text("manager_text", lang), parse_mode="HTML")
 
-@router.callback_query(F.data == "close_catalog")
+@router.callback_query(CallbackPrefix("close_catalog", exact=True))
 async def close_catalog(callback: CallbackQuery):
     try:
         await callback.message.delete()
@@ -81,117 +113,280 @@ async def close_catalog(callback: CallbackQuery):
         logging.error(f"Error deleting message in close_catalog: {e}")
     await callback.answer()
 
-@router.callback_query(F.data.startswith("prod_"))
+@router.callback_query(CallbackPrefix("prod_"))
 async def show_product(callback: CallbackQuery, bot: Bot):
     lang = get_lang(callback)
     product_id = int(callback.data.split("_")[1])
-    product = await get_product(product_id)
+    card = await cards.render(product_id, lang)
     
-    if not product:
+    if not card:
         await callback.answer(get_text("product_not_found", lang), show_alert=True)
         return
         
-    _, name, desc, price, sizes, photo_id = product
-    price_text = get_text("price", lang)
-    text = f"👕 <b>{name}</b>\n\n📝 <i>{desc}</i>\n\n💰 <b>{price_text}:</b> {price}$"
-    
-    kb = get_product_sizes_kb(product_id, sizes, lang)
-    
-    if photo_id and photo_id != "none":
+    if card.photo_id:
         # Удаляем предыдущее сообщение с текстом (если было) для чистоты UI
         try:
             await callback.message.delete()
         except Exception as e:
             logging.error(f"Error deleting message in show_product: {e}")
-            
-        # Определяем, это путь к файлу или URL/file_id
-        photo = photo_id
-        if os.path.exists(photo_id):
-            photo = FSInputFile(photo_id)
-            
-        await bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=photo,
-            caption=text + f"\n\n{get_text('select_size', lang)}",
-            parse_mode="HTML",
-            reply_markup=kb
-        )
+        await send_product_card(bot, callback.message.chat.id, card)
     else:
-        await callback.message.edit_text(
-            text + f"\n\n{get_text('select_size', lang)}", 
-            reply_markup=kb,
-            parse_mode="HTML"
-        )
+        await callback.message.edit_text(card.text, reply_markup=card.reply_markup, parse_mode="HTML")
     await callback.answer()
 
-@router.callback_query(F.data.startswith("size_"))
+async def send_product_card(bot: Bot, chat_id: int, card: ProductCard):
+    """Отправляет карточку товара с выбором размера новым сообщением."""
+    if card.photo_id:
+        # Локальный файл загружается один раз, дальше отправляется по сохраненному file_id
+        await photos.send_photo(bot, chat_id=chat_id, photo_id=card.photo_id, caption=card.text, parse_mode="HTML",
+                                reply_markup=card.reply_markup)
+    else:
+        await bot.send_message(chat_id, card.text, reply_markup=card.reply_markup, parse_mode="HTML")
+
+@router.callback_query(CallbackPrefix("size_"))
 async def select_size(callback: CallbackQuery):
     lang = get_lang(callback)
     parts = callback.data.split("_")
     product_id = int(parts[1])
     size = parts[2]
     
-    product = await get_product(product_id)
-    if not product:
+    # Готовая карточка из кэша: товар читается из каталога только при первом показе
+    card = await cards.render(product_id, lang, size)
+    if not card:
         await callback.answer(get_text("product_not_found", lang), show_alert=True)
         return
-        
-    _, name, desc, price, sizes, photo_id = product
-    price_text = get_text("price", lang)
-    sel_size_text = get_text("selected_size", lang, size=size)
-    text = f"👕 <b>{name}</b>\n\n📝 <i>{desc}</i>\n💰 <b>{price_text}:</b> {price}$\n\n{sel_size_text}"
-    
-    kb = get_buy_kb(product_id, size, lang)
     
     # Обновляем сообщение (показываем кнопку купить и выбранный размер)
     if callback.message.photo:
-        await callback.message.edit_caption(caption=text, reply_markup=kb, parse_mode="HTML")
+        await callback.message.edit_caption(caption=card.text, reply_markup=card.reply_markup, parse_mode="HTML")
     else:
-        await callback.message.edit_text(text=text, reply_markup=kb, parse_mode="HTML")
+        await callback.message.edit_text(text=card.text, reply_markup=card.reply_markup, parse_mode="HTML")
         
     await callback.answer()
 
-@router.callback_query(F.data.startswith("buy_"))
+@router.callback_query(CallbackPrefix("buy_"))
 async def process_buy(callback: CallbackQuery, state: FSMContext):
     lang = get_lang(callback)
     parts = callback.data.split("_")
     product_id = int(parts[1])
     size = parts[2]
     
-    await state.update_data(product_id=product_id, size=size, lang=lang)
+    if cart_units(await get_cart(state)) >= CART_MAX_UNITS:
+        await callback.answer(get_text("cart_full", lang, limit=CART_MAX_UNITS), show_alert=True)
+        return
+    # Единица товара бронируется сразу: пока покупатель собирает корзину, ее не купит никто другой
+    items = await add_to_cart(state, callback.from_user.id, product_id, size)
+    if items is None:
+        await callback.answer(get_text("sold_out", lang, size=size), show_alert=True)
+        return
+    await callback.answer(get_text("cart_added", lang))
     
     # Удаляем карточку с кнопками, чтобы очистить чат
     await callback.message.delete()
+    text, kb = await render_cart(items, lang)
+    await callback.message.answer(text, reply_markup=kb, parse_mode="HTML")
+
+async def render_cart(items: List[CartItem], lang: str) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура корзины; цены — текущие из каталога (в заказ сумма считается в базе)."""
+    if not items:
+        return get_text("cart_empty", lang), get_cart_kb([], lang)
+    lines, labels, total = [], [], 0.0
+    for item in items:
+        product = await catalog.get_product(item.product_id)
+        name, price = (product.name, product.price) if product else (f"#{item.product_id}", 0.0)
+        amount = price * item.quantity
+        total += amount
+        lines.append(get_text("cart_line", lang, name=html.escape(name), size=item.size,
+                              quantity=item.quantity, amount=amount))
+        labels.append((item.product_id, item.size, f"{name} ({item.size})"))
+    text = "\n".join([get_text("cart_title", lang), "", *lines, "", get_text("cart_total", lang, total=total)])
+    return text, get_cart_kb(labels, lang)
+
+@router.message(Command("cart"))
+@router.message(LocalizedText("cart"))
+@router.callback_query(CallbackPrefix("cart", exact=True))
+async def show_cart(event: Message | CallbackQuery, state: FSMContext):
+    lang = get_lang(event)
+    text, kb = await render_cart(await get_cart(state), lang)
+    if isinstance(event, Message):
+        await event.answer(text, reply_markup=kb, parse_mode="HTML")
+        return
+    if event.message.photo:
+        await event.message.delete()
+        await event.message.answer(text, reply_markup=kb, parse_mode="HTML")
+    else:
+        await event.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    await event.answer()
+
+@router.callback_query(CallbackPrefix("cart_del_"))
+async def cart_remove_line(callback: CallbackQuery, state: FSMContext):
+    lang = get_lang(callback)
+    # cart_del_<product_id>_<размер>: в размере нет "_"
+    _, _, product_id, size = callback.data.split("_", 3)
+    items = await remove_line(state, int(product_id), size)
+    text, kb = await render_cart(items, lang)
+    await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    await callback.answer()
+
+@router.callback_query(CallbackPrefix("cart_clear", exact=True))
+async def cart_clear(callback: CallbackQuery, state: FSMContext):
+    lang = get_lang(callback)
+    await clear_cart(state)
+    await callback.message.edit_text(get_text("cart_empty", lang), reply_markup=get_cart_kb([], lang))
+    await callback.answer()
+
+@router.callback_query(CallbackPrefix("cart_checkout", exact=True))
+async def cart_checkout(callback: CallbackQuery, state: FSMContext):
+    lang = get_lang(callback)
+    items = await get_cart(state)
+    if not items:
+        await callback.answer(get_text("cart_empty", lang), show_alert=True)
+        return
+    # Ключ оформления: повторная отправка адреса (или повторная доставка апдейта) вернет тот же заказ
+    await state.update_data(lang=lang, order_key=uuid.uuid4().hex)
     
+    # Удаляем корзину с кнопками, чтобы очистить чат
+    await callback.message.delete()
+    
+    text = get_text("enter_address", lang)
+    if any(item.reservations for item in items):
+        text += "\n\n" + get_text("reserved_for", lang, minutes=RESERVATION_TTL // 60)
     await callback.message.answer(
-        get_text("enter_address", lang), 
+        text, 
         parse_mode="HTML"
     )
     await state.set_state(OrderState.waiting_for_address)
     await callback.answer()
 
-@router.message(OrderState.waiting_for_address)
+@router.message(Command("search"))
+@router.message(LocalizedText("search"))
+async def cmd_search(message: Message, state: FSMContext, command: CommandObject | None = None):
+    lang = get_lang(message)
+    if command and command.args:
+        await show_search_results(message, state, command.args, lang)
+        return
+    await state.set_state(SearchState.waiting_for_query)
+    await message.answer(get_text("search_prompt", lang))
+
+# Команды, кнопки меню (их обработчики выше) и сообщения из inline-режима адресом не считаются
+@router.message(OrderState.waiting_for_address, F.text, ~F.via_bot, ~F.text.startswith("/"))
 async def process_address(message: Message, state: FSMContext, bot: Bot):
     address = message.text
     data = await state.get_data()
-    product_id = data['product_id']
-    size = data['size']
+    items = cart_items(data)
     lang = data.get('lang', 'ru')
+    if not items:
+        # Корзину очистили, пока бот ждал адрес (/cart и "Очистить" или ❌)
+        await message.answer(get_text("cart_empty", lang), reply_markup=get_main_kb(await IsAdmin()(message), lang))
+        await state.clear()
+        return
     
     loading_id = await show_loading_animation(bot, message.chat.id, get_text("loading_order", lang))
     
     username = message.from_user.username or "Unknown"
     user_id = message.from_user.id
     
-    order_id = await create_order(user_id, username, product_id, size, address)
+    # Вся корзина — один заказ; он уходит в общую очередь и пишется пачкой вместе с заказами других покупателей
+    placed = await order_writer.submit(user_id, username, address, items, data.get("order_key"))
     
     await finish_loading_animation(bot, message.chat.id, loading_id)
     
-    is_admin = IsAdmin()(message)
+    is_admin = await IsAdmin()(message)
+    parts = []
+    if placed.order_id:
+        parts.append(get_text("order_success", lang, order_id=placed.order_id))
+        parts.append(get_text("order_total", lang, total=placed.total))
+    if placed.sold_out:
+        # Брони истекли, и за это время часть размеров раскупили
+        missing = []
+        for item in placed.sold_out:
+            product = await catalog.get_product(item.product_id)
+            name = html.escape(product.name) if product else f"#{item.product_id}"
+            missing.append(f"{name} ({item.size}) ×{item.quantity}")
+        missing = ", ".join(missing)
+        parts.append(get_text("cart_unavailable", lang, items=missing))
     await message.answer(
-        get_text("order_success", lang, order_id=order_id), 
+        "\n\n".join(parts), 
         parse_mode="HTML",
         reply_markup=get_main_kb(is_admin, lang)
     )
     
     await state.clear()
+
+@router.message(SearchState.waiting_for_query, F.text)
+async def process_search_query(message: Message, state: FSMContext):
+    await state.set_state(None)
+    await show_search_results(message, state, message.text, get_lang(message))
+
+async def search_page(query: str, offset: int) -> ProductsPage:
+    # Лишняя запись показывает, есть ли следующая страница
+    rows = await search_products(query, limit=CATALOG_PAGE_SIZE + 1, offset=offset)
+    return ProductsPage(rows[:CATALOG_PAGE_SIZE], offset > 0, len(rows) > CATALOG_PAGE_SIZE)
+
+async def show_search_results(message: Message, state: FSMContext, query: str, lang: str):
+    query = query.strip()[:100]
+    page = await search_page(query, 0)
+    if not page.items:
+        await message.answer(get_text("search_empty", lang, query=html.escape(query)), parse_mode="HTML")
+        return
+    # Запрос хранится в данных FSM: в callback_data (64 байта) он может не поместиться
+    await state.update_data(search_query=query)
+    await message.answer(
+        get_text("search_results", lang, query=html.escape(query)),
+        reply_markup=get_search_kb(page, 0, CATALOG_PAGE_SIZE, lang),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(CallbackPrefix("search_"))
+async def search_results_page(callback: CallbackQuery, state: FSMContext):
+    lang = get_lang(callback)
+    offset = int(callback.data.split("_")[1])
+    query = (await state.get_data()).get("search_query")
+    page = await search_page(query, offset) if query else None
+    if not page or not page.items:
+        # Запрос потерян (например, после оформления заказа) — предлагаем искать заново
+        await callback.answer(get_text("search_prompt", lang), show_alert=True)
+        return
+    text = get_text("search_results", lang, query=html.escape(query))
+    kb = get_search_kb(page, offset, CATALOG_PAGE_SIZE, lang)
+    if callback.message.photo:
+        await callback.message.delete()
+        await callback.message.answer(text, reply_markup=kb, parse_mode="HTML")
+    else:
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    await callback.answer()
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery, bot: Bot):
+    """Inline-режим (@бот запрос): товары из поиска, пустой запрос — начало каталога."""
+    lang = get_lang(inline_query)
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    if inline_query.query.strip():
+        rows = await search_products(inline_query.query, limit=INLINE_PAGE_SIZE, offset=offset)
+        product_ids = [product_id for product_id, _ in rows]
+    else:
+        product_ids = [product.id for product in (await catalog.get_products())[offset:offset + INLINE_PAGE_SIZE]]
+    me = await bot.me()
+    results = []
+    for product_id in product_ids:
+        product = await catalog.get_product(product_id)
+        if not product:
+            continue
+        results.append(InlineQueryResultArticle(
+            id=str(product_id),
+            title=product.name,
+            description=f"{product.price}$ · {product.sizes}\n{product.description or ''}",
+            thumbnail_url=await photos.thumbnail_url(product.photo_id),
+            input_message_content=InputTextMessageContent(
+                message_text=get_text("inline_card", lang, name=html.escape(product.name), price=product.price),
+                parse_mode="HTML",
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text=get_text("open_in_bot", lang), url=f"https://t.me/{me.username}?start=prod_{product_id}",
+            )]]),
+        ))
+    await inline_query.answer(
+        results,
+        cache_time=30,
+        next_offset=str(offset + INLINE_PAGE_SIZE) if len(product_ids) == INLINE_PAGE_SIZE else "",
+    )
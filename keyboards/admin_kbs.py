@@ -0,0 +1,34 @@
+from typing import List, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+# Фильтры консоли заказов: ключ в callback_data -> (статус в БД, подпись кнопки)
+ORDER_FILTERS = {
+    "all": (None, "Все"),
+    "new": ("Новый", "Новые"),
+    "done": ("Завершён", "Завершённые"),
+    "cancel": ("Отменён", "Отменённые"),
+}
+
+def get_orders_console_kb(orders: List[Tuple], filter_key: str, has_newer: bool, has_older: bool) -> InlineKeyboardMarkup:
+    """Клавиатура консоли заказов: смена статуса, фильтры и листание."""
+    builder = InlineKeyboardBuilder()
+    for order in orders:
+        order_id = order[0]
+        builder.row(
+            InlineKeyboardButton(text=f"✅ #{order_id}", callback_data=f"status_{order_id}_Завершён"),
+            InlineKeyboardButton(text=f"❌ #{order_id}", callback_data=f"status_{order_id}_Отменён"),
+        )
+    builder.row(*(
+        InlineKeyboardButton(text=("• " if key == filter_key else "") + label, callback_data=f"orders_{key}_older_0")
+        for key, (_, label) in ORDER_FILTERS.items()
+    ))
+    nav = []
+    if has_newer and orders:
+        nav.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=f"orders_{filter_key}_newer_{orders[0][0]}"))
+    if has_older and orders:
+        nav.append(InlineKeyboardButton(text="Старее ➡️", callback_data=f"orders_{filter_key}_older_{orders[-1][0]}"))
+    if nav:
+        builder.row(*nav)
+    return builder.as_markup()
@@ -1,32 +1,108 @@
-from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from database.catalog import catalog
+from database.db import ProductsPage
 from locales.manager import get_text
 
+# Сколько готовых inline-клавиатур держим в памяти (LRU)
+KB_CACHE_SIZE = 2048
+
+
+class KeyboardCache:
+    """LRU-кэш готовых InlineKeyboardMarkup.
+
+    Клавиатуры зависят только от (версии каталога, товара, размера, языка),
+    поэтому собираются один раз. При смене версии каталога кэш сбрасывается целиком.
+    Тем же кэшем держатся готовые карточки товаров (utils/cards.py).
+    """
+
+    def __init__(self, maxsize: int = KB_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Значение из кэша или None (промах)."""
+        if self._version != catalog.version:
+            self._items.clear()
+            self._version = catalog.version
+        value = self._items.get(key)
+        if value is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        self._items[key] = value
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return value
+
+    def get_or_build(self, key: Hashable, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        markup = self.get(key)
+        if markup is None:
+            markup = self.put(key, build())
+        return markup
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+kb_cache = KeyboardCache()
+
+
+@lru_cache(maxsize=8)
 def get_main_kb(is_admin: bool = False, lang: str = "ru") -> ReplyKeyboardMarkup:
     """Главное меню с Reply-кнопками."""
     keyboard=[
-        [KeyboardButton(text=get_text("catalog", lang))],
+        [KeyboardButton(text=get_text("catalog", lang)), KeyboardButton(text=get_text("cart", lang))],
+        [KeyboardButton(text=get_text("search", lang))],
         [KeyboardButton(text=get_text("help", lang)), KeyboardButton(text=get_text("manager", lang))]
     ]
     if is_admin:
         keyboard.append([KeyboardButton(text=get_text("admin_panel", lang))])
-        
+
     return ReplyKeyboardMarkup(
         keyboard=keyboard,
         resize_keyboard=True
     )
 
-def get_catalog_kb(products, lang: str = "ru") -> InlineKeyboardMarkup:
-    """Клавиатура с товарами из БД (inline)."""
+def build_catalog_kb(page: ProductsPage, lang: str = "ru",
+                     prev_data: Optional[str] = None, next_data: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Клавиатура одной страницы каталога (inline) с кнопками листания.
+
+    По умолчанию листание идет по курсору id (catalog_prev_/catalog_next_),
+    результаты поиска передают свои callback_data для соседних страниц.
+    """
     builder = InlineKeyboardBuilder()
-    for prod in products:
-        # prod: (id, name, desc, price, sizes, photo_id)
-        builder.button(text=prod[1], callback_data=f"prod_{prod[0]}")
-    builder.button(text=get_text("close", lang), callback_data="close_catalog")
-    builder.adjust(1)
+    for product_id, name in page.items:
+        builder.row(InlineKeyboardButton(text=name, callback_data=f"prod_{product_id}"))
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton(text=get_text("prev_page", lang), callback_data=prev_data or f"catalog_prev_{page.items[0][0]}"))
+    if page.has_next:
+        nav.append(InlineKeyboardButton(text=get_text("next_page", lang), callback_data=next_data or f"catalog_next_{page.items[-1][0]}"))
+    if nav:
+        builder.row(*nav)
+    # Поиск открывает inline-режим прямо в этом чате
+    builder.row(
+        InlineKeyboardButton(text=get_text("search", lang), switch_inline_query_current_chat=""),
+        InlineKeyboardButton(text=get_text("close", lang), callback_data="close_catalog"),
+    )
     return builder.as_markup()
 
-def get_product_sizes_kb(product_id: int, sizes: str, lang: str = "ru") -> InlineKeyboardMarkup:
+def build_product_sizes_kb(product_id: int, sizes: str, lang: str = "ru") -> InlineKeyboardMarkup:
     """Генерация Inline-кнопок для выбора размера."""
     builder = InlineKeyboardBuilder()
     for size in sizes.split(','):
@@ -36,10 +112,40 @@ def get_product_sizes_kb(product_id: int, sizes: str, lang: str = "ru") -> Inlin
     builder.adjust(2) # Размеры по 2 в ряд
     return builder.as_markup()
 
-def get_buy_kb(product_id: int, size: str, lang: str = "ru") -> InlineKeyboardMarkup:
-    """Кнопка покупки после выбора размера."""
+def build_buy_kb(product_id: int, size: str, lang: str = "ru") -> InlineKeyboardMarkup:
+    """Кнопка добавления в корзину после выбора размера."""
     builder = InlineKeyboardBuilder()
     builder.button(text=get_text("buy", lang), callback_data=f"buy_{product_id}_{size}")
     builder.button(text=get_text("back", lang), callback_data=f"prod_{product_id}")
     builder.adjust(1)
     return builder.as_markup()
+
+def get_cart_kb(lines: List[Tuple[int, str, str]], lang: str = "ru") -> InlineKeyboardMarkup:
+    """Корзина: удаление строк по одной, оформление, очистка и возврат в каталог.
+
+    lines — (product_id, размер, подпись). Строка удаляется по товару и размеру,
+    а не по номеру: кнопка из старого сообщения корзины не уберет другую строку.
+    Не кэшируется: состав у каждого покупателя свой.
+    """
+    builder = InlineKeyboardBuilder()
+    for product_id, size, label in lines:
+        builder.row(InlineKeyboardButton(text=f"❌ {label}", callback_data=f"cart_del_{product_id}_{size}"))
+    if lines:
+        builder.row(InlineKeyboardButton(text=get_text("checkout", lang), callback_data="cart_checkout"))
+        builder.row(InlineKeyboardButton(text=get_text("clear_cart", lang), callback_data="cart_clear"))
+    builder.row(InlineKeyboardButton(text=get_text("continue_shopping", lang), callback_data="catalog"))
+    return builder.as_markup()
+
+def get_catalog_kb(page: ProductsPage, lang: str = "ru") -> InlineKeyboardMarkup:
+    key = ("catalog", page.items[0][0] if page.items else 0, len(page.items), page.has_prev, page.has_next, lang)
+    return kb_cache.get_or_build(key, lambda: build_catalog_kb(page, lang))
+
+def get_product_sizes_kb(product_id: int, sizes: str, lang: str = "ru") -> InlineKeyboardMarkup:
+    return kb_cache.get_or_build(("sizes", product_id, lang), lambda: build_product_sizes_kb(product_id, sizes, lang))
+
+def get_buy_kb(product_id: int, size: str, lang: str = "ru") -> InlineKeyboardMarkup:
+    return kb_cache.get_or_build(("buy", product_id, size, lang), lambda: build_buy_kb(product_id, size, lang))
+
+def get_search_kb(page: ProductsPage, offset: int, limit: int, lang: str = "ru") -> InlineKeyboardMarkup:
+    """Результаты поиска в клавиатуре каталога; страницы листаются по смещению (search_<offset>)."""
+    return build_catalog_kb(page, lang, prev_data=f"search_{max(0, offset - limit)}", next_data=f"search_{offset + limit}")
@@ -5,18 +5,40 @@ TEXTS = {
     "close": "❌ Close",
     "back_to_catalog": "🔙 Back to catalog",
     "back": "🔙 Back",
-    "buy": "🛒 Buy",
-    "select_size": "📏 <b>Select a size before buying:</b>",
-    "selected_size": "✅ <b>Selected size:</b> {size}",
+    "prev_page": "⬅️ Prev",
+    "next_page": "Next ➡️",
+    "buy": "🛒 Add to cart",
+    "product_card": "👕 <b>{name}</b>\n\n📝 <i>{description}</i>\n\n💰 <b>Price:</b> {price}$\n\n📏 <b>Select a size before buying:</b>",
+    "product_card_size": "👕 <b>{name}</b>\n\n📝 <i>{description}</i>\n💰 <b>Price:</b> {price}$\n\n✅ <b>Selected size:</b> {size}",
     "enter_address": "📍 To place an order, please <b>enter your delivery address:</b>",
+    "sold_out": "😔 Size {size} is sold out.",
+    "reserved_for": "⏳ The item is reserved for you for {minutes} min.",
     "order_success": "🎉 <b>Thank you for your order!</b>\n\nYour order number: <b>#{order_id}</b>\nA manager will contact you shortly to confirm.",
+    "cart": "🛒 Cart",
+    "cart_title": "🛒 <b>Your cart:</b>",
+    "cart_empty": "🛒 Your cart is empty. Add items from the catalog.",
+    "cart_line": "• {name} ({size}) × {quantity} — {amount}$",
+    "cart_total": "💰 <b>Total:</b> {total}$",
+    "cart_added": "✅ Added to cart",
+    "cart_full": "🛒 Your cart already holds {limit} items — check out or remove something.",
+    "checkout": "✅ Check out",
+    "clear_cart": "🗑 Clear cart",
+    "continue_shopping": "🛍 Continue shopping",
+    "cart_unavailable": "😔 Not enough in stock: {items}",
+    "order_total": "💰 Order total: <b>{total}$</b>",
+    "order_status_changed": "🔔 The status of your order <b>#{order_id}</b> has changed: <b>{status}</b>",
     "loading_order": "🔄 <i>Processing and saving your order...</i>",
     "product_not_found": "❌ Product not found.",
     "help": "ℹ️ Help",
     "manager": "📞 Manager",
     "admin_panel": "⚙️ Admin Panel",
     "catalog": "🛍 Catalog",
-    "price": "Price",
-    "help_text": "📖 <b>Help:</b>\n\n1. Select a product from the catalog.\n2. Choose a suitable size.\n3. Enter your shipping address.\n\nFor any questions, contact @admin_username",
+    "search": "🔎 Search",
+    "search_prompt": "🔎 Type what you are looking for: name, color, fabric or size.",
+    "search_results": "🔎 <b>Results for «{query}»:</b>",
+    "search_empty": "🔎 Nothing found for «{query}» 😔",
+    "inline_card": "👕 <b>{name}</b>\n\n💰 {price}$",
+    "open_in_bot": "🛍 Open in the shop",
+    "help_text": "📖 <b>Help:</b>\n\n1. Select a product from the catalog.\n2. Choose a suitable size and add the item to your cart.\n3. Open the cart, tap “Check out” and enter your shipping address.\n\nFor any questions, contact @admin_username",
     "manager_text": "📞 <b>Contact Manager:</b>\n\nIf you have any questions about your order or payment, please message our manager: @manager_username",
 }
@@ -1,15 +1,147 @@
-from locales.ru import TEXTS as RU_TEXTS
-from locales.en import TEXTS as EN_TEXTS
+"""Каталоги текстов бота.
 
-LOCALES = {
-    "ru": RU_TEXTS,
-    "en": EN_TEXTS
+Каталог языка — модуль locales/<lang>.py со словарем TEXTS или файл
+locales/<lang>.json. Каталоги загружаются при первом обращении к языку и
+сразу собираются целиком: строки с параметрами проверяются при загрузке и
+хранятся готовыми функциями подстановки, а недостающие ключи заполняются по
+цепочке запасных языков. Поэтому get_text — это два поиска в словаре.
+"""
+import importlib
+import json
+import logging
+import os
+import string
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+DEFAULT_LANG = "ru"
+# Запасные языки (DEFAULT_LANG всегда последний в цепочке). Для языка без
+# своего каталога берется первый доступный запасной.
+FALLBACKS: Dict[str, Tuple[str, ...]] = {
+    "be": ("uk", "ru"),
+    "de": ("en",),
+    "fr": ("en",),
+    "es": ("en",),
+    "it": ("en",),
+    "pl": ("uk", "en"),
 }
 
-def get_text(key: str, lang: str = "ru", **kwargs) -> str:
+LOCALES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Template = Callable[..., str]
+
+
+def compile_template(text: str) -> Optional[Template]:
+    """Функция, подставляющая параметры в text; None, если параметров нет.
+
+    Формат разбирается при загрузке каталога, поэтому ошибка в строке (скобка
+    без пары и т.п.) видна сразу, а не при первом показе текста. Подстановка —
+    обычный str.format: код из строк каталога не генерируется.
+    """
+    if all(field is None for _, field, _, _ in string.Formatter().parse(text)):
+        return None
+    return text.format
+
+
+class Catalog:
+    """Тексты одного языка вместе с запасными языками."""
+
+    __slots__ = ("lang", "texts", "templates")
+
+    def __init__(self, lang: str, texts: Dict[str, str]):
+        self.lang = lang
+        self.texts = texts
+        self.templates: Dict[str, Template] = {}
+        for key, text in texts.items():
+            template = compile_template(text)
+            if template is not None:
+                self.templates[key] = template
+
+
+class LocaleRegistry:
+    def __init__(self, directory: str = LOCALES_DIR, default: str = DEFAULT_LANG):
+        self.directory = directory
+        self.default = default
+        self.catalogs: Dict[str, Catalog] = {}
+        self._available: Optional[FrozenSet[str]] = None
+        self._resolved: Dict[Optional[str], str] = {}
+        self._variants: Dict[str, FrozenSet[str]] = {}
+
+    def available(self) -> FrozenSet[str]:
+        """Языки, для которых есть файл каталога (без загрузки самих каталогов)."""
+        if self._available is None:
+            names = set()
+            for filename in os.listdir(self.directory):
+                name, ext = os.path.splitext(filename)
+                if ext in (".py", ".json") and name not in ("manager", "__init__") and not name.startswith("_"):
+                    names.add(name)
+            self._available = frozenset(names)
+        return self._available
+
+    def _raw(self, lang: str) -> Dict[str, str]:
+        path = os.path.join(self.directory, f"{lang}.json")
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        return importlib.import_module(f"locales.{lang}").TEXTS
+
+    def chain(self, lang: str) -> List[str]:
+        """Цепочка языков для lang: сам язык, его запасные, затем язык по умолчанию."""
+        chain = [lang]
+        for fallback in FALLBACKS.get(lang, ()) + (self.default,):
+            if fallback not in chain and fallback in self.available():
+                chain.append(fallback)
+        return chain
+
+    def get(self, lang: str) -> Catalog:
+        catalog = self.catalogs.get(lang)
+        if catalog is None:
+            if lang not in self.available():
+                lang = self.resolve(lang)
+            catalog = self.catalogs.get(lang)
+        if catalog is None:
+            texts: Dict[str, str] = {}
+            for name in reversed(self.chain(lang)):
+                texts.update(self._raw(name))
+            catalog = self.catalogs[lang] = Catalog(lang, texts)
+            self._variants.clear()
+            logging.info(f"Locale '{lang}' loaded ({len(texts)} texts, {len(catalog.templates)} templates)")
+        return catalog
+
+    def resolve(self, language_code: Optional[str]) -> str:
+        """Язык каталога для language_code из Telegram ("en-US" -> "en", неизвестный -> по умолчанию)."""
+        lang = self._resolved.get(language_code)
+        if lang is None:
+            lang = self.default
+            if language_code:
+                base = language_code.lower().replace("_", "-").split("-")[0]
+                if base in self.available():
+                    lang = base
+                elif base in FALLBACKS:
+                    lang = next((f for f in FALLBACKS[base] if f in self.available()), self.default)
+            self._resolved[language_code] = lang
+        return lang
+
+    def variants(self, key: str, langs: Iterable[str] = ()) -> FrozenSet[str]:
+        """Все варианты текста key в загруженных каталогах (и в langs, которые догружаются)."""
+        for lang in langs:
+            self.get(lang)
+        variants = self._variants.get(key)
+        if variants is None:
+            variants = self._variants[key] = frozenset(
+                catalog.texts[key] for catalog in self.catalogs.values() if key in catalog.texts
+            )
+        return variants
+
+
+locales = LocaleRegistry()
+_catalogs = locales.catalogs
+
+
+def get_text(key: str, lang: str = DEFAULT_LANG, **kwargs) -> str:
     """Получить текст по ключу для указанного языка."""
-    texts = LOCALES.get(lang, RU_TEXTS)
-    text = texts.get(key, key)
+    catalog = _catalogs.get(lang) or locales.get(lang)
     if kwargs:
-        return text.format(**kwargs)
-    return text
+        template = catalog.templates.get(key)
+        if template is not None:
+            return template(**kwargs)
+    return catalog.texts.get(key, key)
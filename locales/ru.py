@@ -5,18 +5,40 @@ TEXTS = {
     "close": "❌ Закрыть",
     "back_to_catalog": "🔙 Назад в каталог",
     "back": "🔙 Назад",
-    "buy": "🛒 Купить",
-    "select_size": "📏 <b>Выберите размер перед покупкой:</b>",
-    "selected_size": "✅ <b>Выбранный размер:</b> {size}",
+    "prev_page": "⬅️ Назад",
+    "next_page": "Далее ➡️",
+    "buy": "🛒 В корзину",
+    "product_card": "👕 <b>{name}</b>\n\n📝 <i>{description}</i>\n\n💰 <b>Цена:</b> {price}$\n\n📏 <b>Выберите размер перед покупкой:</b>",
+    "product_card_size": "👕 <b>{name}</b>\n\n📝 <i>{description}</i>\n💰 <b>Цена:</b> {price}$\n\n✅ <b>Выбранный размер:</b> {size}",
     "enter_address": "📍 Для оформления заказа, пожалуйста, <b>введите ваш адрес доставки:</b>",
+    "sold_out": "😔 Размер {size} уже закончился.",
+    "reserved_for": "⏳ Товар забронирован за вами на {minutes} мин.",
     "order_success": "🎉 <b>Спасибо за заказ!</b>\n\nВаш номер заказа: <b>#{order_id}</b>\nМенеджер свяжется с вами в ближайшее время для подтверждения.",
+    "cart": "🛒 Корзина",
+    "cart_title": "🛒 <b>Ваша корзина:</b>",
+    "cart_empty": "🛒 Корзина пуста. Добавьте товары из каталога.",
+    "cart_line": "• {name} ({size}) × {quantity} — {amount}$",
+    "cart_total": "💰 <b>Итого:</b> {total}$",
+    "cart_added": "✅ Добавлено в корзину",
+    "cart_full": "🛒 В корзине уже {limit} шт. — оформите заказ или уберите что-нибудь.",
+    "checkout": "✅ Оформить заказ",
+    "clear_cart": "🗑 Очистить корзину",
+    "continue_shopping": "🛍 Продолжить покупки",
+    "cart_unavailable": "😔 Не хватило на складе: {items}",
+    "order_total": "💰 Сумма заказа: <b>{total}$</b>",
+    "order_status_changed": "🔔 Статус вашего заказа <b>#{order_id}</b> изменён: <b>{status}</b>",
     "loading_order": "🔄 <i>Формируем и сохраняем заказ...</i>",
     "product_not_found": "❌ Товар не найден.",
     "help": "ℹ️ Помощь",
     "manager": "📞 Менеджер",
     "admin_panel": "⚙️ Админ панель",
     "catalog": "🛍 Каталог",
-    "price": "Цена",
-    "help_text": "📖 <b>Справка:</b>\n\n1. Выберите товар в каталоге.\n2. Выберите подходящий размер.\n3. Введите адрес доставки.\n\nПо всем вопросам пишите @admin_username",
+    "search": "🔎 Поиск",
+    "search_prompt": "🔎 Напишите, что ищете: название, цвет, материал или размер.",
+    "search_results": "🔎 <b>Найдено по запросу «{query}»:</b>",
+    "search_empty": "🔎 По запросу «{query}» ничего не найдено 😔",
+    "inline_card": "👕 <b>{name}</b>\n\n💰 {price}$",
+    "open_in_bot": "🛍 Открыть в магазине",
+    "help_text": "📖 <b>Справка:</b>\n\n1. Выберите товар в каталоге.\n2. Выберите подходящий размер и добавьте товар в корзину.\n3. Откройте корзину, нажмите «Оформить заказ» и введите адрес доставки.\n\nПо всем вопросам пишите @admin_username",
     "manager_text": "📞 <b>Связь с менеджером:</b>\n\nЕсли у вас возникли вопросы по заказу или оплате, пожалуйста, напишите нашему менеджеру: @manager_username",
 }
@@ -1,42 +1,47 @@
+# Первым импортом: отсчет времени старта по фазам (utils/startup.py)
+from utils.startup import startup
+
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from core.config import BOT_TOKEN
-from database.db import init_db
-from handlers.user_handlers import router as user_router
-from handlers.admin_handlers import router as admin_router
+from core.app import create_bot, create_dispatcher, setup_logging, start_bot, stop_services
+from core.config import BOT_MODE, WORKERS
+from utils.sharding import run_sharded
+from utils.webhook import run_webhook
+
+startup.mark("imports")
 
 async def main():
     # Настройка базового логгирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
-    )
-    
+    setup_logging()
+
+    if WORKERS > 1:
+        # Этот процесс только принимает апдейты, обработка — в процессах-воркерах
+        logging.info(f"Starting bot with {WORKERS} worker processes...")
+        await run_sharded(WORKERS)
+        return
+
     logging.info("Starting bot initialization...")
-    
-    # Инициализация бота с токеном из .env
-    bot = Bot(token=BOT_TOKEN)
-    # MemoryStorage для хранения FSM-состояний в ОЗУ (на MVP достаточно)
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Регистрация роутеров (Admin-роутер идет первым, чтобы админ-команды перехватывались им)
-    dp.include_router(admin_router)
-    dp.include_router(user_router)
-    
-    # Инициализация базы данных SQLite
-    await init_db()
-    logging.info("Database initialized successfully.")
-    
-    # Сброс вебхуков при старте long-polling
-    await bot.delete_webhook(drop_pending_updates=True)
-    
-    bot_info = await bot.get_me()
-    logging.info(f"Bot @{bot_info.username} is starting polling...")
-    
-    await dp.start_polling(bot)
+
+    bot = create_bot()
+    dp = create_dispatcher(bot)
+    startup.mark("dispatcher")
+    metrics_runner = None
+
+    try:
+        # База, кэши и запросы к Bot API (getMe, сброс вебхука для polling) — одновременно
+        metrics_runner, bot_info = await start_bot(bot, polling=BOT_MODE != "webhook")
+
+        if BOT_MODE == "webhook":
+            logging.info(f"Bot @{bot_info.username} is starting in webhook mode...")
+            await run_webhook(dp, bot)
+            return
+
+        logging.info(f"Bot @{bot_info.username} is starting polling...")
+
+        await dp.start_polling(bot)
+    finally:
+        await stop_services(metrics_runner)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,106 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from core.config import DEDUP_MAX_KEYS, DEDUP_REPEAT_WINDOW, DEDUP_WINDOW
+from utils.dedup import TimeBucketSet
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: повторно доставленный апдейт отбрасывается.
+
+    Telegram доставляет апдейт еще раз, если вебхук не ответил вовремя; повтор
+    узнается по update_id (и id callback-запроса) в течение window секунд.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW, max_keys: int = DEDUP_MAX_KEYS):
+        self.seen = TimeBucketSet(window, max_size=max_keys)
+        self.dropped = 0
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        fresh = self.seen.add(event.update_id)
+        if fresh and event.callback_query is not None:
+            fresh = self.seen.add(("callback", event.callback_query.id))
+        if not fresh:
+            self.dropped += 1
+            return None
+        return await handler(event, data)
+
+
+class ChatLockMiddleware(BaseMiddleware):
+    """Outer-middleware сообщений и нажатий: апдейты одного чата идут по очереди, повторы схлопываются.
+
+    Повтор — то же нажатие (кнопка того же сообщения) или тот же текст в чате,
+    пока первое еще обрабатывается или закончилось меньше repeat_window секунд
+    назад: двойное нажатие "Купить" или дважды отправленный адрес. Повтор не
+    доходит до обработчиков; у нажатия гасится индикатор загрузки на кнопке.
+    Очередь по чату нужна, чтобы второй апдейт видел состояние FSM после первого.
+    """
+
+    def __init__(self, repeat_window: float = DEDUP_REPEAT_WINDOW, max_keys: int = DEDUP_MAX_KEYS):
+        self.recent = TimeBucketSet(repeat_window, max_size=max_keys)
+        self._in_flight: Set[Hashable] = set()
+        # chat_id -> [блокировка, сколько апдейтов ее держат или ждут]; запись удаляется, когда чат свободен
+        self._locks: Dict[int, List] = {}
+        self.collapsed = 0
+
+    @staticmethod
+    def _key(event: TelegramObject) -> Optional[Hashable]:
+        if isinstance(event, CallbackQuery):
+            message_id = event.message.message_id if event.message else event.inline_message_id
+            return "callback", event.from_user.id, message_id, event.data
+        if isinstance(event, Message) and event.text is not None:
+            return "text", event.chat.id, event.text
+        return None
+
+    @asynccontextmanager
+    async def _chat_lock(self, chat_id: int):
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat_id]
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        key = self._key(event)
+        if key is not None and (key in self._in_flight or key in self.recent):
+            self.collapsed += 1
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+        chat = data.get("event_chat")
+        if chat is None:
+            return await handler(event, data)
+        if key is not None:
+            self._in_flight.add(key)
+        try:
+            async with self._chat_lock(chat.id):
+                return await handler(event, data)
+        finally:
+            if key is not None:
+                self._in_flight.discard(key)
+                self.recent.add(key)
+
+    def stats(self) -> dict:
+        return {"collapsed": self.collapsed, "chats": len(self._locks), "recent": len(self.recent)}
+
+
+def setup_dedup(dp: Dispatcher) -> ChatLockMiddleware:
+    """Подключает отсев повторных апдейтов и очередь по чатам к диспетчеру."""
+    dp.update.outer_middleware(UpdateDedupMiddleware())
+    chat_lock = ChatLockMiddleware()
+    dp.message.outer_middleware(chat_lock)
+    dp.callback_query.outer_middleware(chat_lock)
+    return chat_lock
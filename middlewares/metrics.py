@@ -0,0 +1,57 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from utils.metrics import Metrics, metrics as default_metrics
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware диспетчера: время обработчика, базы и Bot API по каждому обработчику."""
+
+    def __init__(self, metrics: Metrics = default_metrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = data["handler"].callback.__name__
+        token = self.metrics.begin()
+        start = time.perf_counter_ns()
+        try:
+            result = await handler(event, data)
+        except BaseException:
+            self.metrics.finish(token, name, time.perf_counter_ns() - start, failed=True)
+            raise
+        self.metrics.finish(token, name, time.perf_counter_ns() - start)
+        return result
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого запроса к Bot API (вместе с ожиданием в планировщике)."""
+
+    def __init__(self, metrics: Metrics = default_metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        start = time.perf_counter_ns()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.metrics.record_api(type(method).__name__, time.perf_counter_ns() - start)
+
+
+def setup_metrics(dp: Dispatcher, bot: Bot, metrics: Metrics = default_metrics):
+    """Подключает сбор метрик ко всем типам апдейтов диспетчера и к сессии бота.
+
+    Вызывать до подключения остальных middleware сессии, чтобы время Bot API
+    включало ожидание в планировщике запросов.
+    """
+    middleware = HandlerMetricsMiddleware(metrics)
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(middleware)
+    bot.session.middleware(ApiMetricsMiddleware(metrics))
@@ -0,0 +1,181 @@
+"""CPU на один callback карточки товара: прежние обработчики против кэша карточек.
+
+Прежние show_product и select_size на каждое нажатие брали товар из каталога,
+распаковывали кортеж и заново подставляли поля в шаблон локали. Теперь
+подпись и клавиатура берутся из CardRenderer (utils/cards.py) по
+(товару, языку, размеру).
+
+Апдейты prod_<id> и size_<id>_<размер> проходят через настоящий Dispatcher
+с заглушкой Bot API без задержки; меряется процессорное время
+(time.process_time) на апдейт, лучшее из нескольких прогонов. Товары без
+фото, чтобы в замер не попадала загрузка файлов.
+
+Третья строка — те же обработчики с асинхронным фильтром CallbackPrefix
+вместо F.data (синхронный фильтр aiogram проверяет через поток), последняя —
+полный набор роутеров бота. Отдельно меряется только сборка карточки (без
+диспетчера и Bot API).
+
+Запуск из корня проекта: python -m scripts.bench_cards [--products 2000 --updates 20000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from aiogram import Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Update
+
+from database import db
+from database.catalog import catalog
+from handlers import user_handlers
+from keyboards.user_kbs import get_buy_kb, get_product_sizes_kb, kb_cache
+from locales.manager import get_text
+from filters.callback import CallbackPrefix
+from handlers import admin_handlers
+from scripts.fakes import FakeSession, callback_update, make_bot
+from utils.cards import cards
+
+ROUNDS = 3
+SIZES = "XS, S, M, L, XL"
+
+# Обработчики на одинаковых роутерах из двух маршрутов: разница только в обработчиках и фильтрах
+legacy_router = Router()
+cards_router = Router()
+cards_router.callback_query(F.data.startswith("prod_"))(user_handlers.show_product)
+cards_router.callback_query(F.data.startswith("size_"))(user_handlers.select_size)
+filter_router = Router()
+filter_router.callback_query(CallbackPrefix("prod_"))(user_handlers.show_product)
+filter_router.callback_query(CallbackPrefix("size_"))(user_handlers.select_size)
+
+
+@legacy_router.callback_query(F.data.startswith("prod_"))
+async def legacy_show_product(callback: CallbackQuery):
+    # Прежний show_product (ветка товара без фото)
+    lang = user_handlers.get_lang(callback)
+    product_id = int(callback.data.split("_")[1])
+    product = await catalog.get_product(product_id)
+    if not product:
+        await callback.answer(get_text("product_not_found", lang), show_alert=True)
+        return
+    _, name, desc, price, sizes, _ = product
+    await callback.message.edit_text(
+        get_text("product_card", lang, name=name, description=desc, price=price),
+        reply_markup=get_product_sizes_kb(product_id, sizes, lang),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@legacy_router.callback_query(F.data.startswith("size_"))
+async def legacy_select_size(callback: CallbackQuery):
+    # Прежний select_size
+    lang = user_handlers.get_lang(callback)
+    parts = callback.data.split("_")
+    product_id, size = int(parts[1]), parts[2]
+    product = await catalog.get_product(product_id)
+    if not product:
+        await callback.answer(get_text("product_not_found", lang), show_alert=True)
+        return
+    _, name, desc, price, sizes, photo_id = product
+    text = get_text("product_card_size", lang, name=name, description=desc, price=price, size=size)
+    kb = get_buy_kb(product_id, size, lang)
+    if callback.message.photo:
+        await callback.message.edit_caption(caption=text, reply_markup=kb, parse_mode="HTML")
+    else:
+        await callback.message.edit_text(text=text, reply_markup=kb, parse_mode="HTML")
+    await callback.answer()
+
+
+def make_updates(bot, products: int, count: int) -> list:
+    rnd = random.Random(1)
+    sizes = [s.strip() for s in SIZES.split(",")]
+    hot = max(1, products // 10)
+    updates = []
+    for i in range(count // 2):
+        # Большая часть трафика приходится на небольшую долю "горячих" товаров
+        product_id = rnd.randint(1, hot) if rnd.random() < 0.9 else rnd.randint(1, products)
+        lang = rnd.choice(("ru", "en"))
+        for data, photo in ((f"prod_{product_id}", False), (f"size_{product_id}_{rnd.choice(sizes)}", True)):
+            raw = callback_update(1000 + i % 500, data, lang=lang, photo=photo)
+            updates.append(Update.model_validate(raw, context={"bot": bot}))
+    return updates
+
+
+async def measure(label: str, routers: list, updates: list, bot) -> float:
+    dp = Dispatcher()
+    dp.include_routers(*routers)
+    results = []
+    for _ in range(ROUNDS):
+        # Каждый прогон начинается с пустых кэшей карточек и клавиатур
+        cards.clear()
+        kb_cache.clear()
+        start = time.process_time()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        results.append((time.process_time() - start) / len(updates) * 1e6)
+    best = min(results)
+    print(f"{label:>16}: {best:7.1f} us CPU per callback")
+    return best
+
+
+async def render_only(updates: list):
+    """Только сборка карточки, без диспетчера и Bot API."""
+    calls = [(int(u.callback_query.data.split("_")[1]), u.callback_query.from_user.language_code,
+              u.callback_query.data.split("_")[2] if u.callback_query.data.startswith("size_") else None)
+             for u in updates]
+
+    async def legacy(product_id, lang, size):
+        _, name, desc, price, sizes, _ = await catalog.get_product(product_id)
+        if size is None:
+            return get_text("product_card", lang, name=name, description=desc, price=price), \
+                get_product_sizes_kb(product_id, sizes, lang)
+        return get_text("product_card_size", lang, name=name, description=desc, price=price, size=size), \
+            get_buy_kb(product_id, size, lang)
+
+    for label, render in (("legacy", legacy), ("card cache", cards.render)):
+        results = []
+        for _ in range(ROUNDS):
+            cards.clear()
+            kb_cache.clear()
+            start = time.process_time()
+            for call in calls:
+                await render(*call)
+            results.append((time.process_time() - start) / len(calls) * 1e6)
+        print(f"{label:>16}: {min(results):7.2f} us CPU per card")
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            for i in range(1, args.products + 1):
+                await db.add_product(f"Товар {i}", f"Описание товара {i}: хлопок, свободный крой", 1000 + i,
+                                     SIZES, "none")
+            await catalog.load()
+            session = FakeSession()
+            bot = make_bot(session)
+            updates = make_updates(bot, args.products, args.updates)
+            print(f"{args.products} products, {len(updates)} callbacks (prod_ + size_), best of {ROUNDS}\n")
+            legacy = await measure("legacy handlers", [legacy_router], updates, bot)
+            await measure("card cache", [cards_router], updates, bot)
+            cached = await measure("+ async filter", [filter_router], updates, bot)
+            stats = cards.stats()
+            print(f"{legacy / cached:.2f}x | cards cached: {stats['size']}, "
+                  f"hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.1%}")
+            # Как в боте: сначала админ-роутер, затем все обработчики покупателя
+            await measure("full routers", [admin_handlers.router, user_handlers.router], updates, bot)
+            print()
+            await render_only(updates)
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
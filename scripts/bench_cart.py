@@ -0,0 +1,138 @@
+"""Записи в базу на купленную единицу: заказ на каждый товар против корзины.
+
+Раньше каждая покупка была отдельным заказом: бронь при нажатии "Купить" и
+транзакция заказа (строка orders и четыре upsert сводных таблиц). Теперь
+товары собираются в корзину (бронь на каждую единицу), а оформление пишет
+заголовок заказа и его строки order_items одной транзакцией.
+
+Покупатели по очереди берут по --items единиц разных размеров; для каждой
+схемы печатаются транзакции записи, измененные строки и страницы, попавшие в
+WAL, в пересчете на купленную единицу, и время на единицу.
+
+Запуск из корня проекта: python -m scripts.bench_cart [--buyers 500 --items 1,3,5]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from database import db, stats
+
+# Размеры, которые раскупаются в замере (все с учетом остатков)
+SIZES = [(1, "M"), (2, "S"), (3, "L"), (4, "M"), (5, "One Size")]
+
+
+async def legacy_order(user_id: int, username: str, product_id: int, size: str, address: str,
+                       reservation_id: int) -> int:
+    # Прежняя запись заказа из одного товара (db.create_orders до появления order_items)
+    async with db.pool.write() as conn:
+        await conn.execute('DELETE FROM reservations WHERE id = ? AND product_id = ? AND size = ?',
+                           (reservation_id, product_id, size))
+        await conn.execute('INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)', (user_id, username))
+        async with conn.execute('SELECT price FROM products WHERE id = ?', (product_id,)) as cursor:
+            price = (await cursor.fetchone())[0]
+        cursor = await conn.execute(
+            'INSERT INTO orders (user_id, username, product_id, size, address, reserved, unit_price) '
+            'VALUES (?, ?, ?, ?, ?, 1, ?)',
+            (user_id, username, product_id, size, address, price)
+        )
+        day = datetime.now(timezone.utc).date().isoformat()
+        await conn.execute('INSERT INTO stats_totals (id, orders, revenue) VALUES (1, 1, ?) ON CONFLICT(id) DO UPDATE '
+                           'SET orders = orders + 1, revenue = revenue + excluded.revenue', (price,))
+        await conn.execute("INSERT INTO stats_status (status, orders) VALUES (?, 1) ON CONFLICT(status) DO UPDATE "
+                           "SET orders = orders + 1", (stats.DEFAULT_STATUS,))
+        await conn.execute('INSERT INTO stats_products (product_id, orders, revenue) VALUES (?, 1, ?) '
+                           'ON CONFLICT(product_id) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue',
+                           (product_id, price))
+        await conn.execute('INSERT INTO stats_daily (day, orders, revenue) VALUES (?, 1, ?) ON CONFLICT(day) DO UPDATE '
+                           'SET orders = orders + 1, revenue = revenue + excluded.revenue', (day, price))
+        return cursor.lastrowid
+
+
+async def buy_separately(user_id: int, items: int):
+    for product_id, size in SIZES[:items]:
+        reservation_id = await db.reserve_stock(user_id, product_id, size)
+        await legacy_order(user_id, f"user{user_id}", product_id, size, "Адрес", reservation_id)
+
+
+async def buy_with_cart(user_id: int, items: int):
+    cart = [db.CartItem(product_id, size, 1, (await db.reserve_stock(user_id, product_id, size),))
+            for product_id, size in SIZES[:items]]
+    placed = await db.create_orders([(user_id, f"user{user_id}", "Адрес", cart, None)])
+    assert placed[0].order_id and not placed[0].sold_out
+
+
+class WriteCounter:
+    """Считает транзакции записи пула, измененные строки и рост WAL."""
+
+    def __init__(self, path: str):
+        self.wal = path + "-wal"
+        self.transactions = 0
+        self._write = db.pool.write
+        db.pool.write = self._counting_write
+
+    def _counting_write(self):
+        self.transactions += 1
+        return self._write()
+
+    async def reset(self):
+        # WAL не сбрасывается в базу посреди замера, его размер — все записанные страницы
+        writer = db.pool._writer
+        await writer.execute('PRAGMA wal_autocheckpoint = 0')
+        await writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        async with writer.execute('PRAGMA page_size') as cursor:
+            self.page_size = (await cursor.fetchone())[0]
+        self.transactions = 0
+        self.changes = writer.total_changes
+
+    def snapshot(self) -> dict:
+        size = os.path.getsize(self.wal) if os.path.exists(self.wal) else 0
+        return {
+            "transactions": self.transactions,
+            "rows": db.pool._writer.total_changes - self.changes,
+            # Заголовок WAL 32 байта, у каждого кадра (страницы) 24 байта заголовка
+            "wal_pages": max(0, size - 32) // (self.page_size + 24),
+        }
+
+
+async def measure(counter: WriteCounter, buy, buyers: range, items: int) -> dict:
+    await counter.reset()
+    start = time.perf_counter()
+    for user_id in buyers:
+        await buy(user_id, items)
+    elapsed = time.perf_counter() - start
+    result = counter.snapshot()
+    units = len(buyers) * items
+    return {**{k: v / units for k, v in result.items()}, "ms": elapsed / units * 1000}
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            for product_id, size in SIZES:
+                await db.set_stock(product_id, size, 1_000_000)
+            counter = WriteCounter(path)
+            print(f"{args.buyers} buyers, per purchased unit:")
+            print(f"{'':>22} {'transactions':>12} {'rows':>6} {'WAL pages':>10} {'ms':>7}")
+            user_id = 1
+            for items in (int(n) for n in args.items.split(",")):
+                for label, buy in (("order per item", buy_separately), ("cart checkout", buy_with_cart)):
+                    buyers = range(user_id, user_id + args.buyers)
+                    user_id += args.buyers
+                    r = await measure(counter, buy, buyers, items)
+                    print(f"{items} items, {label:>14} {r['transactions']:12.2f} {r['rows']:6.1f} "
+                          f"{r['wal_pages']:10.1f} {r['ms']:7.3f}")
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--items", default="1,3,5")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,176 @@
+"""Нагрузочный тест FSM-хранилищ: 10k одновременных диалогов оформления заказа.
+
+Сравнивает MemoryStorage, SQLiteStorage и RedisStorage по задержке операций
+и памяти. RedisStorage работает поверх FakeRedis — заглушки в памяти с теми
+командами, которые использует хранилище (mget, pipeline с set/delete), и
+задержкой --redis-rtt на запрос; пакет redis для этого не нужен. После
+прогона постоянные хранилища открываются заново и проверяется, что все
+диалоги сохранились (иначе код возврата 1).
+
+Запуск из корня проекта: python -m scripts.bench_fsm [--redis-rtt 0.2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database import db
+from database.fsm_storage import RedisStorage, SQLiteStorage
+from states.user_states import OrderState
+
+CONVERSATIONS = 10_000
+
+
+class FakeRedis:
+    """Redis в памяти: mget, pipeline(set/delete/execute) и aclose, как у redis.asyncio.Redis.
+
+    latency — имитация сетевой задержки на каждый запрос (секунды), pipeline — один запрос.
+    Ключ с ex считается удаленным после истечения срока.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.requests = 0
+
+    async def _roundtrip(self):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        value = self.values.get(key)
+        if value is None or (value[1] is not None and value[1] < time.time()):
+            return None
+        return value[0]
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        await self._roundtrip()
+        return [self._get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.commands.clear()
+
+    def set(self, key: str, value: str, ex: Optional[int] = None):
+        self.commands.append(("set", key, value.encode(), ex))
+
+    def delete(self, *keys: str):
+        self.commands.extend(("delete", key, None, None) for key in keys)
+
+    async def execute(self):
+        await self.redis._roundtrip()
+        for command, key, value, ex in self.commands:
+            if command == "set":
+                self.redis.values[key] = (value, time.time() + ex if ex else None)
+            else:
+                self.redis.values.pop(key, None)
+        self.commands.clear()
+
+
+async def conversation(storage, user_id: int, latencies: list):
+    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    # Тот же набор операций, что делает бот: buy_ -> ввод адреса -> очистка
+    steps = (
+        lambda: storage.get_state(key),
+        lambda: storage.update_data(key, {"product_id": user_id % 50, "size": "M", "lang": "ru"}),
+        lambda: storage.set_state(key, OrderState.waiting_for_address),
+        lambda: storage.get_state(key),
+        lambda: storage.get_data(key),
+    )
+    for i, step in enumerate(steps):
+        start = time.perf_counter()
+        await step()
+        # Первое обращение к ключу — "холодное": у SQLiteStorage это чтение из базы
+        latencies.append((i == 0, time.perf_counter() - start))
+        await asyncio.sleep(0)
+
+
+async def run(label: str, make_storage):
+    # Память меряется отдельным прогоном: tracemalloc сильно искажает задержки
+    storage = make_storage()
+    tracemalloc.start()
+    await asyncio.gather(*(conversation(storage, i, []) for i in range(1, CONVERSATIONS + 1)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await storage.close()
+
+    storage = make_storage()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(storage, i, latencies) for i in range(1, CONVERSATIONS + 1)))
+    elapsed = time.perf_counter() - start
+    close_start = time.perf_counter()
+    await storage.close()
+    close_time = time.perf_counter() - close_start
+    warm = sorted(t for cold, t in latencies if not cold)
+    cold = sorted(t for is_cold, t in latencies if is_cold)
+    print(f"{label:>8}: {elapsed:6.2f} s total | warm p50 {statistics.median(warm) * 1e6:6.1f} us "
+          f"p99 {_p99(warm) * 1e6:7.1f} us | first touch p50 {statistics.median(cold) * 1e3:6.1f} ms "
+          f"p99 {_p99(cold) * 1e3:6.1f} ms | peak mem {peak / 1024 / 1024:5.1f} MiB "
+          f"| final flush {close_time * 1000:5.1f} ms")
+
+
+def _p99(values: list) -> float:
+    return values[int(len(values) * 0.99)]
+
+
+async def persisted(storage) -> int:
+    """Сколько диалогов открытое заново хранилище видит в состоянии ввода адреса."""
+    keys = [StorageKey(bot_id=1, chat_id=i, user_id=i) for i in range(1, CONVERSATIONS + 1)]
+    states = await asyncio.gather(*(storage.get_state(key) for key in keys))
+    await storage.close()
+    return sum(state == OrderState.waiting_for_address.state for state in states)
+
+
+async def main(args) -> int:
+    ok = True
+    await run("memory", MemoryStorage)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            await run("sqlite", lambda: SQLiteStorage(db.pool))
+            count = await persisted(SQLiteStorage(db.pool))
+            print(f"  sqlite: persisted conversations {count}/{CONVERSATIONS}")
+            ok = ok and count == CONVERSATIONS
+        finally:
+            await db.pool.close()
+
+    redis = FakeRedis(latency=args.redis_rtt / 1000)
+    await run("redis", lambda: RedisStorage(redis))
+    requests = redis.requests
+    count = await persisted(RedisStorage(redis))
+    print(f"   redis: persisted conversations {count}/{CONVERSATIONS}, {requests} requests to Redis "
+          f"for {CONVERSATIONS * 2} conversations (2 runs)")
+    ok = ok and count == CONVERSATIONS
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-rtt", type=float, default=0.2, help="имитация задержки Redis, мс")
+    sys.exit(asyncio.run(main(parser.parse_args())))
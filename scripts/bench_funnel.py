@@ -0,0 +1,245 @@
+"""Нагрузочный прогон конвейера апдейтов: воронка покупателя через настоящий диспетчер.
+
+Каждый из --users покупателей проходит воронку: каталог -> товар -> размер ->
+"В корзину" -> "Оформить" -> адрес. Апдейты идут через диспетчер бота так же,
+как в main.py (create_dispatcher: все роутеры и middleware, FSM в SQLite,
+планировщик Bot API, пакетная запись заказов) во временный файл SQLite; Bot
+API — FakeSession, которая записывает вызовы (задержка --rtt). Одновременно в
+воронке --concurrency покупателей, апдейты каждого идут по порядку, как в
+одном чате. Первые --warmup покупателей прогревают кэши и в замер не входят.
+
+Печатается пропускная способность, p50/p95/p99 по обработчикам (метрики
+utils/metrics.py), SQL-запросов и запросов к Bot API на апдейт. Запросы
+обработчика — выполненные, пока он держит соединение пула; "всего" включает
+фоновые записи (буфер FSM, пачки заказов). В конце проверяется, что каждый
+покупатель оформил ровно один заказ.
+
+--save PATH сохраняет результат в JSON, --baseline PATH сравнивает с
+сохраненным: медленнее больше чем на --threshold (и больше чем на
+MIN_DELTA_MS) или больше запросов на апдейт — регрессия, код возврата 1.
+
+Запуск из корня проекта: python -m scripts.bench_funnel [--users 2000 --concurrency 100 --save baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Лимиты Bot API и фоновые сервисы в замере не нужны
+os.environ.update(BOT_API_RATE="1000000", BOT_API_CHAT_RATE="1000000", BOT_API_CHAT_BURST="1000000",
+                  METRICS_PORT="0", PHOTO_WARMUP_CHAT_ID="0", ADMIN_IDS="", FSM_STORAGE="sqlite")
+
+from aiogram.types import Update
+
+from core.app import create_dispatcher, start_services, stop_services
+from database import db
+from database.db import Product
+from locales.manager import get_text
+from scripts.fakes import FakeSession, callback_update, make_bot, message_update
+from utils.metrics import metrics
+
+QUANTILES = (0.5, 0.95, 0.99)
+SIZES = ("XS", "S", "M", "L", "XL")
+LANGS = ("ru", "en", "uk")
+# Метрики, которые сравниваются с базовым прогоном: больше — хуже (кроме пропускной способности)
+TIMINGS = ("p50_ms", "p95_ms", "p99_ms")
+COUNTS = ("queries_per_update", "api_calls_per_update")
+# Задержки в доли миллисекунды шумят на десятки процентов: меньшая разница не считается регрессией
+MIN_DELTA_MS = 0.5
+
+
+def funnel(user_id: int, rnd: random.Random, products: int) -> List[dict]:
+    """Сырые апдейты одного покупателя: от кнопки каталога до адреса доставки."""
+    # Большая часть покупателей смотрит небольшую долю "горячих" товаров
+    hot = max(1, products // 10)
+    product_id = rnd.randint(1, hot) if rnd.random() < 0.9 else rnd.randint(1, products)
+    size = rnd.choice(SIZES)
+    lang = rnd.choice(LANGS)
+    return [
+        message_update(user_id, get_text("catalog", lang), lang=lang),
+        callback_update(user_id, f"prod_{product_id}", lang=lang),
+        callback_update(user_id, f"size_{product_id}_{size}", lang=lang),
+        callback_update(user_id, f"buy_{product_id}_{size}", lang=lang),
+        callback_update(user_id, "cart_checkout", lang=lang),
+        message_update(user_id, f"ул. Тестовая, {user_id}", lang=lang),
+    ]
+
+
+async def drive(dp, bot, users: List[List[Update]], concurrency: int, latencies: list):
+    """Прогоняет покупателей через диспетчер, не больше concurrency одновременно."""
+    pending = iter(users)
+
+    async def worker():
+        for updates in pending:
+            for update in updates:
+                start = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def percentiles_ms(values: List[float]) -> Dict[str, float]:
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {f"p{round(q * 100)}_ms": round(cuts[round(q * 100) - 1], 3) for q in QUANTILES}
+
+
+def handler_rows() -> Dict[str, dict]:
+    rows = {}
+    for name, stats in sorted(metrics.handlers.items()):
+        count = stats.wall.count
+        # Гистограммы хранят микросекунды
+        p50, p95, p99 = (value / 1000 for value in stats.wall.percentiles(QUANTILES))
+        rows[name] = {
+            "count": count, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "queries_per_update": round(stats.queries / count, 3),
+            "api_calls_per_update": round(stats.api_calls / count, 3),
+            "errors": stats.errors,
+        }
+    return rows
+
+
+async def run(args, path: str) -> dict:
+    session = FakeSession(latency=args.rtt / 1000)
+    bot = make_bot(session)
+    dp = create_dispatcher(bot)
+
+    db.pool.path = path
+    await db.pool.open()
+    await db.init_db()
+    await db.upsert_products([
+        Product(None, f"Товар {i}", f"Описание товара {i}: хлопок, свободный крой", 1000 + i, ", ".join(SIZES), "none")
+        for i in range(1, args.products + 1)
+    ])
+    # Остатки учитываются: покупка бронирует единицу, заказ ее списывает
+    for product_id in range(1, args.products + 1):
+        for size in SIZES:
+            await db.set_stock(product_id, size, args.users + args.warmup)
+    runner = await start_services(bot, primary=False, metrics_port=0)
+    try:
+        rnd = random.Random(1)
+        users = [
+            [Update.model_validate(raw, context={"bot": bot}) for raw in funnel(1_000_000 + i, rnd, args.products)]
+            for i in range(args.warmup + args.users)
+        ]
+        await drive(dp, bot, users[:args.warmup], args.concurrency, [])
+        await dp.storage.flush()
+
+        # Замер начинается с нулевых счетчиков
+        metrics.handlers.clear()
+        metrics.api_methods.clear()
+        session.calls.clear()
+        db.pool.queries = 0
+        latencies = []
+        start = time.perf_counter()
+        await drive(dp, bot, users[args.warmup:], args.concurrency, latencies)
+        elapsed = time.perf_counter() - start
+        # Дописываем буфер FSM, чтобы фоновые запросы попали в счетчик
+        await dp.storage.flush()
+
+        updates = len(latencies)
+        async with db.pool.read() as conn:
+            async with conn.execute('SELECT COUNT(*), COUNT(DISTINCT user_id) FROM orders') as cursor:
+                orders, buyers = await cursor.fetchone()
+        return {
+            "meta": {
+                "users": args.users, "concurrency": args.concurrency, "products": args.products, "rtt_ms": args.rtt,
+                "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "cpus": os.cpu_count(),
+            },
+            "updates": updates,
+            "seconds": round(elapsed, 3),
+            "updates_per_second": round(updates / elapsed, 1),
+            "total": {
+                **percentiles_ms(latencies),
+                "queries_per_update": round(db.pool.queries / updates, 3),
+                "api_calls_per_update": round(sum(session.calls.values()) / updates, 3),
+            },
+            "handlers": handler_rows(),
+            "api_calls": dict(sorted(session.calls.items())),
+            "orders_ok": orders == buyers == args.users + args.warmup,
+        }
+    finally:
+        await stop_services(runner)
+
+
+def report(result: dict):
+    meta = result["meta"]
+    print(f"{meta['users']} users x 6 updates, concurrency {meta['concurrency']}, {meta['products']} products, "
+          f"Bot API RTT {meta['rtt_ms']:.0f} ms, {meta['cpus']} CPU cores\n")
+    print(f"{'handler':<20} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/upd':>8} {'API/upd':>8}")
+    rows = list(result["handlers"].items()) + [("total", {"count": result["updates"], **result["total"]})]
+    for name, row in rows:
+        print(f"{name[:20]:<20} {row['count']:>6} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['queries_per_update']:>8.2f} {row['api_calls_per_update']:>8.2f}"
+              + (f"  errors {row['errors']}" if row.get("errors") else ""))
+    print(f"\n{result['updates_per_second']:.0f} updates/s ({result['updates']} updates in {result['seconds']:.2f} s) | "
+          f"Bot API: {', '.join(f'{k} {v}' for k, v in result['api_calls'].items())} | "
+          f"orders {'OK' if result['orders_ok'] else 'FAIL'}")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    """Печатает разницу с базовым прогоном. False — есть регрессия."""
+    if baseline["meta"] != result["meta"]:
+        print(f"\nWARNING: baseline was recorded with different parameters: {baseline['meta']}")
+    print(f"\n{'vs baseline':<36} {'before':>10} {'after':>10} {'change':>8}")
+    ok = True
+
+    def line(label: str, before: float, after: float, worse: bool):
+        nonlocal ok
+        change = (after - before) / before * 100 if before else 0.0
+        ok = ok and not worse
+        print(f"{label:<36} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%" + ("  REGRESSION" if worse else ""))
+
+    before, after = baseline["updates_per_second"], result["updates_per_second"]
+    line("updates/s", before, after, after < before * (1 - threshold))
+    sections = [("total", baseline["total"], result["total"])]
+    sections += [(name, baseline["handlers"].get(name), row) for name, row in result["handlers"].items()]
+    for name, old, new in sections:
+        if old is None:
+            print(f"{name:<36} new handler")
+            continue
+        for key in TIMINGS:
+            line(f"{name} {key}", old[key], new[key],
+                 new[key] > old[key] * (1 + threshold) and new[key] - old[key] > MIN_DELTA_MS)
+        # Число запросов не зависит от шума: любое увеличение — регрессия
+        for key in COUNTS:
+            line(f"{name} {key}", old[key], new[key], new[key] > old[key] + 0.005)
+    return ok
+
+
+async def main(args) -> int:
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        result = await run(args, os.path.join(tmp, "bench.sqlite3"))
+    report(result)
+    ok = result["orders_ok"]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            ok = compare(result, json.load(f), args.threshold) and ok
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved to {args.save}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100, help="покупателей в воронке одновременно")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=200, help="покупателей до начала замера")
+    parser.add_argument("--rtt", type=float, default=0, help="имитация задержки Bot API, мс")
+    parser.add_argument("--save", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимое замедление (доля)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
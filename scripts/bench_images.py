@@ -0,0 +1,103 @@
+"""Фото каталога: байты, загруженные в Telegram, и время до первого фото.
+
+Для каждого товара из сидированного каталога новый покупатель открывает
+карточку; file_id еще не сохранены, поэтому каждая карточка загружает фото
+с диска. Загрузка идет через заглушку Bot API с задержкой --rtt и каналом
+--mbps. Сравниваются три режима:
+
+  originals — прежнее поведение: PNG из assets/ как есть;
+  cold      — ничего не сжато и пул процессов не запущен: первые карточки
+              уходят с исходником, пока варианты сжимаются в фоне;
+  prepared  — варианты подготовлены заранее (как при старте бота).
+
+Во время сжатия меряется задержка event loop: сжатие идет в отдельном
+процессе и не должно ее увеличивать.
+
+Запуск из корня проекта: python -m scripts.bench_images [--rtt 50 --mbps 8]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from database import db
+from database.catalog import catalog
+from handlers import user_handlers
+from scripts.fakes import FakeSession, make_bot
+from utils import photos as photos_module
+from utils.cards import cards
+from utils.images import ImagePipeline
+from utils.photos import PhotoRegistry
+
+
+async def loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.005):
+    """Насколько позже положенного просыпается задача, которая спит interval секунд."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run(label: str, pipeline: ImagePipeline, prepare: bool, products: list, rtt: float, rate: float):
+    # Свежий реестр file_id (все фото загружаются с диска) с пайплайном этого режима
+    registry = PhotoRegistry()
+    photos_module.images = pipeline
+    user_handlers.photos = registry
+
+    prepared_ms = 0.0
+    if prepare:
+        start = time.perf_counter()
+        await registry.prepare(products)
+        prepared_ms = (time.perf_counter() - start) * 1000
+
+    session = FakeSession(latency=rtt, upload_rate=rate)
+    bot = make_bot(session)
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(loop_lag(stop, lags))
+    times = []
+    for i, product in enumerate(products):
+        start = time.perf_counter()
+        await user_handlers.send_product_card(bot, 1000 + i, cards.card(product, "ru"))
+        times.append((time.perf_counter() - start) * 1000)
+    stop.set()
+    await ticker
+    await pipeline.close()
+
+    photos = len(products)
+    print(f"{label:>10}: {session.bytes_uploaded / 1024:8.0f} KB sent ({session.bytes_uploaded / photos / 1024:6.0f} KB/photo) | "
+          f"time to photo: first {times[0]:7.1f} ms, mean {statistics.mean(times):7.1f} ms | "
+          f"loop lag max {max(lags, default=0) * 1000:5.1f} ms"
+          + (f" | prepared in {prepared_ms:.0f} ms" if prepare else ""))
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            await catalog.load()
+            products = [p for p in await catalog.get_products() if p.has_photo and os.path.isfile(p.photo_id)]
+            print(f"{len(products)} products with local photos, RTT {args.rtt:.0f} ms, uplink {args.mbps:.0f} Mbit/s\n")
+            rtt, rate = args.rtt / 1000, args.mbps * 1_000_000 / 8
+
+            originals = ImagePipeline(cache_dir=os.path.join(tmp, "none"))
+            originals.enabled = False
+            await run("originals", originals, False, products, rtt, rate)
+            if not ImagePipeline().enabled:
+                print("Pillow is not installed: compressed variants are not available")
+                return
+            await run("cold", ImagePipeline(cache_dir=os.path.join(tmp, "cold")), False, products, rtt, rate)
+            await run("prepared", ImagePipeline(cache_dir=os.path.join(tmp, "warm")), True, products, rtt, rate)
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=50, help="задержка Bot API, мс")
+    parser.add_argument("--mbps", type=float, default=8, help="скорость загрузки файлов, Мбит/с")
+    asyncio.run(main(parser.parse_args()))
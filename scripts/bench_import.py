@@ -0,0 +1,116 @@
+"""Импорт каталога: строк в секунду и память для больших CSV/JSONL.
+
+Генерирует файл из --rows новых товаров (без id, как новая коллекция), импортирует
+его в пустую временную базу и печатает скорость и прирост памяти процесса
+(RssAnon, снимается каждые 50 мс). Для сравнения первые --baseline строк
+добавляются прежним способом — отдельной транзакцией на товар, как
+/add_product. Затем каталог выгружается и выгрузка загружается обратно:
+это стоимость строк, которые не изменились.
+
+Запуск из корня проекта: python -m scripts.bench_import [--rows 1000000 --format csv]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import time
+
+from database import db
+from utils.catalog_io import FIELDS, export_file, import_file
+
+SIZES = ["XS, S, M, L, XL", "S, M, L", "One Size", "40, 41, 42, 43, 44"]
+
+
+def generate(path: str, fmt: str, rows: int):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(FIELDS)
+        for i in range(1, rows + 1):
+            row = ("", f"Товар {i}", f"Описание товара {i}: хлопок, свободный крой, цвет {i % 17}",
+                   1000 + i % 9000, SIZES[i % len(SIZES)], "none")
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n")
+
+
+def rss() -> int:
+    """Анонимная память процесса в байтах (RssAnon, Linux), иначе 0.
+
+    Страницы файла базы, отображенные через mmap (PRAGMA mmap_size в пуле), сюда
+    не входят: их объем ограничен настройкой, а не размером импортируемого файла.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+async def sample_rss(stop: asyncio.Event, peak: list):
+    while not stop.is_set():
+        peak[0] = max(peak[0], rss())
+        await asyncio.sleep(0.05)
+
+
+async def timed_import(label: str, path: str, fmt: str, chunk: int):
+    base, peak, stop = rss(), [0], asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(stop, peak))
+    start = time.perf_counter()
+    report = await import_file(path, fmt, chunk=chunk)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    print(f"{label:>22}: {report.rows / elapsed:9.0f} rows/s ({elapsed:6.1f} s) | changed {report.changed} | "
+          f"skipped {report.skipped} | anon RSS +{max(0, peak[0] - base) / 1024 / 1024:.1f} MiB")
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"catalog.{args.format}")
+        start = time.perf_counter()
+        generate(path, args.format, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1024 / 1024:.0f} MiB {args.format} "
+              f"(generated in {time.perf_counter() - start:.1f} s), chunk {args.chunk}\n")
+
+        db.pool.path = os.path.join(tmp, "baseline.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            start = time.perf_counter()
+            for i in range(args.baseline):
+                await db.add_product(f"Товар {i}", "Описание", 1000, SIZES[0], "none")
+            elapsed = time.perf_counter() - start
+            print(f"{'add_product per row':>22}: {args.baseline / elapsed:9.0f} rows/s ({args.baseline} rows)")
+        finally:
+            await db.pool.close()
+
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            await timed_import("import, empty base", path, args.format, args.chunk)
+            # Выгрузка с id и ее повторная загрузка: ни одна строка не меняется
+            exported = os.path.join(tmp, f"export.{args.format}")
+            start = time.perf_counter()
+            count = await export_file(exported, args.format)
+            elapsed = time.perf_counter() - start
+            print(f"{'export':>22}: {count / elapsed:9.0f} rows/s ({elapsed:6.1f} s)")
+            await timed_import("re-import export", exported, args.format, args.chunk)
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--baseline", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""Проверка планов запросов и время выборок по заказам на 1M записей.
+
+Для каждого запроса админки и пользователя проверяется, что SQLite берет
+индекс из миграций (EXPLAIN QUERY PLAN), и сравнивается время с индексом
+и без него (NOT INDEXED). Скрипт завершается с ошибкой, если план не
+использует ожидаемый индекс.
+
+Запуск из корня проекта: python -m scripts.bench_indexes
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from database import db
+from scripts.bench_stats import ORDERS, seed
+
+REPEATS = 50
+
+# (описание, запрос, параметры, ожидаемый индекс)
+QUERIES = (
+    ("admin: latest orders", 'SELECT * FROM orders {hint} ORDER BY created_at DESC LIMIT 10', (),
+     "idx_orders_created_at"),
+    ("admin: orders by status", 'SELECT * FROM orders {hint} WHERE status = ? ORDER BY created_at DESC LIMIT 10',
+     ("Отменён",), "idx_orders_status"),
+    ("admin: console page",
+     'SELECT o.id, p.name FROM orders o {hint} LEFT JOIN products p ON p.id = o.product_id '
+     'WHERE (o.created_at, o.id) < (SELECT created_at, id FROM orders WHERE id = ?) '
+     'ORDER BY o.created_at DESC, o.id DESC LIMIT 9', (500_000,), "idx_orders_created_at"),
+    ("user: own orders", 'SELECT * FROM orders {hint} WHERE user_id = ? ORDER BY created_at DESC LIMIT 10',
+     (4242,), "idx_orders_user_id"),
+)
+
+
+async def plan(conn, query: str, params: tuple) -> str:
+    async with conn.execute('EXPLAIN QUERY PLAN ' + query, params) as cursor:
+        return " | ".join(row[3] for row in await cursor.fetchall())
+
+
+async def timed(conn, query: str, params: tuple, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        async with conn.execute(query, params) as cursor:
+            await cursor.fetchall()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+async def main() -> int:
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            await seed()
+            async with db.pool.write() as conn:
+                await conn.execute('ANALYZE')
+            print(f"{ORDERS} orders")
+            async with db.pool.read() as conn:
+                for label, query, params, index in QUERIES:
+                    indexed = query.format(hint="")
+                    query_plan = await plan(conn, indexed, params)
+                    ok = index in query_plan
+                    failed |= not ok
+                    with_index = await timed(conn, indexed, params, REPEATS)
+                    without = await timed(conn, query.format(hint="NOT INDEXED"), params, 3)
+                    print(f"{'OK  ' if ok else 'FAIL'} {label:<24} {with_index:8.3f} ms vs {without:8.1f} ms "
+                          f"without index | {query_plan}")
+        finally:
+            await db.pool.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,54 @@
+"""Микробенчмарк сборки inline-клавиатур на один callback: без кэша и с KeyboardCache.
+
+Запуск из корня проекта: python -m scripts.bench_keyboards
+"""
+import random
+import time
+import tracemalloc
+
+from database.catalog import catalog
+from keyboards import user_kbs
+
+CALLBACKS = 20_000
+PRODUCTS = 20_000
+SIZES = "XS, S, M, L, XL"
+
+
+def one_callback(build_sizes, build_buy, product_id: int, size: str, lang: str):
+    # Типичная пара: карточка товара (выбор размера) и кнопка покупки
+    build_sizes(product_id, SIZES, lang)
+    build_buy(product_id, size, lang)
+
+
+def measure(label: str, build_sizes, build_buy, hot: int):
+    rnd = random.Random(1)
+    sizes = [s.strip() for s in SIZES.split(",")]
+    start = time.perf_counter()
+    for _ in range(CALLBACKS):
+        # Большая часть трафика приходится на небольшую долю "горячих" товаров
+        product_id = rnd.randint(1, hot) if rnd.random() < 0.9 else rnd.randint(1, PRODUCTS)
+        one_callback(build_sizes, build_buy, product_id, rnd.choice(sizes), rnd.choice(("ru", "en")))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>8}: {elapsed / CALLBACKS * 1e6:7.2f} us per callback")
+
+
+def main():
+    catalog.version = 1
+    measure("builder", user_kbs.build_product_sizes_kb, user_kbs.build_buy_kb, hot=200)
+
+    measure("cached", user_kbs.get_product_sizes_kb, user_kbs.get_buy_kb, hot=200)
+    cache = user_kbs.kb_cache
+
+    # Память, занятая заполненным кэшем
+    cache.clear()
+    tracemalloc.start()
+    for product_id in range(1, cache.maxsize + 1):
+        user_kbs.get_product_sizes_kb(product_id, SIZES, "ru")
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"cache: {len(cache)} entries (max {cache.maxsize}), ~{current / 1024 / 1024:.1f} MiB, "
+          f"hit rate {cache.hits / (cache.hits + cache.misses):.1%}")
+
+
+if __name__ == "__main__":
+    main()
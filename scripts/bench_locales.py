@@ -0,0 +1,54 @@
+"""Бенчмарк get_text: прежняя реализация (словарь языков + str.format) против
+скомпилированных каталогов, по миллиону вызовов на каждый вид текста.
+
+Запуск из корня проекта: python -m scripts.bench_locales [--calls 1000000]
+"""
+import argparse
+import time
+
+from locales import en, ru
+from locales.manager import get_text, locales
+
+OLD_LOCALES = {"ru": ru.TEXTS, "en": en.TEXTS}
+
+
+def old_get_text(key: str, lang: str = "ru", **kwargs) -> str:
+    """get_text до перехода на каталоги."""
+    texts = OLD_LOCALES.get(lang, ru.TEXTS)
+    text = texts.get(key, key)
+    if kwargs:
+        return text.format(**kwargs)
+    return text
+
+
+CASES = [
+    ("plain", lambda f: f("catalog_title", "en")),
+    ("1 param", lambda f: f("order_success", "ru", order_id=12345)),
+    ("card", lambda f: f("product_card_size", "ru", name="Худи", description="Теплое худи", price=59.0, size="M")),
+]
+
+
+def measure(fn, case, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        case(fn)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main(args):
+    start = time.perf_counter()
+    locales.get("ru")
+    locales.get("en")
+    print(f"catalogs ru+en loaded and compiled in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    for label, case in CASES:
+        assert case(old_get_text) == case(get_text), label
+        old = measure(old_get_text, case, args.calls)
+        new = measure(get_text, case, args.calls)
+        print(f"{label:>8}: {old:6.0f} ns old, {new:6.0f} ns new ({old / new:.2f}x), "
+              f"{args.calls:,} calls: {old * args.calls / 1e9:.2f} s -> {new * args.calls / 1e9:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+"""Накладные расходы сбора метрик на один апдейт.
+
+1. Middleware напрямую: вызов пустого обработчика через HandlerMetricsMiddleware
+   против прямого вызова.
+2. Полный путь feed_update с пустым обработчиком: диспетчер с метриками и без.
+3. Стоимость record_db/record_api (пул и сессия бота вызывают их на каждый запрос).
+
+Берется лучший из нескольких прогонов, чтобы не мерить шум планировщика ОС.
+
+Запуск из корня проекта: python -m scripts.bench_metrics
+"""
+import asyncio
+import time
+
+from aiogram import Dispatcher, Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import Message, Update
+
+from middlewares.metrics import HandlerMetricsMiddleware
+from scripts.fakes import FakeSession, make_bot, message_update
+from utils.metrics import Metrics, record_db
+
+N = 200_000
+ROUNDS = 5
+
+
+async def handler(event, data):
+    return None
+
+
+async def best(fn, n: int) -> float:
+    """Лучшее из ROUNDS время одного вызова fn в микросекундах."""
+    results = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await fn(n)
+        results.append((time.perf_counter() - start) / n * 1e6)
+    return min(results)
+
+
+async def middleware_only():
+    metrics = Metrics()
+    middleware = HandlerMetricsMiddleware(metrics)
+    data = {"handler": HandlerObject(callback=handler)}
+
+    async def direct(n):
+        for _ in range(n):
+            await handler(None, data)
+
+    async def wrapped(n):
+        for _ in range(n):
+            await middleware(handler, None, data)
+
+    bare, instrumented = await best(direct, N), await best(wrapped, N)
+    print(f"middleware call:  {bare:6.3f} us bare, {instrumented:6.3f} us instrumented, "
+          f"+{instrumented - bare:.3f} us per update")
+    return instrumented - bare
+
+
+async def passthrough(handler, event, data):
+    return await handler(event, data)
+
+
+def build(middleware=None):
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        return None
+
+    dp = Dispatcher()
+    if middleware:
+        dp.message.middleware(middleware)
+    dp.include_router(router)
+    return dp
+
+
+async def full_path():
+    bot = make_bot(FakeSession())
+    update = Update.model_validate(message_update(1, "hi"), context={"bot": bot})
+    # Пустая middleware показывает цену самой цепочки middleware в aiogram
+    dispatchers = {"bare": build(), "passthrough": build(passthrough),
+                   "instrumented": build(HandlerMetricsMiddleware(Metrics()))}
+    results = dict.fromkeys(dispatchers, float("inf"))
+    # Варианты чередуются, чтобы фоновый шум машины попадал во все одинаково
+    for _ in range(ROUNDS * 4):
+        for name, dp in dispatchers.items():
+            n = N // 100
+            start = time.perf_counter()
+            for _ in range(n):
+                await dp.feed_update(bot, update)
+            results[name] = min(results[name], (time.perf_counter() - start) / n * 1e6)
+    overhead = results["instrumented"] - results["bare"]
+    print(f"feed_update:      {results['bare']:6.3f} us bare, {results['passthrough']:6.3f} us with an empty "
+          f"middleware, {results['instrumented']:6.3f} us instrumented, +{overhead:.3f} us per update")
+    return overhead
+
+
+async def hooks():
+    metrics = Metrics()
+
+    async def outside(n):
+        for _ in range(n):
+            record_db(1000)
+
+    async def inside(n):
+        token = metrics.begin()
+        for _ in range(n):
+            record_db(1000)
+            metrics.record_api("SendMessage", 1000)
+        metrics.finish(token, "bench", 0)
+
+    print(f"record_db outside an update: {await best(outside, N):6.3f} us")
+    print(f"record_db + record_api:      {await best(inside, N):6.3f} us")
+
+
+async def main():
+    await middleware_only()
+    await full_path()
+    await hooks()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""Консоль заказов /orders: вызовы Bot API и время БД на страницу против прежней реализации.
+
+Прежний /orders делал SELECT * на 10 заказов и отправлял по сообщению на
+каждый заказ. Новый рисует одну страницу (JOIN с товарами, keyset по
+created_at) и редактирует одно сообщение при листании.
+
+Запуск из корня проекта: python -m scripts.bench_order_console [--rtt 0.05]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aiogram import Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import Message, Update
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from core import config
+from database import db
+from handlers import admin_handlers
+from scripts.bench_stats import ORDERS, seed
+from scripts.fakes import FakeSession, callback_update, make_bot, message_update
+
+ADMIN_ID = 777
+REPEATS = 200
+
+legacy_router = Router()
+
+
+@legacy_router.message(Command("orders"))
+async def legacy_orders(message: Message):
+    # Прежняя реализация cmd_orders
+    async with db.pool.read() as conn:
+        async with conn.execute('SELECT * FROM orders ORDER BY created_at DESC LIMIT ?', (10,)) as cursor:
+            orders = await cursor.fetchall()
+    for order in orders:
+        text = (
+            f"📦 <b>Заказ #{order[0]}</b>\n"
+            f"👤 Покупатель: @{order[2]}\n"
+            f"🏠 Адрес: {order[5]}\n"
+            f"👕 Товар ID: {order[3]} (Размер {order[4]})\n"
+            f"🕒 Дата: {order[7]}\n"
+            f"🔄 Статус: <b>{order[6]}</b>"
+        )
+        builder = InlineKeyboardBuilder()
+        builder.button(text="✅ Завершить", callback_data=f"status_{order[0]}_Завершён")
+        builder.button(text="❌ Отменить", callback_data=f"status_{order[0]}_Отменён")
+        builder.adjust(2)
+        await message.answer(text, reply_markup=builder.as_markup(), parse_mode="HTML")
+
+
+async def legacy_query():
+    async with db.pool.read() as conn:
+        async with conn.execute('SELECT * FROM orders ORDER BY created_at DESC LIMIT ?', (10,)) as cursor:
+            await cursor.fetchall()
+
+
+async def timed(fn, repeats: int = REPEATS) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+async def bot_api(router: Router, raw: dict, rtt: float):
+    session = FakeSession(latency=rtt)
+    bot = make_bot(session)
+    router._parent_router = None
+    dp = Dispatcher()
+    dp.include_router(router)
+    start = time.perf_counter()
+    await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+    return sum(session.calls.values()), (time.perf_counter() - start) * 1000
+
+
+async def main(rtt: float):
+    config.ADMIN_IDS.append(ADMIN_ID)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            await seed()
+            async with db.pool.write() as conn:
+                await conn.execute('ANALYZE')
+            print(f"{ORDERS} orders, simulated Bot API RTT {rtt * 1000:.0f} ms\n")
+
+            page = admin_handlers.ORDERS_PAGE_SIZE + 1
+            deep = [row async for row in db.iter_orders(limit=ORDERS // 2)][-1][0]
+
+            async def stream(*args):
+                return [row async for row in db.iter_orders(*args, limit=page)]
+
+            print("DB time per page (ms):")
+            print(f"  legacy SELECT * LIMIT 10:       {await timed(legacy_query):7.3f}")
+            print(f"  iter_orders, first page:        {await timed(lambda: stream()):7.3f}")
+            print(f"  iter_orders, older than #{deep:<6}: {await timed(lambda: stream(None, deep, 'older')):7.3f}")
+            print(f"  iter_orders, 'Отменён' filter:  {await timed(lambda: stream('Отменён', deep, 'older')):7.3f}")
+
+            print("\nPage render incl. text and keyboard (ms):")
+            print(f"  console, first page:            {await timed(lambda: admin_handlers._render_orders('all')):7.3f}")
+            print(f"  console, page at order #{deep:<7}: "
+                  f"{await timed(lambda: admin_handlers._render_orders('all', deep, 'older')):7.3f}")
+            print(f"  console, newer than #{deep:<9}: "
+                  f"{await timed(lambda: admin_handlers._render_orders('all', deep, 'newer')):7.3f}")
+            print(f"  console, filter 'Отменён':      "
+                  f"{await timed(lambda: admin_handlers._render_orders('cancel', deep, 'older')):7.3f}")
+
+            print("\nBot API per /orders:")
+            for label, router, raw in (
+                ("legacy /orders", legacy_router, message_update(ADMIN_ID, "/orders")),
+                ("console /orders", admin_handlers.router, message_update(ADMIN_ID, "/orders")),
+                ("console next page", admin_handlers.router, callback_update(ADMIN_ID, f"orders_all_older_{deep}")),
+            ):
+                calls, elapsed = await bot_api(router, raw, rtt)
+                print(f"  {label:<18} {calls:3d} calls {elapsed:8.1f} ms")
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=0.05, help="simulated Bot API round trip, seconds")
+    asyncio.run(main(parser.parse_args().rtt))
@@ -0,0 +1,58 @@
+"""Бенчмарк постраничного каталога на 100k товаров: keyset-курсор против OFFSET.
+
+Запуск из корня проекта: python -m scripts.bench_pagination
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from database import db
+
+PRODUCTS = 100_000
+PAGE = 10
+REPEATS = 200
+
+
+async def seed():
+    async with db.pool.write() as conn:
+        await conn.executemany(
+            'INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
+            ((f"Товар {i}", "Описание", 1000.0, "S, M, L", "none") for i in range(PRODUCTS))
+        )
+
+
+async def offset_page(offset: int):
+    # Для сравнения: классическая пагинация через OFFSET
+    async with db.pool.read() as conn:
+        async with conn.execute('SELECT id, name FROM products ORDER BY id LIMIT ? OFFSET ?', (PAGE, offset)) as cursor:
+            return await cursor.fetchall()
+
+
+async def timed(coro_factory) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        await coro_factory()
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            await seed()
+            print(f"{PRODUCTS} products, page size {PAGE}")
+            for offset in (0, 1_000, 10_000, 50_000, 99_990):
+                keyset = await timed(lambda: db.get_products_page(after_id=offset, limit=PAGE))
+                backwards = await timed(lambda: db.get_products_page(before_id=offset + PAGE + 1, limit=PAGE))
+                plain = await timed(lambda: offset_page(offset))
+                print(f"offset {offset:>6}: keyset next {keyset:8.1f} us | keyset prev {backwards:8.1f} us "
+                      f"| OFFSET {plain:9.1f} us")
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
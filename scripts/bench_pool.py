@@ -0,0 +1,56 @@
+"""Бенчмарк: aiosqlite.connect на каждый вызов против общего пула соединений.
+
+Запуск из корня проекта: python -m scripts.bench_pool
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import aiosqlite
+
+from database import db
+
+LEVELS = (100, 1_000, 10_000)
+
+
+async def get_product_per_call(path: str, product_id: int):
+    # Старый вариант: новое соединение (и новый поток) на каждый запрос
+    async with aiosqlite.connect(path) as conn:
+        async with conn.execute('SELECT * FROM products WHERE id = ?', (product_id,)) as cursor:
+            return await cursor.fetchone()
+
+
+async def run_level(concurrency: int, path: str):
+    ids = [random.randint(1, 5) for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    # При большой конкурентности старый вариант упирается в лимит файловых дескрипторов
+    results = await asyncio.gather(*(get_product_per_call(path, i) for i in ids), return_exceptions=True)
+    per_call = time.perf_counter() - start
+    failed = sum(isinstance(r, Exception) for r in results)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(db.get_product(i) for i in ids))
+    pooled = time.perf_counter() - start
+
+    print(f"{concurrency:>6} calls | per-call connect: {per_call * 1000:9.1f} ms "
+          f"({failed} failed) | pooled: {pooled * 1000:8.1f} ms | x{per_call / pooled:5.1f}")
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        db.pool.path = path
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            for level in LEVELS:
+                await run_level(level, path)
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Проверка планировщика исходящих запросов на локальном Bot API с 429.
+
+Сценарии:
+  burst     — сотни сообщений в сотню чатов одновременно: без планировщика
+              часть запросов получает 429 и теряется, с ним доходят все;
+  priority  — ответы покупателям во время массовой рассылки: с приоритетами
+              они не ждут конца очереди рассылки;
+  coalesce  — пачка правок одного сообщения: уходит только последняя.
+
+Лимиты сервера уменьшены по времени (global/chat rate), планировщик
+настраивается на 90% от них, как и стоит делать с настоящим Telegram.
+Скрипт завершается с ошибкой, если планировщик потерял запросы.
+
+Запуск из корня проекта: python -m scripts.bench_rate_limit
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from scripts.fake_bot_api import FakeBotAPI
+from utils.rate_limiter import LANE_BULK, LANE_USER, RateLimiter, sending_lane
+
+HEADROOM = 0.9
+
+
+def make_limiter(api: FakeBotAPI) -> RateLimiter:
+    return RateLimiter(global_rate=api.global_rate * HEADROOM, chat_rate=api.chat_rate * HEADROOM,
+                       chat_burst=api.chat_burst, max_retries=5)
+
+
+async def gather(coros) -> List:
+    return await asyncio.gather(*coros, return_exceptions=True)
+
+
+def failures(results: List) -> int:
+    return sum(isinstance(r, BaseException) for r in results)
+
+
+async def burst(api: FakeBotAPI, limiter: Optional[RateLimiter], chats: int, per_chat: int) -> bool:
+    api.reset()
+    bot = api.make_bot()
+    if limiter:
+        bot.session.middleware(limiter)
+    start = time.perf_counter()
+    results = await gather(bot.send_message(chat, f"msg {i}")
+                           for i in range(per_chat) for chat in range(1, chats + 1))
+    elapsed = time.perf_counter() - start
+    await bot.session.close()
+    lost = failures(results)
+    retry_after = sum(isinstance(r, TelegramRetryAfter) for r in results)
+    print(f"  {'limiter' if limiter else 'direct':<8} {len(results)} sent, {lost:4d} lost ({retry_after} RetryAfter), "
+          f"{sum(api.rejected.values()):4d} x 429 on server, {elapsed:6.2f} s")
+    return lost == 0
+
+
+async def priority(api: FakeBotAPI, lanes: bool, bulk: int, replies: int) -> float:
+    api.reset()
+    bot = api.make_bot()
+    bot.session.middleware(make_limiter(api))
+
+    async def broadcast():
+        with sending_lane(LANE_BULK):
+            return await gather(bot.send_message(10_000 + i, "news") for i in range(bulk))
+
+    async def reply(chat: int) -> float:
+        start = time.perf_counter()
+        with sending_lane(LANE_USER if lanes else LANE_BULK):
+            await bot.send_message(chat, "order accepted")
+        return time.perf_counter() - start
+
+    task = asyncio.create_task(broadcast())
+    await asyncio.sleep(0.2)
+    latencies = await gather(reply(chat) for chat in range(1, replies + 1))
+    lost = failures(await task) + failures(latencies)
+    await bot.session.close()
+    latencies = sorted(x for x in latencies if isinstance(x, float))
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {'lanes' if lanes else 'fifo':<8} user reply p50 {statistics.median(latencies) * 1000:7.0f} ms, "
+          f"p95 {p95 * 1000:7.0f} ms during a {bulk}-message broadcast, {lost} lost")
+    return p95
+
+
+async def coalesce(api: FakeBotAPI, limiter: Optional[RateLimiter], edits: int) -> bool:
+    api.reset()
+    bot = api.make_bot()
+    if limiter:
+        bot.session.middleware(limiter)
+    chat = 42
+    message = await bot.send_message(chat, "⏳ 0%")
+    results = await gather(bot.edit_message_text(f"⏳ {i * 100 // edits}%", chat_id=chat, message_id=message.message_id)
+                           for i in range(1, edits + 1))
+    await bot.session.close()
+    delivered = [text for _, method, _, text in api.log if method == "editmessagetext"]
+    print(f"  {'limiter' if limiter else 'direct':<8} {edits} edits -> {len(delivered)} delivered, "
+          f"{failures(results)} failed, last shown: {delivered[-1] if delivered else '-'!r}")
+    return failures(results) == 0 and bool(delivered) and delivered[-1] == "⏳ 100%"
+
+
+async def main(args) -> int:
+    ok = True
+    async with FakeBotAPI(global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=3) as api:
+        print(f"fake Bot API at {api.url}: {api.global_rate}/s per bot, {api.chat_rate}/s per chat\n")
+        print(f"burst: {args.chats} chats x {args.per_chat} messages")
+        await burst(api, None, args.chats, args.per_chat)
+        ok &= await burst(api, make_limiter(api), args.chats, args.per_chat)
+
+        print(f"\npriority: {args.replies} user replies")
+        fifo = await priority(api, False, args.bulk, args.replies)
+        lanes = await priority(api, True, args.bulk, args.replies)
+        ok &= lanes < fifo
+
+        print("\ncoalesce: edits of one message")
+        await coalesce(api, None, 10)
+        ok &= await coalesce(api, make_limiter(api), 10)
+    print("\nOK" if ok else "\nFAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--global-rate", type=float, default=60)
+    parser.add_argument("--chat-rate", type=float, default=2)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--per-chat", type=int, default=4)
+    parser.add_argument("--bulk", type=int, default=300)
+    parser.add_argument("--replies", type=int, default=20)
+    sys.exit(asyncio.run(main(parser.parse_args())))
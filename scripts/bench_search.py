@@ -0,0 +1,107 @@
+"""Время поиска товаров на 200k товаров: FTS5-индекс против LIKE-сканирования.
+
+Товары генерируются из словаря (тип, цвет, материал, эпитеты) с размерами,
+так что популярные слова встречаются в десятках тысяч товаров, а редкие — в
+единицах. Для каждого запроса меряется полный вызов db.search_products
+(пул, FTS5, ранжирование bm25) и тот же отбор через LIKE '%слово%'.
+Скрипт завершается с ошибкой, если p95 поиска больше 10 мс.
+
+Запуск из корня проекта: python -m scripts.bench_search [--products 200000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from database import db
+
+TYPES = ["Худи", "Футболка", "Джоггеры", "Свитшот", "Панама", "Куртка", "Лонгслив", "Шорты", "Кепка", "Бомбер",
+         "Рубашка", "Поло", "Жилет", "Анорак", "Ветровка", "Пуховик"]
+COLORS = ["черный", "белый", "желтый", "графитовый", "молочный", "синий", "зеленый", "красный", "бежевый", "оливковый",
+          "лавандовый", "терракотовый"]
+WORDS = ["оверсайз", "хлопок", "премиальный", "принт", "вышивка", "логотип", "утепленный", "легкий", "спортивный",
+         "базовый", "лимитированный", "капсула", "водоотталкивающий", "флис", "лен", "минимализм", "винтаж",
+         "светоотражающий", "дышащий", "органический"]
+SIZES = ["XS, S, M, L", "S, M, L, XL", "M, L, XL", "One Size", "S, M, L", "L, XL, XXL"]
+
+# (описание, запрос): от частых слов к редким, с опечаткой-префиксом и несколькими словами
+QUERIES = (
+    ("one frequent word", "худи"),
+    ("prefix of 2 letters", "ху"),
+    ("two words", "черная футболка"),
+    ("word + size", "куртка xl"),
+    ("rare word", "терракотовый анорак"),
+    ("word from description", "светоотраж"),
+    ("no results", "смокинг"),
+)
+
+
+def product(rnd: random.Random, n: int) -> tuple:
+    kind, color = rnd.choice(TYPES), rnd.choice(COLORS)
+    name = f"{kind} {color.capitalize()} {n}"
+    description = f"{kind} {color} цвета: " + ", ".join(rnd.sample(WORDS, 4)) + "."
+    return name, description, float(rnd.randint(10, 300) * 100), rnd.choice(SIZES), None
+
+
+def like_query(text: str) -> tuple:
+    terms = text.lower().split()
+    # Без индекса: каждое слово ищется подстрокой во всех трех полях каждого товара
+    where = " AND ".join("(lower(name) LIKE ? OR lower(description) LIKE ? OR lower(sizes) LIKE ?)" for _ in terms)
+    params = [f"%{term}%" for term in terms for _ in range(3)]
+    return f"SELECT id, name FROM products WHERE {where} LIMIT 10", params
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main(args) -> int:
+    rnd = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db()
+            start = time.perf_counter()
+            async with db.pool.write() as conn:
+                await conn.executemany(
+                    'INSERT INTO products (name, description, price, sizes, photo_id) VALUES (?, ?, ?, ?, ?)',
+                    (product(rnd, n) for n in range(args.products)),
+                )
+            print(f"{args.products} products inserted and indexed by triggers in {time.perf_counter() - start:.1f} s")
+
+            worst = 0.0
+            for label, text in QUERIES:
+                timings = []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    results = await db.search_products(text)
+                    timings.append((time.perf_counter() - start) * 1000)
+                p50, p95 = percentile(timings, 0.5), percentile(timings, 0.95)
+                worst = max(worst, p95)
+
+                query, params = like_query(text)
+                start = time.perf_counter()
+                async with db.pool.read() as conn:
+                    async with conn.execute(query, params) as cursor:
+                        await cursor.fetchall()
+                like = (time.perf_counter() - start) * 1000
+                top = results[0][1] if results else "-"
+                print(f"{label:<22} {text!r:<24} fts p50 {p50:6.2f} ms, p95 {p95:6.2f} ms | like {like:7.1f} ms "
+                      f"| {len(results)} results, top: {top}")
+        finally:
+            await db.pool.close()
+    ok = worst < 10
+    print(f"worst p95 {worst:.2f} ms: {'OK' if ok else 'FAIL'} (budget 10 ms)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,80 @@
+"""Бенчмарк /stats на 1M заказов: агрегат по всей таблице против сводных таблиц.
+
+Запуск из корня проекта: python -m scripts.bench_stats
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from database import db
+
+ORDERS = 1_000_000
+REPEATS = 20
+
+
+async def seed():
+    rnd = random.Random(1)
+    async with db.pool.write() as conn:
+        await conn.executemany('INSERT INTO users (id, username) VALUES (?, ?)',
+                               ((i, f"user{i}") for i in range(1, 50_001)))
+        await conn.executemany(
+            "INSERT INTO orders (user_id, username, product_id, size, address, status, created_at) "
+            "VALUES (?, ?, ?, 'M', 'Адрес', ?, datetime('now', ?))",
+            ((rnd.randint(1, 50_000), "user", rnd.randint(1, 5), rnd.choice(("Новый", "Завершён", "Отменён")),
+              f"-{rnd.randint(0, 365)} days") for _ in range(ORDERS))
+        )
+        # Заказы из одной строки, как после миграции order_items
+        await conn.execute(
+            "INSERT INTO order_items (order_id, line, product_id, size, quantity, unit_price) "
+            "SELECT o.id, 1, o.product_id, o.size, 1, p.price FROM orders o JOIN products p ON p.id = o.product_id"
+        )
+        await conn.execute('UPDATE orders SET total = (SELECT price FROM products WHERE id = orders.product_id)')
+
+
+async def full_scan() -> dict:
+    # Прежняя реализация get_stats
+    async with db.pool.read() as conn:
+        async with conn.execute('SELECT COUNT(*), SUM(p.price) FROM orders o JOIN products p ON o.product_id = p.id') as cursor:
+            row = await cursor.fetchone()
+            return {"total_orders": row[0] or 0, "total_sales": row[1] or 0.0}
+
+
+async def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        await fn()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            start = time.perf_counter()
+            await seed()
+            print(f"seeded {ORDERS} orders in {time.perf_counter() - start:.1f} s")
+
+            start = time.perf_counter()
+            await db.rebuild_stats()
+            print(f"rebuild from scratch: {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+            old, new = await full_scan(), await db.get_stats()
+            assert old["total_orders"] == new["total_orders"]
+            assert round(old["total_sales"], 2) == round(new["total_sales"], 2)
+            print(f"full-table aggregate: {await timed(full_scan):8.2f} ms per /stats")
+            print(f"summary tables:       {await timed(db.get_stats):8.2f} ms per /stats")
+
+            start = time.perf_counter()
+            for i in range(1, 1001):
+                await db.create_order(i, f"user{i}", i % 5 + 1, "M", "Адрес")
+            print(f"create_order with stats update: {(time.perf_counter() - start):8.3f} ms per order")
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
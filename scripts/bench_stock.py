@@ -0,0 +1,145 @@
+"""Проверка остатков под конкуренцией: 5000 одновременных покупателей на 100 единиц.
+
+1. Все покупатели одновременно жмут "В корзину" (reserve_stock) — ровно 100
+   броней, остаток 0, ни одной продажи сверх остатка.
+2. Владельцы броней оформляют заказы через OrderWriter, покупатели без
+   брони получают отказ.
+3. Просроченная бронь возвращается в остаток следующему покупателю,
+   отмена заказа возвращает единицу, снять отмену без остатка нельзя.
+4. То же, что в п. 1, из нескольких процессов с собственными пулами
+   соединений к одному файлу базы.
+
+Запуск из корня проекта: python -m scripts.bench_stock [--buyers 5000 --units 100 --processes 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from database import db
+from database.order_writer import OrderWriter
+
+PRODUCT_ID = 1
+
+
+async def rush(buyers: range, size: str) -> list:
+    """Все покупатели из buyers одновременно бронируют размер; возвращает id броней (None — не досталось)."""
+    return await asyncio.gather(*(db.reserve_stock(user_id, PRODUCT_ID, size) for user_id in buyers))
+
+
+async def scalar(query: str, params: tuple = ()) -> int:
+    async with db.pool.read() as conn:
+        async with conn.execute(query, params) as cursor:
+            return (await cursor.fetchone())[0]
+
+
+def check(results: list, label: str, ok: bool, detail: str = ""):
+    results.append(ok)
+    print(f"{'OK  ' if ok else 'FAIL'} {label}" + (f": {detail}" if detail else ""))
+
+
+def worker(path: str, buyers: range, size: str, queue):
+    async def run():
+        db.pool.path = path
+        await db.pool.open()
+        try:
+            reservations = await rush(buyers, size)
+        finally:
+            await db.pool.close()
+        queue.put(sum(r is not None for r in reservations))
+    asyncio.run(run())
+
+
+async def main(args) -> int:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+
+            # 1. Давка на один размер
+            await db.set_stock(PRODUCT_ID, "M", args.units)
+            start = time.perf_counter()
+            reservations = await rush(range(1, args.buyers + 1), "M")
+            elapsed = time.perf_counter() - start
+            won = [(user_id, r) for user_id, r in zip(range(1, args.buyers + 1), reservations) if r is not None]
+            stock = await scalar('SELECT stock FROM inventory WHERE product_id = ? AND size = ?', (PRODUCT_ID, "M"))
+            print(f"{args.buyers} buyers for {args.units} units: {elapsed * 1000:.0f} ms, "
+                  f"{args.buyers / elapsed:,.0f} reservations/s")
+            check(results, "no oversell", len(won) == args.units and stock == 0,
+                  f"{len(won)} reservations, stock left {stock}")
+
+            # 2. Оформление заказов
+            writer = OrderWriter()
+            start = time.perf_counter()
+            placed = await asyncio.gather(
+                *(writer.submit(user_id, f"user{user_id}", "Адрес", [db.CartItem(PRODUCT_ID, "M", 1, (r,))])
+                  for user_id, r in won),
+                *(writer.submit(user_id, f"user{user_id}", "Адрес", [db.CartItem(PRODUCT_ID, "M")])
+                  for user_id in range(-50, 0)),
+            )
+            elapsed = time.perf_counter() - start
+            await writer.close()
+            order_ids = [order.order_id for order in placed]
+            placed = sum(order_id is not None for order_id in order_ids)
+            print(f"{len(order_ids)} checkouts in {elapsed * 1000:.0f} ms")
+            check(results, "every reservation becomes an order, nobody else buys", placed == args.units,
+                  f"{placed} orders")
+
+            # 3. Просроченная бронь, отмена и снятие отмены
+            await db.set_stock(PRODUCT_ID, "L", 1)
+            expired = await db.reserve_stock(100_001, PRODUCT_ID, "L", ttl=-1)
+            late = await db.reserve_stock(100_002, PRODUCT_ID, "L")
+            stale_order = await db.create_order(100_001, "late", PRODUCT_ID, "L", "Адрес", expired)
+            check(results, "expired hold goes to the next buyer", bool(expired) and bool(late) and stale_order is None)
+
+            order_id = next(order_id for order_id in order_ids if order_id is not None)
+            await db.update_order_status(order_id, "Отменён")
+            again = await db.reserve_stock(100_003, PRODUCT_ID, "M")
+            uncancel = await db.update_order_status(order_id, "Новый")
+            stock = await scalar('SELECT stock FROM inventory WHERE product_id = ? AND size = ?', (PRODUCT_ID, "M"))
+            check(results, "cancel releases a unit, uncancel is refused when sold out",
+                  bool(again) and uncancel.refused and stock == 0)
+        finally:
+            await db.pool.close()
+
+        # 4. Несколько процессов
+        if args.processes > 1:
+            db.pool.path = path
+            await db.pool.open()
+            await db.set_stock(PRODUCT_ID, "S", args.units)
+            await db.pool.close()
+            per_process = args.buyers // args.processes
+            ctx = multiprocessing.get_context("spawn")
+            queue = ctx.Queue()
+            processes = [
+                ctx.Process(target=worker, args=(path, range(200_000 + i * per_process, 200_000 + (i + 1) * per_process), "S", queue))
+                for i in range(args.processes)
+            ]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            won = sum(queue.get() for _ in processes)
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+            db.pool.path = path
+            await db.pool.open()
+            stock = await scalar('SELECT stock FROM inventory WHERE product_id = ? AND size = ?', (PRODUCT_ID, "S"))
+            await db.pool.close()
+            print(f"{args.processes} processes x {per_process} buyers: {elapsed * 1000:.0f} ms including process start")
+            check(results, "no oversell across processes", won == args.units and stock == 0,
+                  f"{won} reservations, stock left {stock}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=5000)
+    parser.add_argument("--units", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=4)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,122 @@
+"""Пропускная способность бота в нескольких процессах (utils/sharding.py).
+
+Входной процесс (этот скрипт) раздает синтетический поток апдейтов воркерам
+по chat_id, как в режиме WORKERS > 1. Каждый пользователь проходит полный
+сценарий: каталог -> товар -> размер -> "В корзину" -> "Оформить" -> адрес,
+так что в работе FSM, корзина, брони и запись заказов в общий файл SQLite
+из нескольких процессов. Воркеры — настоящие run_worker с заглушкой Bot API
+(FakeSession, задержка --rtt) вместо сети. Для 1, 2, 4 и 8 воркеров
+печатается число апдейтов в секунду (старт процессов не входит в замер) и
+проверяется, что каждый пользователь оформил ровно один заказ: если апдейты
+одного чата обработаются не по порядку, адрес придет без состояния и заказа
+не будет.
+
+Ускорение ограничено числом ядер: на одном ядре воркеры только делят его.
+
+Запуск из корня проекта: python -m scripts.bench_workers [--users 2000 --workers 1,2,4,8 --rtt 20]
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Лимиты Bot API в замере не нужны; переменные окружения наследуют процессы-воркеры
+os.environ.update(BOT_API_RATE="1000000", BOT_API_CHAT_RATE="1000000", BOT_API_CHAT_BURST="1000000",
+                  METRICS_PORT="0", PHOTO_WARMUP_CHAT_ID="0", ADMIN_IDS="", FSM_STORAGE="sqlite")
+
+from database import db
+from scripts.fakes import FakeSession, browse_updates, callback_update, make_bot, message_update
+from utils.sharding import UpdateRouter, run_worker
+
+
+def bench_worker(path: str, rtt: float, index: int, count: int, port: int):
+    """Воркер с заглушкой Bot API вместо сети."""
+    logging.basicConfig(level=logging.WARNING)
+    db.pool.path = path
+    asyncio.run(run_worker(index, count, port, bot=make_bot(FakeSession(latency=rtt))))
+
+
+def user_updates(user_id: int) -> list:
+    return browse_updates(user_id) + [
+        callback_update(user_id, "buy_1_M", photo=True),
+        callback_update(user_id, "cart_checkout"),
+        message_update(user_id, f"ул. Тестовая, {user_id}"),
+    ]
+
+
+def interleave(users: range) -> list:
+    """Апдейты всех пользователей вперемешку, с сохранением порядка внутри каждого."""
+    rnd = random.Random(1)
+    streams = [user_updates(user_id) for user_id in users]
+    updates = []
+    while streams:
+        i = rnd.randrange(len(streams))
+        updates.append(streams[i].pop(0))
+        if not streams[i]:
+            streams[i] = streams[-1]
+            streams.pop()
+    return updates
+
+
+async def scalar(query: str, params: tuple = ()) -> int:
+    async with db.pool.read() as conn:
+        async with conn.execute(query, params) as cursor:
+            return (await cursor.fetchone())[0]
+
+
+async def run(path: str, workers: int, users: range, rtt: float) -> tuple:
+    updates = interleave(users)
+    router = UpdateRouter(workers, target=functools.partial(bench_worker, path, rtt), pinned=())
+    await router.start()
+    try:
+        start = time.perf_counter()
+        for raw in updates:
+            await router.wait_capacity()
+            await router.route(raw)
+        await router.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        await router.close()
+    return len(updates) / elapsed, router.stats()["per_worker"]
+
+
+async def main(args) -> int:
+    logging.basicConfig(level=logging.WARNING)
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        await db.init_db(seed_data=True)
+        await db.pool.close()
+
+        baseline = None
+        for i, workers in enumerate(int(n) for n in args.workers.split(",")):
+            # Свои пользователи на каждый прогон, чтобы заказы считались отдельно
+            users = range(1_000_000 * (i + 1), 1_000_000 * (i + 1) + args.users)
+            rate, per_worker = await run(path, workers, users, args.rtt / 1000)
+            baseline = baseline or rate
+            await db.pool.open()
+            orders = await scalar('SELECT COUNT(*) FROM orders WHERE user_id BETWEEN ? AND ?', (users[0], users[-1]))
+            buyers = await scalar('SELECT COUNT(DISTINCT user_id) FROM orders WHERE user_id BETWEEN ? AND ?',
+                                  (users[0], users[-1]))
+            await db.pool.close()
+            consistent = orders == buyers == args.users
+            ok = ok and consistent
+            print(f"{workers} workers: {rate:8.0f} updates/s ({rate / baseline:4.2f}x) | "
+                  f"per worker {per_worker} | orders {orders}/{args.users} {'OK' if consistent else 'FAIL'}",
+                  flush=True)
+    print(f"{os.cpu_count()} CPU cores")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--rtt", type=float, default=20, help="имитация задержки Bot API, мс")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,54 @@
+"""Импорт и экспорт каталога из командной строки (то же, что /import_catalog и /export_catalog).
+
+Запуск из корня проекта:
+  python -m scripts.catalog_io import products.csv
+  python -m scripts.catalog_io export catalog.jsonl
+
+Формат определяется по расширению (или --format). Работающий бот подхватит
+изменения сам: процессы перечитывают кэш каталога по счетчику версии в базе.
+"""
+import argparse
+import asyncio
+import sys
+
+from core.config import IMPORT_CHUNK
+from database.db import init_db, pool
+from utils.catalog_io import FORMATS, ImportReport, detect_format, export_file, import_file
+
+
+async def print_progress(report: ImportReport):
+    rate = report.rows / report.elapsed if report.elapsed else 0
+    print(f"\r{report.rows} rows read, {report.imported} imported, {report.skipped} skipped ({rate:.0f} rows/s)",
+          end="\n" if report.finished else "", flush=True)
+
+
+async def main(args) -> int:
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        print(f"Unknown file format: {args.path} (use --format {'/'.join(FORMATS)})", file=sys.stderr)
+        return 2
+    await pool.open()
+    try:
+        await init_db()
+        if args.command == "export":
+            count = await export_file(args.path, fmt)
+            print(f"{count} products exported to {args.path}")
+            return 0
+        report = await import_file(args.path, fmt, chunk=args.chunk, progress=print_progress)
+        print(f"{report.changed} products changed in {report.elapsed:.1f} s")
+        for error in report.errors:
+            print(f"  {error}", file=sys.stderr)
+        if report.failed:
+            print(f"Import stopped: {report.failed}", file=sys.stderr)
+        return 1 if report.skipped or report.failed else 0
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--chunk", type=int, default=IMPORT_CHUNK, help="товаров в одной транзакции")
+    sys.exit(asyncio.run(main(parser.parse_args())))
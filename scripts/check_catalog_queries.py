@@ -0,0 +1,99 @@
+"""Проверка: после прогрева кэша просмотр каталога не ходит в базу.
+
+Апдейты идут через настоящий диспетчер (create_dispatcher) во временный файл
+SQLite с --products товарами; Bot API — FakeSession. После catalog.load()
+(start_services с fast=False ждет прогрева) каждый из --users покупателей
+проходит просмотр: каталог -> следующая страница -> товар -> размер ->
+"Назад" к товару -> "Назад в каталог" -> предыдущая страница. Считаются все
+запросы пула (pool.queries), а не только запросы внутри обработчиков.
+FSM хранится в памяти: чтения состояния SQLite-хранилищем — его собственный
+кэш, к каталогу они не относятся.
+
+Любой SQL-запрос на этом пути — ошибка, код возврата 1.
+
+Запуск из корня проекта: python -m scripts.check_catalog_queries [--products 200 --users 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# Лимиты Bot API и фоновые сервисы в проверке не нужны
+os.environ.update(BOT_API_RATE="1000000", BOT_API_CHAT_RATE="1000000", BOT_API_CHAT_BURST="1000000",
+                  METRICS_PORT="0", PHOTO_WARMUP_CHAT_ID="0", ADMIN_IDS="", FSM_STORAGE="memory")
+
+from aiogram.types import Update
+
+from core.app import create_dispatcher, start_services, stop_services
+from core.config import CATALOG_PAGE_SIZE
+from database import db
+from database.catalog import catalog
+from database.db import Product
+from locales.manager import get_text
+from scripts.fakes import FakeSession, callback_update, make_bot, message_update
+
+LANGS = ("ru", "en", "uk")
+
+
+def browse(user_id: int, product_id: int, lang: str) -> list:
+    """(шаг, сырой апдейт) просмотра каталога одним покупателем."""
+    first_page_last = CATALOG_PAGE_SIZE
+    return [
+        ("catalog", message_update(user_id, get_text("catalog", lang), lang=lang)),
+        ("next page", callback_update(user_id, f"catalog_next_{first_page_last}", lang=lang)),
+        ("product", callback_update(user_id, f"prod_{product_id}", lang=lang)),
+        ("size", callback_update(user_id, f"size_{product_id}_M", lang=lang)),
+        ("back to product", callback_update(user_id, f"prod_{product_id}", lang=lang)),
+        ("back to catalog", callback_update(user_id, "catalog", lang=lang)),
+        ("prev page", callback_update(user_id, f"catalog_prev_{first_page_last + 1}", lang=lang)),
+    ]
+
+
+async def run(args, path: str) -> bool:
+    bot = make_bot(FakeSession())
+    dp = create_dispatcher(bot)
+    db.pool.path = path
+    await db.pool.open()
+    await db.init_db()
+    await db.upsert_products([
+        Product(None, f"Товар {i}", f"Описание товара {i}", 1000 + i, "S, M, L", "none")
+        for i in range(1, args.products + 1)
+    ])
+    runner = await start_services(bot, primary=False, metrics_port=0, fast=False)
+    queries = {}
+    try:
+        if not catalog.loaded:
+            print("FAIL catalog cache is not loaded after start_services")
+            return False
+        db.pool.queries = 0
+        for n in range(args.users):
+            user_id = 3_000_000 + n
+            product_id = 1 + n * 7 % args.products
+            for step, raw in browse(user_id, product_id, LANGS[n % len(LANGS)]):
+                before = db.pool.queries
+                await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+                queries[step] = queries.get(step, 0) + db.pool.queries - before
+    finally:
+        await stop_services(runner)
+
+    ok = True
+    for step, count in queries.items():
+        print(f"{'ok  ' if not count else 'FAIL'} {step:<16} {count} SQL queries in {args.users} updates")
+        ok = ok and not count
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = asyncio.run(run(args, os.path.join(tmp, "catalog_queries.sqlite3")))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Проверка защиты от двойной отправки: один покупатель, много одинаковых апдейтов сразу.
+
+Апдейты идут через настоящий диспетчер (create_dispatcher: middleware отсева
+повторов, FSM в SQLite, пакетная запись заказов) во временный файл SQLite;
+Bot API — FakeSession с задержкой --rtt. Сценарии:
+
+  1. --copies одновременных нажатий "Купить" под одной карточкой, столько же
+     нажатий "Оформить" и столько же сообщений с адресом: ровно один заказ
+     на одну единицу, остаток уменьшился на одну;
+  2. та же карточка нажата еще раз после DEDUP_REPEAT_WINDOW — это уже новое
+     нажатие, а не повтор: в корзине две единицы;
+  3. --copies повторных доставок одного апдейта (одинаковый update_id)
+     обрабатываются один раз;
+  4. --copies одновременных order_writer.submit с одним ключом идемпотентности
+     (в обход middleware): один заказ, всем возвращается его id;
+  5. на шаге адреса кнопка и команда поиска, прочие команды и сообщения
+     из inline-режима не оформляют заказ — адресом становится только обычный текст;
+  6. в пачке с заказом, который не записывается (адрес не того типа), остальные
+     заказы пачки записываются, ошибку получает только он.
+
+При нарушении код возврата 1.
+
+Запуск из корня проекта: python -m scripts.check_double_submit [--copies 100 --rtt 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# Лимиты Bot API и фоновые сервисы в проверке не нужны; короткое окно повторов, чтобы сценарий 2 шел быстро
+os.environ.update(BOT_API_RATE="1000000", BOT_API_CHAT_RATE="1000000", BOT_API_CHAT_BURST="1000000",
+                  METRICS_PORT="0", PHOTO_WARMUP_CHAT_ID="0", ADMIN_IDS="", FSM_STORAGE="sqlite",
+                  DEDUP_REPEAT_WINDOW="0.3")
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+
+from core.app import create_dispatcher, start_services, stop_services
+from core.config import DEDUP_REPEAT_WINDOW
+from database import db
+from database.db import CartItem, Product
+from database.order_writer import order_writer
+from locales.manager import get_text
+from scripts.fakes import FakeSession, callback_update, make_bot, message_update
+from states.user_states import OrderState
+from utils.cart import cart_items
+from utils.metrics import metrics
+
+PRODUCT_ID, SIZE, STOCK = 1, "M", 1000
+
+
+async def user_orders(user_id: int):
+    """(число заказов, единиц в них) покупателя."""
+    async with db.pool.read() as conn:
+        async with conn.execute(
+            'SELECT COUNT(DISTINCT o.id), COALESCE(SUM(i.quantity), 0) FROM orders o '
+            'LEFT JOIN order_items i ON i.order_id = o.id WHERE o.user_id = ?', (user_id,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+async def free_stock() -> int:
+    return next(stock for product_id, _, size, stock, _ in await db.get_inventory()
+                if product_id == PRODUCT_ID and size == SIZE)
+
+
+async def run(args, path: str) -> bool:
+    bot = make_bot(FakeSession(latency=args.rtt / 1000))
+    dp = create_dispatcher(bot)
+    db.pool.path = path
+    await db.pool.open()
+    await db.init_db()
+    await db.upsert_products([Product(None, "Футболка", "Хлопок", 1500, "S, M, L", "none")])
+    await db.set_stock(PRODUCT_ID, SIZE, STOCK)
+    runner = await start_services(bot, primary=False, metrics_port=0)
+    ok = True
+
+    def check(condition: bool, message: str):
+        nonlocal ok
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        ok = ok and condition
+
+    async def burst(raw: dict, distinct: bool = True):
+        """copies копий апдейта одновременно; distinct — свои update_id и id нажатия, как у новых нажатий."""
+        updates = []
+        for n in range(args.copies):
+            copy = dict(raw)
+            if distinct:
+                copy["update_id"] = raw["update_id"] * 1000 + n
+                if "callback_query" in raw:
+                    copy["callback_query"] = {**raw["callback_query"], "id": f"{raw['callback_query']['id']}-{n}"}
+            updates.append(Update.model_validate(copy, context={"bot": bot}))
+        await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+
+    async def feed(raw: dict):
+        await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+
+    async def cart(user_id: int):
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        return cart_items(await dp.storage.get_data(key))
+
+    async def fsm_state(user_id: int):
+        return await dp.storage.get_state(StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id))
+
+    try:
+        # 1. Двойные (стократные) нажатия по всей воронке
+        user_id = 2_000_001
+        stock_before = await free_stock()
+        card = callback_update(user_id, f"size_{PRODUCT_ID}_{SIZE}")
+        message_id = card["callback_query"]["message"]["message_id"]
+        await burst(callback_update(user_id, f"buy_{PRODUCT_ID}_{SIZE}", message_id=message_id))
+        units = sum(item.quantity for item in await cart(user_id))
+        check(units == 1, f"{args.copies} taps on 'buy': {units} unit(s) in cart")
+        await burst(callback_update(user_id, "cart_checkout"))
+        await burst(message_update(user_id, "ул. Тестовая, 1"))
+        orders, units = await user_orders(user_id)
+        check((orders, units) == (1, 1), f"{args.copies} checkouts and addresses: {orders} order(s), {units} unit(s)")
+        stock_after = await free_stock()
+        check(stock_before - stock_after == 1, f"stock {stock_before} -> {stock_after}")
+
+        # 2. Повторное нажатие после окна повторов — новая покупка
+        user_id = 2_000_002
+        buy = callback_update(user_id, f"buy_{PRODUCT_ID}_{SIZE}")
+        message_id = buy["callback_query"]["message"]["message_id"]
+        await burst(buy)
+        await asyncio.sleep(DEDUP_REPEAT_WINDOW * 1.5)
+        await burst(callback_update(user_id, f"buy_{PRODUCT_ID}_{SIZE}", message_id=message_id))
+        units = sum(item.quantity for item in await cart(user_id))
+        check(units == 2, f"two bursts {DEDUP_REPEAT_WINDOW * 1.5:.2f}s apart: {units} unit(s) in cart")
+
+        # 3. Повторная доставка одного и того же апдейта
+        handled = sum(stats.wall.count for stats in metrics.handlers.values())
+        await burst(message_update(2_000_003, "/start"), distinct=False)
+        handled = sum(stats.wall.count for stats in metrics.handlers.values()) - handled
+        check(handled == 1, f"{args.copies} deliveries of one update_id: handled {handled} time(s)")
+
+        # 4. Ключ идемпотентности в самой записи заказа
+        user_id = 2_000_004
+        item = CartItem(PRODUCT_ID, SIZE, 1)
+        placed = await asyncio.gather(*(
+            order_writer.submit(user_id, "buyer", "ул. Тестовая, 4", [item], "same-key") for _ in range(args.copies)
+        ))
+        orders, units = await user_orders(user_id)
+        ids = {order.order_id for order in placed}
+        check((orders, units) == (1, 1) and len(ids) == 1,
+              f"{args.copies} submits with one key: {orders} order(s), ids returned {sorted(ids)}")
+        again = await order_writer.submit(user_id, "buyer", "ул. Тестовая, 4", [item], "same-key")
+        check(again.order_id in ids, f"resubmit after commit returns order {again.order_id}")
+
+        # 5. Поиск, команды и inline-результаты на шаге адреса
+        user_id = 2_000_005
+        await feed(callback_update(user_id, f"buy_{PRODUCT_ID}_{SIZE}"))
+        await feed(callback_update(user_id, "cart_checkout"))
+        inline_result = message_update(user_id, "Футболка — 1500 ₽")
+        inline_result["message"]["via_bot"] = {"id": bot.id, "is_bot": True, "first_name": "Clothify"}
+        for label, raw in (("/unknown", message_update(user_id, "/unknown")),
+                           ("inline result", inline_result),
+                           ("/search", message_update(user_id, "/search"))):
+            await feed(raw)
+            orders, _ = await user_orders(user_id)
+            check(orders == 0, f"{label} at the address step: {orders} order(s)")
+        await feed(callback_update(user_id, "cart_checkout"))
+        await feed(message_update(user_id, get_text("search", "ru")))
+        orders, _ = await user_orders(user_id)
+        state = await fsm_state(user_id)
+        check(orders == 0 and state != OrderState.waiting_for_address.state,
+              f"search button at the address step: {orders} order(s), state {state}")
+        await feed(callback_update(user_id, "cart_checkout"))
+        await feed(message_update(user_id, "ул. Тестовая, 5"))
+        async with db.pool.read() as conn:
+            async with conn.execute('SELECT address FROM orders WHERE user_id = ?', (user_id,)) as cursor:
+                addresses = [row[0] for row in await cursor.fetchall()]
+        check(addresses == ["ул. Тестовая, 5"], f"address after the detours: {addresses}")
+
+        # 6. Один сломанный заказ в пачке
+        users = range(2_000_100, 2_000_110)
+        bad_user = users[3]
+        results = await asyncio.gather(*(
+            order_writer.submit(uid, "buyer", {"bad": "address"} if uid == bad_user else "ул. Тестовая, 6", [item])
+            for uid in users
+        ), return_exceptions=True)
+        failed = [uid for uid, result in zip(users, results) if isinstance(result, Exception)]
+        written = [uid for uid in users if (await user_orders(uid))[0] == 1]
+        check(failed == [bad_user] and written == [uid for uid in users if uid != bad_user],
+              f"batch with one bad order: failed {failed}, written {len(written)} of {len(users) - 1}")
+    finally:
+        await stop_services(runner)
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=100, help="одинаковых апдейтов в каждой пачке")
+    parser.add_argument("--rtt", type=float, default=20, help="имитация задержки Bot API, мс")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = asyncio.run(run(args, os.path.join(tmp, "double_submit.sqlite3")))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
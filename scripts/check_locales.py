@@ -0,0 +1,41 @@
+"""Проверка каталогов: в каждом языке есть все ключи языка по умолчанию,
+нет лишних ключей, а параметры ({order_id} и т.п.) совпадают.
+
+Запуск из корня проекта: python -m scripts.check_locales (код возврата 1 при ошибках)
+"""
+import string
+import sys
+
+from locales.manager import compile_template, locales
+
+
+def fields(text: str) -> set:
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+
+def main() -> int:
+    reference = locales._raw(locales.default)
+    errors = []
+    for lang in sorted(locales.available()):
+        texts = locales._raw(lang)
+        for key in reference.keys() - texts.keys():
+            errors.append(f"{lang}: missing key '{key}'")
+        for key in texts.keys() - reference.keys():
+            errors.append(f"{lang}: unknown key '{key}'")
+        for key in reference.keys() & texts.keys():
+            if fields(texts[key]) != fields(reference[key]):
+                errors.append(f"{lang}: '{key}' has parameters {sorted(fields(texts[key]))}, "
+                              f"expected {sorted(fields(reference[key]))}")
+            try:
+                compile_template(texts[key])
+            except ValueError as e:
+                errors.append(f"{lang}: '{key}' does not compile: {e}")
+        print(f"{lang}: {len(texts)} keys")
+    for error in errors:
+        print(error)
+    print("OK" if not errors else f"FAIL ({len(errors)} errors)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Бюджет холодного старта: импорт модулей и время до готовности бота.
+
+Каждый замер — в отдельном процессе, как при настоящем деплое:
+
+  imports — python -X importtime -c "import main": полное время импорта,
+            из него aiogram и собственные модули бота (их self-время — то,
+            что зависит от этого репозитория);
+  ready   — настоящий старт (core.app.start_bot) с заглушкой Bot API
+            (задержка --rtt) и базой с --products товарами, созданной
+            заранее: от первого импорта до момента, когда бот готов принимать
+            апдейты, по фазам из utils/startup.py. Прогрев кэшей при
+            FAST_START=1 идет в фоне и показан отдельно.
+
+Без ADMIN_IDS админ-роутер не должен импортироваться вовсе. Бюджеты —
+--budget (ready) и --own-budget (self-время своих модулей), в миллисекундах,
+лучший из --repeat запусков; при превышении код возврата 1.
+
+Запуск из корня проекта: python -m scripts.check_startup [--budget 8000 --own-budget 150 --rtt 100]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Пакеты бота (верхний уровень имени модуля)
+OWN_PACKAGES = {"main", "core", "database", "filters", "handlers", "keyboards", "locales", "middlewares",
+                "states", "utils"}
+DEFERRED = ("handlers.admin_handlers",)
+
+
+def child_env(db_path: str) -> dict:
+    env = dict(os.environ)
+    env.update(DB_PATH=db_path, ADMIN_IDS="", METRICS_PORT="0", PHOTO_WARMUP_CHAT_ID="0", WORKERS="1",
+               BOT_MODE="polling", FSM_STORAGE="sqlite")
+    return env
+
+
+def import_times(env: dict) -> dict:
+    """Разбор вывода -X importtime: время импорта main, aiogram и self-время своих модулей (мс)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:       509 |      33193 |     importlib.resources._common"
+        self_us, cumulative_us, name = line.split("|")
+        modules[name.strip()] = (int(self_us.split(":")[1]), int(cumulative_us))
+    own = {name: us for name, (us, _) in modules.items() if name.split(".")[0] in OWN_PACKAGES}
+    return {
+        "total_ms": modules["main"][1] / 1000,
+        "aiogram_ms": modules.get("aiogram", (0, 0))[1] / 1000,
+        "own_ms": sum(own.values()) / 1000,
+        "own_top": sorted(((name, us / 1000) for name, us in own.items()), key=lambda item: -item[1])[:5],
+        "deferred_imported": [name for name in DEFERRED if name in modules],
+    }
+
+
+def start_once(env: dict, rtt: float) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "scripts.check_startup", "--child", "--rtt", str(rtt)], env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"startup failed:\n{result.stderr}")
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["process_ms"] = (time.perf_counter() - start) * 1000
+    return report
+
+
+async def child(rtt: float):
+    """Процесс-замер: импорт бота и старт до готовности."""
+    from utils.startup import startup
+    import main  # noqa: F401 — все модули бота, фаза imports
+
+    from core.app import create_dispatcher, start_bot, stop_services
+    from database.catalog import catalog
+    from scripts.fakes import FakeSession, make_bot
+
+    bot = make_bot(FakeSession(latency=rtt / 1000))
+    create_dispatcher(bot)
+    startup.mark("dispatcher")
+    metrics_runner, _ = await start_bot(bot)
+    # Фоновый прогрев (FAST_START=1) идет после готовности: ждем его, чтобы показать в отчете
+    while not catalog.loaded:
+        await asyncio.sleep(0.005)
+    warm_ms = (time.perf_counter() - startup.started) * 1000
+    await stop_services(metrics_runner)
+    print(json.dumps({
+        "ready_ms": startup.ready_at * 1000, "warm_ms": warm_ms, "report": startup.report(),
+        "deferred_imported": [name for name in DEFERRED if name in sys.modules],
+    }))
+
+
+async def prepare(products: int):
+    """База для замера: схема последней версии и товары (как у бота, который уже работал)."""
+    from database import db
+    from database.db import Product
+
+    await db.pool.open()
+    try:
+        await db.init_db()
+        await db.upsert_products([
+            Product(None, f"Товар {i}", f"Описание товара {i}", 1000 + i, "S, M, L", "none")
+            for i in range(1, products + 1)
+        ])
+    finally:
+        await db.pool.close()
+
+
+def main(args) -> int:
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(os.path.join(tmp, "startup.sqlite3"))
+        subprocess.run([sys.executable, "-m", "scripts.check_startup", "--prepare", "--products", str(args.products)],
+                       env=env, check=True)
+
+        imports = min((import_times(env) for _ in range(args.repeat)), key=lambda r: r["total_ms"])
+        print(f"import main: {imports['total_ms']:.0f} ms (aiogram {imports['aiogram_ms']:.0f} ms, "
+              f"own modules {imports['own_ms']:.0f} ms self, budget {args.own_budget:.0f} ms)")
+        print("  heaviest own: " + ", ".join(f"{name} {ms:.1f}" for name, ms in imports["own_top"]))
+
+        runs = [start_once(env, args.rtt) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["ready_ms"])
+        print(f"\nstartup with Bot API RTT {args.rtt:.0f} ms, {args.products} products "
+              f"(best of {args.repeat}, FAST_START={os.getenv('FAST_START', '1')}):")
+        print(best["report"])
+        print(f"caches warm at {best['warm_ms']:.0f} ms, process exited at {best['process_ms']:.0f} ms")
+
+    deferred = sorted(set(imports["deferred_imported"]) | set(best["deferred_imported"]))
+    if deferred:
+        print(f"FAIL: imported at startup without ADMIN_IDS: {', '.join(deferred)}")
+        ok = False
+    if imports["own_ms"] > args.own_budget:
+        print(f"FAIL: own modules import in {imports['own_ms']:.0f} ms > {args.own_budget:.0f} ms")
+        ok = False
+    if best["ready_ms"] > args.budget:
+        print(f"FAIL: ready in {best['ready_ms']:.0f} ms > {args.budget:.0f} ms")
+        ok = False
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=8000, help="до готовности, мс")
+    parser.add_argument("--own-budget", type=float, default=150, help="self-время импорта своих модулей, мс")
+    parser.add_argument("--rtt", type=float, default=100, help="имитация задержки Bot API, мс")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.prepare:
+        asyncio.run(prepare(args.products))
+    elif args.child:
+        asyncio.run(child(args.rtt))
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,156 @@
+"""Локальный сервер Bot API для нагрузочных проверок исходящего трафика.
+
+Отвечает на методы отправки правдоподобными объектами и, как Telegram,
+отдает 429 с retry_after, если превышен лимит на весь бот или на чат.
+Ведет журнал принятых запросов, чтобы бенчмарки могли проверить порядок и
+частоту доставки.
+
+Использование: async with FakeBotAPI(global_rate=30) as api: ... api.url
+Отдельным процессом: python -m scripts.fake_bot_api --port 8081 (счетчики — GET /stats)
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from scripts.fakes import FAKE_TOKEN
+from utils.rate_limiter import TokenBucket
+
+MESSAGE_METHODS = {"sendmessage", "sendphoto", "senddocument", "copymessage", "forwardmessage"}
+EDIT_METHODS = {"editmessagetext", "editmessagecaption", "editmessagemedia", "editmessagereplymarkup"}
+
+
+class FakeBotAPI:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 blocked_every: int = 0, host: str = "127.0.0.1", port: int = 0):
+        # global_rate=0 — без лимитов; blocked_every=N — каждый N-й чат "заблокировал бота" (403)
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.blocked_every = blocked_every
+        self.host = host
+        self.port = port
+        self.url = ""
+        self.calls: Counter = Counter()
+        self.rejected: Counter = Counter()
+        # Принятые запросы: (monotonic-время, метод, chat_id, text)
+        self.log: List[Tuple[float, str, Optional[str], Optional[str]]] = []
+        self.keep_log = True
+        # Чаты, получившие хотя бы одно сообщение, и повторные доставки в них
+        self.recipients = set()
+        self.duplicates = 0
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    def reset(self):
+        self.calls.clear()
+        self.rejected.clear()
+        self.log.clear()
+        self.recipients.clear()
+        self.duplicates = 0
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats.clear()
+
+    def _limit(self, chat_id: str, now: float) -> float:
+        """0, если запрос укладывается в лимиты, иначе через сколько секунд можно повторить."""
+        chat = self._chats.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        wait = max(self._global.delay(now), chat.delay(now))
+        if wait == 0:
+            self._global.tokens -= 1
+            chat.tokens -= 1
+        return wait
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = await request.post()
+        chat_id = data.get("chat_id")
+        self.calls[method] += 1
+        now = time.monotonic()
+        if self.blocked_every and chat_id is not None and int(chat_id) % self.blocked_every == 0:
+            self.rejected[method] += 1
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"}, status=403)
+        limited = method in MESSAGE_METHODS or method in EDIT_METHODS or method == "deletemessage"
+        if self.global_rate and chat_id is not None and limited:
+            wait = self._limit(chat_id, now)
+            if wait:
+                self.rejected[method] += 1
+                retry_after = max(1, math.ceil(wait))
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }, status=429)
+        if self.keep_log:
+            self.log.append((now, method, chat_id, data.get("text")))
+        if method in MESSAGE_METHODS:
+            if chat_id in self.recipients:
+                self.duplicates += 1
+            self.recipients.add(chat_id)
+        return web.json_response({"ok": True, "result": self._result(method, chat_id, data)})
+
+    def _result(self, method: str, chat_id: Optional[str], data) -> object:
+        if method == "getme":
+            return {"id": 123456, "is_bot": True, "first_name": "Clothify", "username": "clothify_fake_bot"}
+        if method in MESSAGE_METHODS:
+            return {
+                "message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"}, "text": data.get("text"),
+            }
+        return True
+
+    def make_bot(self) -> Bot:
+        return Bot(FAKE_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(self.url)))
+
+    async def __aenter__(self) -> "FakeBotAPI":
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self.host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": dict(self.calls), "rejected": dict(self.rejected),
+            "recipients": len(self.recipients), "duplicates": self.duplicates,
+        })
+
+
+async def serve(args):
+    api = FakeBotAPI(global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=args.chat_burst,
+                     blocked_every=args.blocked_every, port=args.port)
+    api.keep_log = False
+    async with api:
+        print(f"fake Bot API listening on {api.url}", flush=True)
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--chat-burst", type=float, default=3)
+    parser.add_argument("--blocked-every", type=int, default=0)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,133 @@
+"""Заглушки Bot API для локальных бенчмарков: бот работает без сети и без настоящего токена."""
+import asyncio
+import itertools
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates, SendDocument, SendPhoto, TelegramMethod
+from aiogram.types import Chat, FSInputFile, Message, PhotoSize, Update, User
+
+FAKE_TOKEN = "123456:FAKE-TOKEN-FOR-BENCHMARKS"
+
+_message_ids = itertools.count(1)
+_update_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая записывает вызовы Bot API и отвечает правдоподобными объектами.
+
+    latency — имитация сетевой задержки на каждый запрос (секунды),
+    upload_rate — пропускная способность канала для загрузки файлов (байт/с, 0 — без ограничения).
+    Если передан updates (asyncio.Queue), getUpdates отдает апдейты из очереди,
+    что позволяет гонять обычный long polling локально.
+    """
+
+    def __init__(self, latency: float = 0.0, updates: Optional[asyncio.Queue] = None, upload_rate: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.updates = updates
+        self.upload_rate = upload_rate
+        self.calls: Counter = Counter()
+        self.bytes_uploaded = 0
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, GetUpdates):
+            return await self._get_updates(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendPhoto) and isinstance(method.photo, FSInputFile):
+            size = os.path.getsize(method.photo.path)
+            self.bytes_uploaded += size
+            if self.upload_rate:
+                await asyncio.sleep(size / self.upload_rate)
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="Clothify", username="clothify_bench_bot")
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            chat_id = 1
+        if isinstance(method, SendPhoto):
+            message_id = next(_message_ids)
+            return Message(
+                message_id=message_id, date=datetime.now(), chat=Chat(id=chat_id, type="private"),
+                photo=[PhotoSize(file_id=f"photo-{message_id}", file_unique_id=f"u{message_id}", width=800, height=800)],
+            )
+        if isinstance(method, SendDocument) or type(method).__name__ in ("SendMessage", "EditMessageText", "EditMessageCaption"):
+            return Message(
+                message_id=getattr(method, "message_id", None) or next(_message_ids), date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"), text=getattr(method, "text", None),
+            )
+        return True
+
+    async def _get_updates(self, method: GetUpdates) -> List[Update]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.updates is None:
+            await asyncio.sleep(method.timeout or 0)
+            return []
+        batch = [await self.updates.get()]
+        while len(batch) < (method.limit or 100) and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+
+def make_bot(session: FakeSession) -> Bot:
+    return Bot(FAKE_TOKEN, session=session)
+
+
+def _user(user_id: int, lang: str) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+            "username": f"user{user_id}", "language_code": lang}
+
+
+def message_update(user_id: int, text: str, lang: str = "ru") -> Dict[str, Any]:
+    """Сырой апдейт с текстовым сообщением (в том виде, в каком его шлет Telegram)."""
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids), "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"}, "from": _user(user_id, lang), "text": text,
+        },
+    }
+
+
+def callback_update(user_id: int, data: str, lang: str = "ru", photo: bool = False,
+                    message_id: Optional[int] = None) -> Dict[str, Any]:
+    """Сырой апдейт с нажатием inline-кнопки под сообщением бота (message_id — то же сообщение для повторных нажатий)."""
+    message = {
+        "message_id": message_id or next(_message_ids), "date": int(datetime.now().timestamp()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": 123456, "is_bot": True, "first_name": "Clothify"},
+    }
+    if photo:
+        message["photo"] = [{"file_id": "photo", "file_unique_id": "photo", "width": 800, "height": 800}]
+        message["caption"] = "card"
+    else:
+        message["text"] = "card"
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)), "from": _user(user_id, lang), "chat_instance": str(user_id),
+            "message": message, "data": data,
+        },
+    }
+
+
+def browse_updates(user_id: int, product_id: int = 1, size: str = "M") -> List[Dict[str, Any]]:
+    """Просмотр каталога одним пользователем: каталог -> товар -> размер."""
+    return [
+        message_update(user_id, "🛍 Каталог"),
+        callback_update(user_id, f"prod_{product_id}"),
+        callback_update(user_id, f"size_{product_id}_{size}", photo=True),
+    ]
@@ -0,0 +1,154 @@
+"""Локальный генератор нагрузки: long polling против webhook без доступа к сети.
+
+В режиме webhook синтетические апдейты отправляются POST-запросами в настоящий
+aiohttp-сервер (utils/webhook.py) на localhost. В режиме polling те же апдейты
+отдаются через getUpdates фейковой сессии. Bot API в обоих случаях — заглушка
+с имитацией сетевой задержки (--rtt), задержка апдейта считается от отправки
+до конца обработки.
+
+Апдейты подаются с постоянной частотой (--rate, апдейтов в секунду);
+--rate 0 отправляет все сразу, чтобы померить предельную пропускную способность.
+
+Запуск из корня проекта: python -m scripts.load_webhook --users 1000 --rtt 20 --rate 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import aiohttp
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+from aiohttp import web
+
+from database import db
+from database.catalog import catalog
+from handlers.admin_handlers import router as admin_router
+from handlers.user_handlers import router as user_router
+from scripts.fakes import FakeSession, browse_updates, make_bot
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "bench-secret"
+
+
+async def paced(updates: List[dict], rate: float):
+    """Выдает апдейты с заданной частотой (rate = 0 — без пауз)."""
+    start = time.perf_counter()
+    for i, raw in enumerate(updates):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield raw
+
+
+class Tracker:
+    """Фиксирует момент окончания обработки каждого апдейта."""
+
+    def __init__(self, expected: int):
+        self.sent: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.expected = expected
+        self.done = asyncio.Event()
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            self.latencies.append(time.perf_counter() - self.sent[event.update_id])
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+
+def build_dispatcher(tracker: Tracker) -> Dispatcher:
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(tracker)
+    # Роутеры — модульные синглтоны, поэтому на каждый прогон отвязываем их от прошлого диспетчера
+    for router in (admin_router, user_router):
+        router._parent_router = None
+    dp.include_router(admin_router)
+    dp.include_router(user_router)
+    return dp
+
+
+async def run_webhook(updates: List[dict], rtt: float, concurrency: int, rate: float) -> Tracker:
+    tracker = Tracker(len(updates))
+    bot = make_bot(FakeSession(latency=rtt))
+    server = WebhookServer(build_dispatcher(tracker), bot, secret=SECRET,
+                           max_concurrency=concurrency, max_pending=len(updates))
+    runner = web.AppRunner(server.build_app("/webhook"))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    url = f"http://127.0.0.1:{port}/webhook"
+    limit = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: SECRET}) as http:
+        async def post(raw: dict):
+            async with limit:
+                async with http.post(url, json=raw) as response:
+                    assert response.status == 200, response.status
+
+        requests = []
+        async for raw in paced(updates, rate):
+            tracker.sent[raw["update_id"]] = time.perf_counter()
+            requests.append(asyncio.create_task(post(raw)))
+        await asyncio.gather(*requests)
+        await tracker.done.wait()
+    await server.drain()
+    await runner.cleanup()
+    return tracker
+
+
+async def run_polling(updates: List[dict], rtt: float, concurrency: int, rate: float) -> Tracker:
+    tracker = Tracker(len(updates))
+    queue: asyncio.Queue = asyncio.Queue()
+    bot = make_bot(FakeSession(latency=rtt, updates=queue))
+    dp = build_dispatcher(tracker)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False,
+                                                   tasks_concurrency_limit=concurrency))
+    async for raw in paced(updates, rate):
+        tracker.sent[raw["update_id"]] = time.perf_counter()
+        queue.put_nowait(Update.model_validate(raw, context={"bot": bot}))
+    await tracker.done.wait()
+    await dp.stop_polling()
+    await polling
+    return tracker
+
+
+def report(label: str, tracker: Tracker, elapsed: float):
+    latencies = sorted(tracker.latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:>8}: {len(latencies) / elapsed:8.0f} updates/s | p50 {p50 * 1000:7.1f} ms | p99 {p99 * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rtt", type=float, default=20, help="имитация задержки Bot API, мс")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=500, help="апдейтов в секунду, 0 — все сразу")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool.path = os.path.join(tmp, "bench.sqlite3")
+        await db.pool.open()
+        try:
+            await db.init_db(seed_data=True)
+            await catalog.load()
+            for label, runner in (("polling", run_polling), ("webhook", run_webhook)):
+                updates = [raw for user_id in range(1, args.users + 1) for raw in browse_updates(10_000 + user_id)]
+                start = time.perf_counter()
+                tracker = await runner(updates, args.rtt / 1000, args.concurrency, args.rate)
+                report(label, tracker, time.perf_counter() - start)
+        finally:
+            await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
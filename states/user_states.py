@@ -10,3 +10,7 @@ class AdminState(StatesGroup):
     waiting_for_price = State()
     waiting_for_sizes = State()
     waiting_for_photo = State()
+    waiting_for_import = State()
+
+class SearchState(StatesGroup):
+    waiting_for_query = State()
@@ -0,0 +1,156 @@
+"""Рассылки по всем пользователям и уведомления покупателям.
+
+Задание рассылки хранится в таблице broadcasts. Фоновая задача берет
+незавершенные задания по очереди, читает получателей из users пачками по
+возрастанию id и отправляет сообщения несколькими воркерами с ограничением
+скорости. После каждой пачки в задание записываются счетчики и id последнего
+обработанного пользователя, поэтому после падения рассылка продолжается с этого
+места (повторно может уйти не больше одной пачки).
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+
+from core.config import BROADCAST_CHUNK, BROADCAST_RATE, BROADCAST_WORKERS
+from database.db import (
+    Broadcast, create_broadcast, get_unfinished_broadcasts, get_user_ids,
+    save_broadcast_progress, set_broadcast_status,
+)
+from utils.metrics import detach
+from utils.rate_limiter import LANE_BULK, TokenBucket, sending_lane
+
+
+class Broadcaster:
+    def __init__(self, rate: float = BROADCAST_RATE, workers: int = BROADCAST_WORKERS, chunk_size: int = BROADCAST_CHUNK):
+        # rate — сообщений в секунду (0 — без ограничения), запас под ответы покупателям остается
+        self.rate = rate
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._cancelled: Set[int] = set()
+        self._notifications: Set[asyncio.Task] = set()
+        self.counters: Counter = Counter()
+
+    def start(self, bot: Bot):
+        """Запускает обработку очереди, включая задания, прерванные прошлым запуском."""
+        self._bot = bot
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, text: str) -> int:
+        broadcast_id = await create_broadcast(text)
+        self._wakeup.set()
+        return broadcast_id
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        self._cancelled.add(broadcast_id)
+        return await set_broadcast_status(broadcast_id, "cancelled")
+
+    async def close(self, timeout: float = 10):
+        """Останавливает рассылку после текущих отправок и сохраняет прогресс."""
+        self._stopping = True
+        self._wakeup.set()
+        tasks = list(self._notifications) + ([self._task] if self._task else [])
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._task = None
+
+    def notify(self, bot: Bot, chat_id: int, text: str):
+        """Отправляет уведомление в фоне, не задерживая обработчик."""
+        task = asyncio.create_task(self._notify(bot, chat_id, text))
+        self._notifications.add(task)
+        task.add_done_callback(self._notifications.discard)
+
+    async def _notify(self, bot: Bot, chat_id: int, text: str):
+        # Обработчик не ждет уведомление, его время не относится к апдейту
+        detach()
+        try:
+            await bot.send_message(chat_id, text, parse_mode="HTML")
+            self.counters["notified"] += 1
+        except TelegramAPIError as e:
+            self.counters["notify_failed"] += 1
+            logging.warning(f"Notification to {chat_id} failed: {e}")
+
+    async def _run(self):
+        detach()
+        # Рассылка идет в самой низкой очереди планировщика запросов
+        with sending_lane(LANE_BULK):
+            while not self._stopping:
+                jobs = await get_unfinished_broadcasts()
+                if not jobs:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                try:
+                    await self._deliver(jobs[0])
+                except Exception as e:
+                    # Задание остается running и продолжится со следующего запуска
+                    logging.error(f"Broadcast #{jobs[0].id} interrupted: {e}")
+                    await asyncio.sleep(5)
+
+    def _stopped(self, job: Broadcast) -> bool:
+        return self._stopping or job.id in self._cancelled
+
+    async def _deliver(self, job: Broadcast):
+        await set_broadcast_status(job.id, "running")
+        logging.info(f"Broadcast #{job.id} {'resumed after user ' + str(job.last_user_id) if job.last_user_id else 'started'}")
+        bucket = TokenBucket(self.rate, self.rate) if self.rate else None
+        chunk = await get_user_ids(job.last_user_id, self.chunk_size)
+        while chunk and not self._stopped(job):
+            # Следующая пачка читается, пока отправляется текущая
+            prefetch = asyncio.create_task(get_user_ids(chunk[-1], self.chunk_size))
+            last_id, outcomes = await self._send_chunk(job, chunk, bucket)
+            if last_id:
+                await save_broadcast_progress(job.id, last_id, outcomes["sent"], outcomes["failed"], outcomes["blocked"])
+            chunk = await prefetch
+        if not self._stopped(job):
+            await set_broadcast_status(job.id, "done")
+            logging.info(f"Broadcast #{job.id} finished")
+
+    async def _send_chunk(self, job: Broadcast, chunk: List[int], bucket: Optional[TokenBucket]) -> Tuple[int, Counter]:
+        """Отправляет пачку. Возвращает id последнего обработанного получателя (0 — ни одного) и итоги."""
+        recipients = iter(chunk)
+        last_id = 0
+        outcomes: Counter = Counter()
+
+        async def worker():
+            nonlocal last_id
+            # Воркеры берут получателей из одного итератора по порядку, поэтому
+            # при остановке обработанные получатели образуют начало пачки
+            for user_id in recipients:
+                if self._stopped(job):
+                    return
+                last_id = user_id
+                if bucket:
+                    wait = bucket.reserve(time.monotonic())
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                outcomes[await self._send(job.text, user_id)] += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+        self.counters.update(outcomes)
+        return last_id, outcomes
+
+    async def _send(self, text: str, user_id: int) -> str:
+        try:
+            await self._bot.send_message(user_id, text, parse_mode="HTML")
+            return "sent"
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота
+            return "blocked"
+        except TelegramAPIError as e:
+            logging.debug(f"Broadcast message to {user_id} failed: {e}")
+            return "failed"
+
+
+broadcaster = Broadcaster()
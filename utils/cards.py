@@ -0,0 +1,72 @@
+"""Готовые карточки товаров: подпись и клавиатура.
+
+Карточка зависит только от товара, языка и выбранного размера, поэтому
+текст (шаблон локали с подстановкой) и клавиатура собираются один раз и
+дальше отдаются из LRU-кэша. Кэш сбрасывается при смене версии каталога,
+как и кэш клавиатур (keyboards/user_kbs.py).
+"""
+import html
+from typing import NamedTuple, Optional
+
+from aiogram.types import InlineKeyboardMarkup
+
+from database.catalog import catalog
+from database.db import Product
+from keyboards.user_kbs import KeyboardCache, build_buy_kb, build_product_sizes_kb
+from locales.manager import get_text
+
+# Карточек в памяти: товар × язык × (без размера + каждый размер)
+CARD_CACHE_SIZE = 8192
+
+
+class ProductCard(NamedTuple):
+    """Карточка товара: текст (HTML), клавиатура и фото, если оно есть."""
+    text: str
+    reply_markup: InlineKeyboardMarkup
+    photo_id: Optional[str]
+
+
+def build_card(product: Product, lang: str, size: Optional[str] = None) -> ProductCard:
+    """Карточка с выбором размера (size=None) или с выбранным размером и кнопкой покупки."""
+    name, description = html.escape(product.name), html.escape(product.description or "")
+    if size is None:
+        text = get_text("product_card", lang, name=name, description=description, price=product.price)
+        kb = build_product_sizes_kb(product.id, product.sizes, lang)
+    else:
+        text = get_text("product_card_size", lang, name=name, description=description,
+                        price=product.price, size=size)
+        kb = build_buy_kb(product.id, size, lang)
+    return ProductCard(text, kb, product.photo_id if product.has_photo else None)
+
+
+class CardRenderer:
+    """Карточки товаров из кэша; товар читается из каталога только при промахе."""
+
+    def __init__(self, maxsize: int = CARD_CACHE_SIZE):
+        self._cache = KeyboardCache(maxsize)
+
+    def card(self, product: Product, lang: str, size: Optional[str] = None) -> ProductCard:
+        key = (product.id, lang, size)
+        card = self._cache.get(key)
+        if card is None:
+            card = self._cache.put(key, build_card(product, lang, size))
+        return card
+
+    async def render(self, product_id: int, lang: str, size: Optional[str] = None) -> Optional[ProductCard]:
+        """Карточка товара по id; None — товара нет."""
+        card = self._cache.get((product_id, lang, size))
+        if card is not None:
+            return card
+        product = await catalog.get_product(product_id)
+        if product is None:
+            return None
+        return self._cache.put((product_id, lang, size), build_card(product, lang, size))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._cache), "hits": self._cache.hits, "misses": self._cache.misses}
+
+
+cards = CardRenderer()
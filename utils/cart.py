@@ -0,0 +1,75 @@
+"""Корзина покупателя в данных FSM.
+
+Строки корзины лежат в данных состояния чата под ключом "cart" списком
+[product_id, size, quantity, [id броней]]: хранилище FSM и так сохраняет
+данные чата между апдейтами (и процессами-воркерами), а каждая добавленная
+единица сразу бронируется (database/inventory.py), поэтому отдельная таблица
+корзин не нужна. Оформление пишет всю корзину одним заказом (db.create_orders).
+"""
+from typing import List, Optional
+
+from aiogram.fsm.context import FSMContext
+
+from database.db import CartItem, release_reservations, reserve_stock
+
+CART_KEY = "cart"
+# Не больше стольких единиц в одной корзине: каждая держит бронь на складе
+CART_MAX_UNITS = 20
+
+
+def cart_items(data: dict) -> List[CartItem]:
+    rows = data.get(CART_KEY)
+    if rows is None and data.get("product_id") is not None:
+        # Покупка, начатая до появления корзины: товар из кнопки "Купить" со своей бронью
+        reservation_id = data.get("reservation_id")
+        return [CartItem(data["product_id"], data["size"], 1, (reservation_id,) if reservation_id else ())]
+    return [CartItem(product_id, size, quantity, tuple(reservations))
+            for product_id, size, quantity, reservations in rows or ()]
+
+
+def cart_units(items: List[CartItem]) -> int:
+    return sum(item.quantity for item in items)
+
+
+async def get_cart(state: FSMContext) -> List[CartItem]:
+    return cart_items(await state.get_data())
+
+
+async def _save(state: FSMContext, items: List[CartItem]):
+    await state.update_data({CART_KEY: [[item.product_id, item.size, item.quantity, list(item.reservations)]
+                                        for item in items]})
+
+
+async def add_to_cart(state: FSMContext, user_id: int, product_id: int, size: str) -> Optional[List[CartItem]]:
+    """Бронирует единицу размера и добавляет ее в корзину. None — размер закончился."""
+    reservation_id = await reserve_stock(user_id, product_id, size)
+    if reservation_id is None:
+        return None
+    items = await get_cart(state)
+    reservations = (reservation_id,) if reservation_id else ()
+    for i, item in enumerate(items):
+        if (item.product_id, item.size) == (product_id, size):
+            items[i] = item._replace(quantity=item.quantity + 1, reservations=item.reservations + reservations)
+            break
+    else:
+        items.append(CartItem(product_id, size, 1, reservations))
+    await _save(state, items)
+    return items
+
+
+async def remove_line(state: FSMContext, product_id: int, size: str) -> List[CartItem]:
+    """Убирает строку корзины (товар и размер) и отпускает ее брони; строки уже нет — корзина не меняется."""
+    items = await get_cart(state)
+    for i, item in enumerate(items):
+        if (item.product_id, item.size) == (product_id, size):
+            await release_reservations(items.pop(i).reservations)
+            await _save(state, items)
+            break
+    return items
+
+
+async def clear_cart(state: FSMContext):
+    """Очищает корзину и отпускает все ее брони."""
+    items = await get_cart(state)
+    await release_reservations([r for item in items for r in item.reservations])
+    await _save(state, [])
@@ -0,0 +1,228 @@
+"""Массовый импорт и экспорт каталога в CSV и JSONL.
+
+Файл читается построчно: каждая строка проверяется и превращается в
+Product, пачки по IMPORT_CHUNK товаров пишутся одной транзакцией
+(db.upsert_products, executemany). В памяти одновременно только одна пачка,
+поэтому расход памяти не зависит от размера файла. Чтение и разбор идут в
+потоке (asyncio.to_thread), event loop в это время отвечает покупателям.
+
+Колонки: id, name, description, price, sizes, photo_id. Товар с id
+обновляется (или создается с этим id), без id — добавляется новым; экспорт
+пишет id, поэтому выгруженный файл можно поправить и загрузить обратно.
+В JSONL sizes может быть списком. Файл в UTF-8 (с BOM или без); CSV из
+русского Excel, сохраненный в cp1251, распознается по началу файла.
+"""
+import asyncio
+import codecs
+import csv
+import json
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.config import IMPORT_CHUNK
+from database.db import Product, iter_products, upsert_products
+
+FIELDS = ("id", "name", "description", "price", "sizes", "photo_id")
+FORMATS = ("csv", "jsonl")
+# Размер уходит в callback_data (size_<id>_<размер>, не длиннее 64 байт) и делится по "_"
+MAX_SIZE_LENGTH = 32
+# Сколько ошибок хранится для отчета (остальные только считаются)
+MAX_ERRORS = 10
+# Сколько байт с начала файла проверяется при выборе кодировки
+ENCODING_SAMPLE = 1 << 16
+
+
+class ImportReport:
+    """Прогресс и итог импорта."""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.changed = 0
+        self.skipped = 0
+        self.errors: List[str] = []
+        self.started = time.monotonic()
+        self.finished = False
+        # Причина, по которой файл не дочитан (None — импорт прошел до конца)
+        self.failed: Optional[str] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def error(self, line: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"строка {line}: {message}")
+
+
+def detect_format(filename: str) -> Optional[str]:
+    """Формат файла по расширению: csv, jsonl (.ndjson, .json) или None."""
+    ext = os.path.splitext(filename.lower())[1]
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return None
+
+
+def parse_product(raw: Dict[str, Any]) -> Product:
+    """Проверяет строку файла и приводит ее к Product; ValueError — строка с ошибкой."""
+    product_id = raw.get("id")
+    if product_id in (None, ""):
+        product_id = None
+    else:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"некорректный id: {product_id!r}") from None
+        if product_id <= 0:
+            raise ValueError(f"id должен быть положительным: {product_id}")
+
+    name = str(raw.get("name") or "").strip()
+    if not name:
+        raise ValueError("пустое название")
+
+    price = raw.get("price")
+    if isinstance(price, str):
+        # "1 500,50" — пробелы между разрядами и запятая вместо точки
+        price = price.replace(" ", "").replace("\u00a0", "").replace(",", ".")
+    if price in (None, ""):
+        raise ValueError("нет цены")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError(f"некорректная цена: {raw.get('price')!r}") from None
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"некорректная цена: {raw.get('price')!r}")
+
+    sizes = raw.get("sizes")
+    sizes = [str(s).strip() for s in (sizes if isinstance(sizes, list) else str(sizes or "").split(","))]
+    sizes = [s for s in sizes if s]
+    if not sizes:
+        raise ValueError("нет размеров")
+    for size in sizes:
+        if "_" in size or len(size) > MAX_SIZE_LENGTH:
+            raise ValueError(f"недопустимый размер {size!r}: без '_' и не длиннее {MAX_SIZE_LENGTH} символов")
+
+    description = str(raw.get("description") or "").strip()
+    photo_id = str(raw.get("photo_id") or "").strip() or "none"
+    return Product(product_id, name, description, price, ", ".join(sizes), photo_id)
+
+
+def detect_encoding(path: str) -> str:
+    """utf-8-sig (Excel сохраняет CSV с BOM), если начало файла читается как UTF-8, иначе cp1251."""
+    with open(path, "rb") as f:
+        sample = f.read(ENCODING_SAMPLE)
+    try:
+        # final=False: символ, разрезанный границей выборки, не считается ошибкой
+        codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1251"
+    return "utf-8-sig"
+
+
+def _read_rows(path: str, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Строки файла по одной: (номер строки, словарь полей или текст ошибки)."""
+    encoding = detect_encoding(path)
+    if fmt == "csv":
+        with open(path, newline="", encoding=encoding) as f:
+            reader = csv.DictReader(f)
+            missing = {"name", "price", "sizes"} - set(reader.fieldnames or ())
+            if missing:
+                yield 1, f"в заголовке нет колонок: {', '.join(sorted(missing))}"
+                return
+            for row in reader:
+                yield reader.line_num, row
+        return
+    with open(path, encoding=encoding) as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, f"некорректный JSON ({e})"
+                continue
+            yield line_num, row if isinstance(row, dict) else "ожидается JSON-объект"
+
+
+def _chunks(path: str, fmt: str, report: ImportReport, chunk: int) -> Iterator[List[Product]]:
+    batch = []
+    for line_num, row in _read_rows(path, fmt):
+        report.rows += 1
+        if isinstance(row, str):
+            report.error(line_num, row)
+            continue
+        try:
+            batch.append(parse_product(row))
+        except (TypeError, ValueError) as e:
+            report.error(line_num, str(e))
+            continue
+        if len(batch) >= chunk:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def import_file(path: str, fmt: str, chunk: int = IMPORT_CHUNK,
+                      progress: Optional[Callable[[ImportReport], Awaitable[None]]] = None,
+                      report: Optional[ImportReport] = None) -> ImportReport:
+    """Импортирует товары из файла пачками; progress вызывается после каждой пачки и в конце.
+
+    Если файл не дочитать (битая кодировка, ошибка CSV), уже записанные пачки
+    остаются, а причина попадает в report.failed. Прочие ошибки тоже
+    отмечаются в отчете (и в последнем вызове progress), затем пробрасываются.
+    Кэш каталога не обновляется: после импорта его перечитывает вызывающий
+    (catalog.load()), если report.changed.
+    """
+    report = report or ImportReport()
+    chunks = _chunks(path, fmt, report, chunk)
+    try:
+        while True:
+            # Чтение и разбор следующей пачки — в потоке; генератор продвигается строго по очереди
+            batch = await asyncio.to_thread(next, chunks, None)
+            if batch is None:
+                break
+            report.changed += await upsert_products(batch)
+            report.imported += len(batch)
+            if progress:
+                await progress(report)
+    except UnicodeDecodeError:
+        report.failed = f"после строки {report.rows}: файл не в кодировке UTF-8 или cp1251, импорт остановлен"
+    except csv.Error as e:
+        report.failed = f"строка {report.rows + 1}: ошибка CSV ({e}), импорт остановлен"
+    except Exception as e:
+        report.failed = f"ошибка импорта: {e}"
+        await _finish(report, progress)
+        raise
+    await _finish(report, progress)
+    return report
+
+
+async def _finish(report: ImportReport, progress: Optional[Callable[[ImportReport], Awaitable[None]]]):
+    report.finished = True
+    if progress:
+        await progress(report)
+
+
+def _writer(f, fmt: str) -> Callable[[List[Product]], None]:
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        return writer.writerows
+    return lambda rows: f.writelines(json.dumps(row._asdict(), ensure_ascii=False) + "\n" for row in rows)
+
+
+async def export_file(path: str, fmt: str, chunk: int = IMPORT_CHUNK) -> int:
+    """Выгружает весь каталог в файл пачками; возвращает число товаров."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        write = _writer(f, fmt)
+        async for rows in iter_products(chunk):
+            await asyncio.to_thread(write, rows)
+            count += len(rows)
+    return count
@@ -0,0 +1,55 @@
+"""Множество недавно виденных ключей для отсева повторов.
+
+Ключи раскладываются по корзинам по времени добавления (window / buckets
+секунд на корзину). Проверка смотрит только живые корзины — их не больше
+buckets + 1, поэтому и проверка, и добавление — O(1). Устаревшая корзина
+выбрасывается целиком, без перебора ключей. Память ограничена max_size:
+при переполнении самая старая корзина выбрасывается раньше срока.
+Окно window <= 0 отключает запоминание: ни один ключ не считается повтором.
+"""
+import time
+from collections import deque
+from typing import Callable, Deque, Hashable, Set, Tuple
+
+
+class TimeBucketSet:
+    """Ключ живет не меньше window секунд (и не больше window + window / buckets)."""
+
+    def __init__(self, window: float, buckets: int = 8, max_size: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.buckets = buckets
+        self.max_size = max_size
+        self.clock = clock
+        self._width = window / buckets if window > 0 else 0
+        # (номер корзины, ключи) от старой к новой
+        self._buckets: Deque[Tuple[int, Set[Hashable]]] = deque()
+        self._size = 0
+
+    def _expire(self) -> int:
+        current = int(self.clock() // self._width)
+        while self._buckets and (self._buckets[0][0] < current - self.buckets or self._size > self.max_size):
+            self._size -= len(self._buckets.popleft()[1])
+        return current
+
+    def __contains__(self, key: Hashable) -> bool:
+        if not self._width:
+            return False
+        self._expire()
+        return any(key in keys for _, keys in self._buckets)
+
+    def add(self, key: Hashable) -> bool:
+        """Запоминает ключ. False — ключ уже был в окне (повтор)."""
+        if not self._width:
+            return True
+        current = self._expire()
+        if any(key in keys for _, keys in self._buckets):
+            return False
+        if not self._buckets or self._buckets[-1][0] != current:
+            self._buckets.append((current, set()))
+        self._buckets[-1][1].add(key)
+        self._size += 1
+        return True
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,215 @@
+"""Сжатые варианты локальных фото товаров.
+
+Фото каталога лежат на диске в PNG (сотни килобайт на товар), а Telegram
+все равно пережимает фото до 1280 px по длинной стороне. Для каждого файла
+один раз готовятся JPEG и WebP не больше IMAGE_MAX_SIDE и миниатюра каталога
+IMAGE_THUMB_SIDE. Сжатие идет в пуле процессов (ProcessPoolExecutor), чтобы
+не занимать event loop и ядро, на котором он работает. Варианты хранятся в
+IMAGE_CACHE_DIR под хэшем содержимого исходника: переживают перезапуск и общие
+для всех процессов-воркеров. При загрузке в Telegram берется самый легкий из
+вариантов (или исходник, если он легче).
+
+Pillow — необязательная зависимость: без него фото отправляются как есть.
+"""
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from aiogram.types import PhotoSize
+from aiohttp import web
+
+from core.config import (
+    IMAGE_CACHE_DIR, IMAGE_FORMATS, IMAGE_MAX_SIDE, IMAGE_THUMB_SIDE, IMAGE_WORKERS, WEBHOOK_BASE_URL
+)
+
+# Формат Pillow, расширение файла и параметры сохранения
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 6}),
+}
+THUMB = "thumb.jpg"
+# Миниатюры раздаются по HTTP с того же сервера, что принимает вебхуки (для inline-режима)
+MEDIA_PATH = "/media/"
+_MEDIA_NAME = re.compile(r"^[0-9a-f]{64}\.thumb\.jpg$")
+
+
+def _targets(formats: Sequence[str]) -> List[Tuple[str, str, bool]]:
+    """Варианты одного фото: (имя файла, формат, миниатюра ли)."""
+    return [(f"photo.{FORMATS[fmt][1]}", fmt, False) for fmt in formats] + [(THUMB, "jpeg", True)]
+
+
+def _render(source: str, cache_dir: str, content_hash: str, formats: Sequence[str],
+            max_side: int, thumb_side: int) -> Dict[str, int]:
+    """Готовит варианты фото (выполняется в процессе пула). Возвращает {путь: размер в байтах}."""
+    from PIL import Image, ImageOps
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            # У JPEG нет прозрачности: прозрачный фон становится белым
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        variants = {}
+        for name, fmt, thumb in _targets(formats):
+            pil_format, _, options = FORMATS[fmt]
+            side = thumb_side if thumb else max_side
+            resized = image.copy()
+            resized.thumbnail((side, side), Image.LANCZOS)
+            path = os.path.join(cache_dir, f"{content_hash}.{name}")
+            # Запись через временный файл: другой процесс не увидит недописанный вариант
+            tmp = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp, pil_format, **options)
+            os.replace(tmp, path)
+            variants[path] = os.path.getsize(path)
+    return variants
+
+
+def best_photo_size(sizes: Sequence[PhotoSize], max_side: int = IMAGE_MAX_SIDE) -> PhotoSize:
+    """Самый легкий из размеров загруженного в Telegram фото, которого хватает для карточки.
+
+    Telegram присылает фото в нескольких размерах по возрастанию; берем
+    первый не меньше max_side по длинной стороне, иначе самый большой.
+    """
+    for size in sizes:
+        if max(size.width, size.height) >= max_side:
+            return size
+    return sizes[-1]
+
+
+class ImagePipeline:
+    """Варианты локальных фото: из памяти, с диска или сжатые в пуле процессов."""
+
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, workers: int = IMAGE_WORKERS,
+                 formats: Sequence[str] = IMAGE_FORMATS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.formats = [fmt for fmt in formats if fmt in FORMATS]
+        self.enabled = importlib.util.find_spec("PIL") is not None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # content_hash -> {путь варианта: байт}; пустой словарь — файл не удалось сжать
+        self._variants: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.rendered = 0
+        self._closed = False
+        if not self.enabled:
+            logging.info("Pillow is not installed: product photos are sent without compression")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _lookup(self, content_hash: str) -> Optional[Dict[str, int]]:
+        # Варианты, уже сжатые этим или другим процессом
+        variants = {}
+        for name, _, _ in _targets(self.formats):
+            path = os.path.join(self.cache_dir, f"{content_hash}.{name}")
+            try:
+                variants[path] = os.path.getsize(path)
+            except OSError:
+                return None
+        return variants
+
+    async def prepare(self, source: str, content_hash: str) -> Dict[str, int]:
+        """Варианты фото {путь: байт}; пустой словарь — Pillow нет, файл не картинка или пул закрыт."""
+        if not self.enabled or self._closed:
+            return {}
+        variants = self._variants.get(content_hash)
+        if variants is not None:
+            return variants
+        # Одновременные запросы одного фото ждут одно сжатие
+        pending = self._pending.get(content_hash)
+        if pending is None:
+            pending = self._pending[content_hash] = asyncio.ensure_future(self._prepare(source, content_hash))
+            pending.add_done_callback(lambda _: self._pending.pop(content_hash, None))
+        return await asyncio.shield(pending)
+
+    async def _prepare(self, source: str, content_hash: str) -> Dict[str, int]:
+        variants = await asyncio.to_thread(self._lookup, content_hash)
+        if variants is None:
+            loop = asyncio.get_running_loop()
+            try:
+                variants = await loop.run_in_executor(
+                    self._pool(), _render, source, self.cache_dir, content_hash, self.formats,
+                    IMAGE_MAX_SIDE, IMAGE_THUMB_SIDE
+                )
+                self.rendered += 1
+            except BrokenProcessPool as e:
+                # Процесс пула упал (например, OOM) — следующий запрос создаст новый пул
+                logging.error(f"Image worker pool broke while compressing {source}: {e}")
+                self._executor = None
+                return {}
+            except Exception as e:
+                logging.error(f"Error compressing photo {source}: {e}")
+                variants = {}
+        self._variants[content_hash] = variants
+        return variants
+
+    async def best(self, source: str, content_hash: str) -> str:
+        """Путь к самому легкому файлу для отправки фото: вариант или сам исходник.
+
+        Пока пул не сжал ни одного фото (процесс еще запускается), исходник
+        отправляется сразу, а варианты готовятся в фоне: запуск процесса
+        дольше, чем загрузка исходника.
+        """
+        if self.enabled and content_hash not in self._variants and not self.rendered:
+            variants = await asyncio.to_thread(self._lookup, content_hash)
+            if variants is None:
+                self._background(source, content_hash)
+                return source
+            self._variants[content_hash] = variants
+        candidates = {path: size for path, size in (await self.prepare(source, content_hash)).items()
+                      if not path.endswith(THUMB)}
+        if not candidates:
+            return source
+        candidates[source] = os.path.getsize(source)
+        return min(candidates, key=candidates.get)
+
+    def _background(self, source: str, content_hash: str):
+        task = asyncio.ensure_future(self.prepare(source, content_hash))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def thumbnail_url(self, content_hash: str) -> Optional[str]:
+        """Публичный адрес миниатюры (только в режиме webhook и после сжатия)."""
+        if not WEBHOOK_BASE_URL or not self._variants.get(content_hash):
+            return None
+        return f"{WEBHOOK_BASE_URL.rstrip('/')}{MEDIA_PATH}{content_hash}.{THUMB}"
+
+    async def serve(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        path = os.path.join(self.cache_dir, name)
+        if not _MEDIA_NAME.match(name) or not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        # Содержимое по хэшу не меняется
+        return web.FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+    def add_routes(self, app: web.Application):
+        app.router.add_get(MEDIA_PATH + "{name}", self.serve)
+
+    async def close(self):
+        # После закрытия новый пул не создается: фоновые задачи, которые еще идут, получат {}
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "rendered": self.rendered, "cached": len(self._variants)}
+
+
+images = ImagePipeline()
@@ -0,0 +1,211 @@
+"""Метрики задержек обработчиков в памяти процесса.
+
+Для каждого обработчика копятся три гистограммы: полное время обработки
+апдейта, время в базе (соединения пула) и время в Bot API, и счетчики
+SQL-запросов и запросов к Bot API. Гистограммы
+устроены как HDR: логарифмические интервалы с линейным делением внутри,
+точность ~1.5% на всем диапазоне при фиксированной памяти и записи за O(1).
+Текущий апдейт хранит счетчики в ContextVar, поэтому пул и сессия бота
+добавляют к ним время без передачи параметров по цепочке вызовов.
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# 2^SUB_BITS линейных интервалов на первую октаву, дальше по 2^(SUB_BITS-1) на каждую
+SUB_BITS = 7
+SUB = 1 << SUB_BITS
+HALF = SUB >> 1
+# Значения в микросекундах, до ~1.2 часа
+MAX_SHIFT = 26
+BUCKETS = SUB + MAX_SHIFT * HALF
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# [время в базе, время в Bot API (нс), SQL-запросов, запросов к Bot API] для апдейта, который обрабатывается сейчас
+_current: ContextVar[Optional[List[int]]] = ContextVar("metrics_update", default=None)
+
+
+def _lower_bound(index: int) -> int:
+    if index < SUB:
+        return index
+    shift = index // HALF - 1
+    return (index - shift * HALF) << shift
+
+
+class Histogram:
+    """Гистограмма значений в микросекундах."""
+
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        # Индекс интервала считается на месте: запись идет на каждый апдейт
+        if value < SUB:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - SUB_BITS
+            self.counts[shift * HALF + (value >> shift) if shift <= MAX_SHIFT else BUCKETS - 1] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentiles(self, quantiles=QUANTILES) -> List[int]:
+        """Значения (нижние границы интервалов) для возрастающего списка квантилей."""
+        result = []
+        count = self.count
+        if not count:
+            return [0] * len(quantiles)
+        targets = iter(quantiles)
+        target = next(targets)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if not n:
+                continue
+            seen += n
+            while seen >= target * count:
+                result.append(min(_lower_bound(index), self.max))
+                target = next(targets, None)
+                if target is None:
+                    return result
+        while len(result) < len(quantiles):
+            result.append(self.max)
+        return result
+
+
+class HandlerStats:
+    __slots__ = ("wall", "db", "api", "errors", "queries", "api_calls")
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.db = Histogram()
+        self.api = Histogram()
+        self.errors = 0
+        self.queries = 0
+        self.api_calls = 0
+
+
+class Metrics:
+    def __init__(self):
+        self.handlers: Dict[str, HandlerStats] = {}
+        self.api_methods: Dict[str, Histogram] = {}
+        self.started = time.time()
+
+    def begin(self):
+        """Начинает учет апдейта в текущем контексте. Возвращает токен для finish."""
+        return _current.set([0, 0, 0, 0])
+
+    def finish(self, token, handler: str, wall_ns: int, failed: bool = False):
+        timings = _current.get()
+        _current.reset(token)
+        stats = self.handlers.get(handler)
+        if stats is None:
+            stats = self.handlers[handler] = HandlerStats()
+        stats.wall.record(wall_ns // 1000)
+        stats.db.record(timings[0] // 1000)
+        stats.api.record(timings[1] // 1000)
+        stats.queries += timings[2]
+        stats.api_calls += timings[3]
+        if failed:
+            stats.errors += 1
+
+    def record_api(self, method: str, elapsed_ns: int):
+        timings = _current.get()
+        if timings is not None:
+            timings[1] += elapsed_ns
+            timings[3] += 1
+        histogram = self.api_methods.get(method)
+        if histogram is None:
+            histogram = self.api_methods[method] = Histogram()
+        histogram.record(elapsed_ns // 1000)
+
+    def summary(self) -> List[Tuple[str, int, List[int], List[int], List[int], int]]:
+        """(обработчик, число апдейтов, p50/p90/p99/p99.9 полного времени, базы, Bot API, ошибки), самые медленные первыми."""
+        rows = [
+            (name, s.wall.count, s.wall.percentiles(), s.db.percentiles(), s.api.percentiles(), s.errors)
+            for name, s in self.handlers.items()
+        ]
+        rows.sort(key=lambda row: row[2][2], reverse=True)
+        return rows
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus (summary с квантилями)."""
+        lines = [
+            "# HELP bot_handler_seconds Update handling time per handler: wall, db and bot api parts.",
+            "# TYPE bot_handler_seconds summary",
+        ]
+        for name, stats in sorted(self.handlers.items()):
+            for kind, histogram in (("wall", stats.wall), ("db", stats.db), ("api", stats.api)):
+                labels = f'handler="{name}",kind="{kind}"'
+                _summary(lines, "bot_handler_seconds", labels, histogram)
+        lines += ["# HELP bot_handler_errors_total Updates whose handler raised.",
+                  "# TYPE bot_handler_errors_total counter"]
+        lines += [f'bot_handler_errors_total{{handler="{name}"}} {s.errors}' for name, s in sorted(self.handlers.items())]
+        lines += ["# HELP bot_handler_db_queries_total SQL statements run while handling updates.",
+                  "# TYPE bot_handler_db_queries_total counter"]
+        lines += [f'bot_handler_db_queries_total{{handler="{name}"}} {s.queries}' for name, s in sorted(self.handlers.items())]
+        lines += ["# HELP bot_handler_api_calls_total Bot API requests made while handling updates.",
+                  "# TYPE bot_handler_api_calls_total counter"]
+        lines += [f'bot_handler_api_calls_total{{handler="{name}"}} {s.api_calls}' for name, s in sorted(self.handlers.items())]
+        lines += ["# HELP bot_api_request_seconds Bot API request time per method, including rate limiting.",
+                  "# TYPE bot_api_request_seconds summary"]
+        for method, histogram in sorted(self.api_methods.items()):
+            _summary(lines, "bot_api_request_seconds", f'method="{method}"', histogram)
+        lines += ["# TYPE bot_uptime_seconds gauge", f"bot_uptime_seconds {time.time() - self.started:.0f}"]
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def _summary(lines: List[str], name: str, labels: str, histogram: Histogram):
+    for quantile, value in zip(QUANTILES, histogram.percentiles()):
+        lines.append(f'{name}{{{labels},quantile="{quantile}"}} {value / 1e6:.6f}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total / 1e6:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def record_db(elapsed_ns: int):
+    """Добавляет время работы с базой к текущему апдейту (вызывается пулом соединений)."""
+    timings = _current.get()
+    if timings is not None:
+        timings[0] += elapsed_ns
+
+
+def current() -> Optional[List[int]]:
+    """Счетчики апдейта, который обрабатывается сейчас (None — вне апдейта или в фоновой задаче)."""
+    return _current.get()
+
+
+def count_query(timings: Optional[List[int]]):
+    """Засчитывает апдейту один SQL-запрос (вызывается соединением пула)."""
+    if timings is not None:
+        timings[2] += 1
+
+
+def detach():
+    """Отвязывает фоновую задачу от апдейта, при обработке которого она была создана."""
+    _current.set(None)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный HTTP-сервер с /metrics (для режима polling)."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+metrics = Metrics()
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from database.db import get_photo_file_ids, save_photo_file_id
+from utils.images import images
+from utils.rate_limiter import LANE_BULK, sending_lane
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PhotoRegistry:
+    """Реестр Telegram file_id для локальных фото товаров.
+
+    Файл с диска загружается в Telegram один раз: file_id из ответа send_photo
+    сохраняется в таблицу photo_cache по хэшу содержимого и дальше
+    переиспользуется. Если содержимое файла изменилось, меняется хэш, и фото
+    загружается заново. Загружается не сам файл, а самый легкий из его сжатых
+    вариантов (utils/images.py).
+    """
+
+    def __init__(self):
+        # path -> (mtime_ns, size, sha256), чтобы не хэшировать файл при каждом показе
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._file_ids: Dict[str, str] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.uploads = 0
+        self.reuses = 0
+        self.bytes_uploaded = 0
+
+    async def load(self):
+        # При быстром старте фото могли загрузиться в Telegram раньше, чем прочитан кэш: их file_id не теряем
+        self._file_ids = {**await get_photo_file_ids(), **self._file_ids}
+
+    async def content_hash(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        content_hash = await asyncio.to_thread(_hash_file, path)
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, content_hash)
+        return content_hash
+
+    async def _remember(self, content_hash: str, message: Message):
+        file_id = message.photo[-1].file_id
+        self._file_ids[content_hash] = file_id
+        await save_photo_file_id(content_hash, file_id)
+
+    async def send_photo(self, bot: Bot, chat_id: int, photo_id: str, **kwargs) -> Message:
+        """send_photo, который для локальных файлов подставляет сохраненный file_id."""
+        if not os.path.isfile(photo_id):
+            # Уже file_id или URL — отправляем как есть
+            return await bot.send_photo(chat_id=chat_id, photo=photo_id, **kwargs)
+
+        content_hash = await self.content_hash(photo_id)
+        file_id = self._file_ids.get(content_hash)
+        if file_id:
+            try:
+                message = await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+                self.reuses += 1
+                return message
+            except TelegramBadRequest as e:
+                # file_id мог стать недействительным (например, после смены токена бота)
+                logging.warning(f"Cached file_id for {photo_id} rejected, re-uploading: {e}")
+                self._file_ids.pop(content_hash, None)
+
+        upload_path = await images.best(photo_id, content_hash)
+        message = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(upload_path), **kwargs)
+        self.uploads += 1
+        self.bytes_uploaded += os.path.getsize(upload_path)
+        await self._remember(content_hash, message)
+        return message
+
+    async def prepare(self, products) -> int:
+        """Заранее сжимает локальные фото товаров (в пуле процессов, event loop не блокируется)."""
+        prepared = 0
+        for product in products:
+            photo_id = product.photo_id
+            if not photo_id or not os.path.isfile(photo_id):
+                continue
+            if await images.prepare(photo_id, await self.content_hash(photo_id)):
+                prepared += 1
+        return prepared
+
+    def schedule_prepare(self, products):
+        """prepare в фоне: новый товар не ждет сжатия своего фото."""
+        task = asyncio.create_task(self.prepare(products))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def thumbnail_url(self, photo_id: Optional[str]) -> Optional[str]:
+        """Публичный адрес миниатюры локального фото, если она уже готова."""
+        if not photo_id or not os.path.isfile(photo_id):
+            return None
+        return images.thumbnail_url(await self.content_hash(photo_id))
+
+    async def warm_up(self, bot: Bot, chat_id: int, products) -> int:
+        """Заранее загружает все локальные фото каталога в чат chat_id и удаляет сообщения."""
+        # Фоновая загрузка не должна задерживать ответы покупателям
+        with sending_lane(LANE_BULK):
+            uploaded = await self._warm_up(bot, chat_id, products)
+        logging.info(f"Photo warm-up finished: {uploaded} uploaded, {len(self._file_ids)} cached")
+        return uploaded
+
+    async def _warm_up(self, bot: Bot, chat_id: int, products) -> int:
+        uploaded = 0
+        for product in products:
+            photo_id = product.photo_id
+            if not photo_id or not os.path.isfile(photo_id):
+                continue
+            if await self.content_hash(photo_id) in self._file_ids:
+                continue
+            try:
+                message = await self.send_photo(bot, chat_id, photo_id, disable_notification=True)
+                await bot.delete_message(chat_id, message.message_id)
+                uploaded += 1
+            except Exception as e:
+                logging.error(f"Error pre-uploading photo {photo_id}: {e}")
+        return uploaded
+
+    def stats(self) -> dict:
+        return {"uploads": self.uploads, "reuses": self.reuses, "cached": len(self._file_ids),
+                "bytes_uploaded": self.bytes_uploaded}
+
+
+photos = PhotoRegistry()
@@ -0,0 +1,233 @@
+"""Планировщик исходящих запросов к Bot API.
+
+Middleware сессии aiogram: все вызовы бота проходят через общий token bucket
+(лимит Telegram на весь бот) и token bucket конкретного чата. Когда токенов не
+хватает, запросы ждут в очереди по приоритету: ответы покупателям идут раньше
+сообщений админам и массовых рассылок. Ответ 429 (RetryAfter) ставит чат на
+паузу на указанное время, и запрос повторяется. Если правка сообщения еще ждет
+в очереди, а для того же сообщения пришла новая, отправляется только новая.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, EditMessageText, TelegramMethod
+
+# Очереди по приоритету: меньше — раньше
+LANE_USER = 0
+LANE_ADMIN = 1
+LANE_BULK = 2
+
+_lane: ContextVar[Optional[int]] = ContextVar("bot_api_lane", default=None)
+
+EDIT_METHODS = (EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup)
+
+
+@contextmanager
+def sending_lane(lane: int):
+    """Отправлять запросы внутри блока с приоритетом lane (задачи, созданные внутри, его наследуют)."""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас. Токены можно брать в долг."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self, now: float) -> float:
+        """Занимает токен и возвращает, сколько ждать до его наступления."""
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter(BaseRequestMiddleware):
+    """Сглаживает исходящий трафик бота и переживает flood control Telegram.
+
+    global_rate — запросов в секунду на весь бот, chat_rate и chat_burst —
+    на один чат. Запросы без chat_id (answerCallbackQuery, getMe, getUpdates)
+    не ограничиваются, но тоже повторяются после RetryAfter.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3, admin_chats: Iterable[int] = (), max_chats: int = 10_000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.admin_chats = frozenset(admin_chats)
+        self.max_chats = max_chats
+        self._chats: Dict[Any, TokenBucket] = {}
+        # Пауза после 429: чат -> monotonic-время, до которого в него не пишем
+        self._blocked: Dict[Any, float] = {}
+        self._paused_until = 0.0
+        # Очередь за глобальными токенами: (lane, порядковый номер, future)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+        # (тип правки, чат, сообщение) -> future самой новой правки в очереди
+        self._edits: Dict[Tuple, asyncio.Future] = {}
+        self.counters: Counter = Counter()
+
+    def _lane_for(self, chat_id: Any) -> int:
+        lane = _lane.get()
+        if lane is not None:
+            return lane
+        return LANE_ADMIN if chat_id in self.admin_chats else LANE_USER
+
+    def _chat_bucket(self, chat_id: Any, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # Забываем чаты с полным запасом токенов — для них состояние не нужно
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+                self._blocked = {k: t for k, t in self._blocked.items() if t > now}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire_global(self, lane: int):
+        now = time.monotonic()
+        if not self._waiters and now >= self._paused_until and self.global_bucket.delay(now) == 0:
+            self.global_bucket.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), future))
+        if self._pump_task is None:
+            self._pump_task = asyncio.create_task(self._pump())
+        self.counters["queued"] += 1
+        await future
+
+    async def _pump(self):
+        # Раздает глобальные токены ожидающим по приоритету и завершается, когда очередь пуста
+        try:
+            while self._waiters:
+                now = time.monotonic()
+                wait = max(self.global_bucket.delay(now), self._paused_until - now)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue  # ожидающий отменен
+                self.global_bucket.tokens -= 1
+                future.set_result(None)
+        finally:
+            self._pump_task = None
+
+    def _superseded(self, key: Optional[Tuple], ticket: Optional[asyncio.Future]) -> Optional[asyncio.Future]:
+        newest = self._edits.get(key) if key else None
+        return newest if newest is not None and newest is not ticket else None
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._send(make_request, bot, method)
+
+        key = ticket = None
+        message_id = getattr(method, "message_id", None)
+        if isinstance(method, EDIT_METHODS) and message_id is not None:
+            key = (type(method), chat_id, message_id)
+            ticket = asyncio.get_running_loop().create_future()
+            self._edits[key] = ticket
+        try:
+            lane = self._lane_for(chat_id)
+            attempt = 0
+            while True:
+                now = time.monotonic()
+                bucket = self._chat_bucket(chat_id, now)
+                wait = max(bucket.reserve(now), self._blocked.get(chat_id, 0) - now)
+                if wait > 0:
+                    self.counters["delayed"] += 1
+                    await asyncio.sleep(wait)
+                if newer := self._superseded(key, ticket):
+                    # Пока правка ждала, пришла более новая — отдаем ее результат
+                    bucket.refund()
+                    self.counters["coalesced"] += 1
+                    result = await asyncio.shield(newer)
+                    ticket.set_result(result)
+                    return result
+                await self._acquire_global(lane)
+                try:
+                    result = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    attempt += 1
+                    self._on_retry_after(chat_id, e.retry_after)
+                    if attempt > self.max_retries:
+                        raise
+                    continue
+                self.counters["sent"] += 1
+                if ticket is not None:
+                    ticket.set_result(result)
+                return result
+        except BaseException as e:
+            if ticket is not None and not ticket.done():
+                if isinstance(e, Exception):
+                    ticket.set_exception(e)
+                    ticket.exception()  # ошибку получит и сам вызывающий, не логируем как непрочитанную
+                else:
+                    ticket.cancel()
+            raise
+        finally:
+            if key is not None and self._edits.get(key) is ticket:
+                del self._edits[key]
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        attempt = 0
+        while True:
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self._on_retry_after(None, e.retry_after)
+                if attempt > self.max_retries:
+                    raise
+
+    def _on_retry_after(self, chat_id: Any, retry_after: int):
+        self.counters["retry_after"] += 1
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._paused_until = max(self._paused_until, until)
+        else:
+            self._blocked[chat_id] = max(self._blocked.get(chat_id, 0), until)
+        logging.warning(f"Bot API flood control: retry after {retry_after}s (chat {chat_id})")
+
+    def stats(self) -> dict:
+        return {**self.counters, "waiting": len(self._waiters), "chats": len(self._chats)}
@@ -0,0 +1,512 @@
+"""Несколько процессов-обработчиков с раздачей апдейтов по chat_id.
+
+Один процесс Python упирается в одно ядро: разбор апдейтов, фильтры,
+клавиатуры и FSM выполняются в одном event loop. При WORKERS > 1 входной
+процесс только принимает апдейты (long polling или webhook) и, не разбирая
+их в объекты aiogram, пересылает сырой JSON воркеру chat_id % WORKERS.
+Все апдейты одного чата попадают в один процесс и обрабатываются там строго
+по очереди, поэтому порядок сообщений пользователя и его FSM-состояние
+(вместе с кэшем хранилища) согласованы без межпроцессных блокировок. Чаты
+админов закреплены за воркером 0 — он же ведет очередь рассылок.
+
+Каждый воркер — полноценный бот: свой пул соединений к общему файлу SQLite
+(WAL, запись через BEGIN IMMEDIATE с ожиданием busy_timeout), свой кэш
+каталога, который подхватывает чужие правки по счетчику catalog_version, и
+своя доля глобального лимита Bot API.
+
+Связь — TCP на localhost, кадры с длиной. Входной процесс -> воркер:
+chat_id и JSON апдейта; воркер -> входной: число обработанных апдейтов. По
+этим подтверждениям входной процесс знает очередь воркеров, притормаживает
+getUpdates и отвечает 503 на webhook при перегрузке, а при остановке
+дожидается обработки уже принятых апдейтов.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import struct
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from core.app import (
+    create_bot, create_dispatcher, setup_logging, start_services, stop_services, used_update_types,
+)
+from core.config import (
+    ADMIN_IDS, BOT_API_RATE, BOT_MODE, CATALOG_SYNC_INTERVAL, METRICS_PORT, WEBHOOK_BASE_URL, WEBHOOK_HOST,
+    WEBHOOK_MAX_CONCURRENCY, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET,
+)
+from database.catalog import catalog
+from database.db import init_db, pool
+from utils.images import images
+from utils.startup import startup
+from utils.webhook import SECRET_HEADER
+
+WORKER_LOG_FORMAT = "%(asctime)s - %(levelname)s - %(processName)s - %(name)s - %(message)s"
+
+# Кадр входной процесс -> воркер: длина (chat_id + JSON), chat_id, JSON апдейта
+_ROUTE = struct.Struct(">Iq")
+_KEY = struct.Struct(">q")
+_LENGTH = struct.Struct(">I")
+# Воркер -> входной процесс: номер воркера при подключении, затем число обработанных апдейтов
+_COUNT = struct.Struct(">I")
+
+POLL_TIMEOUT = 30
+
+
+def chat_key(raw: dict) -> int:
+    """Ключ шардирования сырого апдейта: id чата, для апдейтов без чата — id пользователя."""
+    for event in raw.values():
+        if isinstance(event, dict):
+            chat = event.get("chat") or (event.get("message") or {}).get("chat")
+            if chat:
+                return chat["id"]
+            user = event.get("from") or event.get("user")
+            if user:
+                return user["id"]
+    return raw.get("update_id", 0)
+
+
+def _stop_event() -> asyncio.Event:
+    """Событие, которое выставляется по SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    return stop
+
+
+class Shard:
+    """Воркер глазами входного процесса: процесс, соединение и счетчики."""
+
+    __slots__ = ("index", "process", "writer", "connected", "sent", "done")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.connected = asyncio.Event()
+        self.sent = 0
+        self.done = 0
+
+
+class UpdateRouter:
+    """Входной процесс: запускает воркеров и раздает им апдейты по chat_id.
+
+    target — точка входа воркера target(index, count, port), по умолчанию
+    worker_main. Упавший воркер перезапускается; апдейты, которые он не
+    успел обработать, теряются (в журнале — их число).
+    """
+
+    def __init__(self, workers: int, target: Optional[Callable] = None, pinned: Iterable[int] = ADMIN_IDS,
+                 max_pending: int = WEBHOOK_MAX_CONCURRENCY * 10):
+        self.target = target or worker_main
+        self.pinned = frozenset(pinned)
+        self.max_pending = max_pending
+        self.shards: List[Shard] = [Shard(i) for i in range(workers)]
+        self.sent = 0
+        self.done = 0
+        self.lost = 0
+        self._port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._context = multiprocessing.get_context("spawn")
+        self._readers: Set[asyncio.Task] = set()
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        """Апдейты, отправленные воркерам и еще не обработанные."""
+        return self.sent - self.done
+
+    @property
+    def overloaded(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def _spawn(self, shard: Shard):
+        shard.process = self._context.Process(
+            target=self.target, args=(shard.index, len(self.shards), self._port), name=f"worker-{shard.index}"
+        )
+        shard.process.start()
+
+    async def start(self, timeout: float = 60):
+        """Запускает воркеров и ждет, пока каждый откроет базу и подключится."""
+        self._server = await asyncio.start_server(self._accept, "127.0.0.1", 0)
+        self._port = self._server.sockets[0].getsockname()[1]
+        for shard in self.shards:
+            self._spawn(shard)
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            while not shard.connected.is_set():
+                if not shard.process.is_alive():
+                    raise RuntimeError(f"Worker {shard.index} exited during startup (code {shard.process.exitcode})")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Worker {shard.index} did not start in {timeout} s")
+                try:
+                    await asyncio.wait_for(shard.connected.wait(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+        logging.info(f"{len(self.shards)} workers started")
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        index, = _COUNT.unpack(await reader.readexactly(_COUNT.size))
+        shard = self.shards[index]
+        shard.writer = writer
+        shard.connected.set()
+        task = asyncio.create_task(self._read_acks(shard, reader))
+        self._readers.add(task)
+        task.add_done_callback(self._readers.discard)
+
+    async def _read_acks(self, shard: Shard, reader: asyncio.StreamReader):
+        try:
+            while True:
+                count, = _COUNT.unpack(await reader.readexactly(_COUNT.size))
+                shard.done += count
+                self._acked(count)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        if self._closing:
+            return
+        # Воркер упал: необработанные им апдейты уже не придут, запускаем его заново
+        lost = shard.sent - shard.done
+        shard.writer = None
+        shard.connected.clear()
+        shard.sent = shard.done
+        self.lost += lost
+        logging.error(f"Worker {shard.index} exited (code {shard.process.exitcode}), "
+                      f"{lost} updates lost, restarting...")
+        self._acked(lost)
+        await asyncio.to_thread(shard.process.join)
+        self._spawn(shard)
+
+    def _acked(self, count: int):
+        self.done += count
+        if not self.overloaded:
+            self._capacity.set()
+        if self.done >= self.sent:
+            self._idle.set()
+
+    def shard_of(self, key: int) -> Shard:
+        return self.shards[0 if key in self.pinned else key % len(self.shards)]
+
+    async def route(self, raw: dict, body: Optional[bytes] = None):
+        """Отправляет апдейт воркеру его чата; body — исходный JSON, если он уже есть."""
+        key = chat_key(raw)
+        if body is None:
+            body = json.dumps(raw, ensure_ascii=False, separators=(",", ":")).encode()
+        shard = self.shard_of(key)
+        if shard.writer is None:
+            await shard.connected.wait()
+        shard.writer.writelines((_ROUTE.pack(_KEY.size + len(body), key), body))
+        shard.sent += 1
+        self.sent += 1
+        self._idle.clear()
+        if self.overloaded:
+            self._capacity.clear()
+        # Если воркер не успевает читать, ждем, пока буфер сокета разгрузится
+        await shard.writer.drain()
+
+    async def wait_capacity(self):
+        """Ждет, пока очередь воркеров опустится ниже max_pending."""
+        await self._capacity.wait()
+
+    async def join(self):
+        """Ждет обработки всех отправленных апдейтов."""
+        await self._idle.wait()
+
+    async def close(self, timeout: float = 30):
+        """Закрывает соединения (воркеры дорабатывают принятое и завершаются) и ждет процессы."""
+        self._closing = True
+        for shard in self.shards:
+            if shard.writer is not None:
+                shard.writer.write_eof()
+        deadline = time.monotonic() + timeout
+
+        def join_all():
+            for shard in self.shards:
+                if shard.process is not None:
+                    shard.process.join(max(0.0, deadline - time.monotonic()))
+
+        await asyncio.to_thread(join_all)
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                logging.warning(f"Worker {shard.index} did not stop in {timeout} s, killing")
+                shard.process.kill()
+            if shard.writer is not None:
+                shard.writer.close()
+        for task in list(self._readers):
+            task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "done": self.done,
+            "lost": self.lost,
+            "per_worker": [shard.sent for shard in self.shards],
+        }
+
+
+async def poll_updates(router: UpdateRouter, bot: Bot, stop: asyncio.Event):
+    """Long polling без разбора апдейтов: сырые апдейты из getUpdates сразу уходят воркерам."""
+    url = bot.session.api.api_url(token=bot.token, method="getUpdates")
+    params = {"timeout": POLL_TIMEOUT, "allowed_updates": used_update_types()}
+    timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+
+    async def loop(http: aiohttp.ClientSession):
+        backoff = 1
+        while True:
+            await router.wait_capacity()
+            try:
+                async with http.post(url, json=params) as response:
+                    payload = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logging.error(f"getUpdates failed: {e!r}, retrying in {backoff} s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            if not payload.get("ok"):
+                logging.error(f"getUpdates failed: {payload.get('description')}, retrying in {backoff} s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            for raw in payload["result"]:
+                await router.route(raw)
+                params["offset"] = raw["update_id"] + 1
+
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        polling = asyncio.create_task(loop(http))
+        stopping = asyncio.create_task(stop.wait())
+        await asyncio.wait({polling, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        polling.cancel()
+        stopping.cancel()
+        await asyncio.gather(polling, stopping, return_exceptions=True)
+        if polling.done() and not polling.cancelled() and polling.exception():
+            raise polling.exception()
+
+
+async def serve_webhook(router: UpdateRouter, bot: Bot, stop: asyncio.Event):
+    """Прием вебхуков во входном процессе: проверка секрета и пересылка тела запроса воркеру."""
+    async def handle(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        if router.overloaded:
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+        body = await request.read()
+        try:
+            raw = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(raw, dict):
+            return web.Response(status=400)
+        await router.route(raw, body)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    # Миниатюры товаров (их готовит и кладет на диск основной воркер)
+    images.add_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=used_update_types(),
+        max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100),
+    )
+    logging.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_sharded(workers: int, target: Optional[Callable] = None):
+    """Входной процесс: запускает воркеров и принимает апдейты до SIGINT/SIGTERM."""
+    # Схема создается и мигрирует здесь, до старта воркеров, чтобы они не делали это наперегонки
+    async with startup.phase("database"):
+        await pool.open()
+        try:
+            await init_db()
+        finally:
+            await pool.close()
+
+    bot = create_bot()
+    router = UpdateRouter(workers, target)
+    stop = _stop_event()
+    try:
+        # Воркеры запускаются (импорт и открытие базы — секунды), пока идут запросы к Bot API
+        calls = [startup.timed("get_me", bot.me())]
+        if BOT_MODE != "webhook":
+            # Сброс вебхуков при старте long-polling
+            calls.append(startup.timed("delete_webhook", bot.delete_webhook(drop_pending_updates=True)))
+        _, bot_info, *_ = await asyncio.gather(startup.timed("workers", router.start()), *calls)
+        startup.ready()
+        logging.info("Startup time by phase:\n" + startup.report())
+        if BOT_MODE == "webhook":
+            logging.info(f"Bot @{bot_info.username} is starting in webhook mode with {workers} workers...")
+            await serve_webhook(router, bot, stop)
+        else:
+            logging.info(f"Bot @{bot_info.username} is starting polling with {workers} workers...")
+            await poll_updates(router, bot, stop)
+    finally:
+        logging.info(f"Stopping workers ({router.pending} updates in progress)...")
+        await router.close()
+        await bot.session.close()
+
+
+class ShardWorker:
+    """Обработка апдейтов от входного процесса в воркере.
+
+    Апдейты одного чата идут строго по очереди, разных чатов — параллельно,
+    всего в работе и в очередях чатов не больше max_concurrency апдейтов
+    (дальше чтение из сокета останавливается, и входной процесс ждет).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, writer: asyncio.StreamWriter,
+                 max_concurrency: int = WEBHOOK_MAX_CONCURRENCY):
+        self.dp = dp
+        self.bot = bot
+        self.writer = writer
+        self.processed = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._chats: Dict[int, Deque[bytes]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._unacked = 0
+        self._reading: Optional[asyncio.Task] = None
+
+    async def serve(self, reader: asyncio.StreamReader):
+        """Читает апдейты до закрытия соединения (или stop()), затем дорабатывает принятые."""
+        self._reading = asyncio.create_task(self._read(reader))
+        try:
+            await self._reading
+        except asyncio.CancelledError:
+            if not self._reading.cancelled():
+                raise
+        if self._tasks:
+            logging.info(f"Draining {len(self._tasks)} chats...")
+            await asyncio.wait(set(self._tasks))
+        self._flush_acks()
+        await self.writer.drain()
+        self.writer.close()
+
+    def stop(self):
+        """Перестает читать новые апдейты."""
+        if self._reading is not None:
+            self._reading.cancel()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                frame = await reader.readexactly(length)
+                await self._slots.acquire()
+                key, = _KEY.unpack_from(frame)
+                body = frame[_KEY.size:]
+                queue = self._chats.get(key)
+                if queue is not None:
+                    queue.append(body)
+                    continue
+                self._chats[key] = deque()
+                task = asyncio.create_task(self._run_chat(key, body))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Входной процесс закрыл соединение: новых апдейтов не будет
+            pass
+
+    async def _run_chat(self, key: int, body: bytes):
+        queue = self._chats[key]
+        while True:
+            await self._process(body)
+            self._slots.release()
+            self._ack()
+            if not queue:
+                del self._chats[key]
+                return
+            body = queue.popleft()
+
+    async def _process(self, body: bytes):
+        try:
+            update = Update.model_validate_json(body, context={"bot": self.bot})
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logging.exception(f"Error processing update: {e}")
+
+    def _ack(self):
+        self.processed += 1
+        self._unacked += 1
+        if self._unacked == 1:
+            # Подтверждения за одну итерацию event loop уходят одним кадром
+            asyncio.get_running_loop().call_soon(self._flush_acks)
+
+    def _flush_acks(self):
+        if self._unacked and not self.writer.is_closing():
+            self.writer.write(_COUNT.pack(self._unacked))
+        self._unacked = 0
+
+
+async def _sync_catalog(interval: float = CATALOG_SYNC_INTERVAL):
+    """Подхватывает правки каталога, сделанные другими процессами."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await catalog.sync()
+        except Exception as e:
+            logging.error(f"Catalog sync failed: {e}")
+
+
+async def run_worker(index: int, count: int, port: int, bot: Optional[Bot] = None):
+    """Воркер: свой бот, диспетчер и пул соединений; апдейты — из входного процесса на port."""
+    bot = bot or create_bot()
+    # Глобальный лимит Bot API делится между воркерами; лимиты на чат — нет, чат живет в одном воркере
+    dp = create_dispatcher(bot, api_rate=BOT_API_RATE / count)
+    metrics_runner = None
+    try:
+        metrics_runner = await start_services(
+            bot, primary=index == 0, metrics_port=METRICS_PORT + index if METRICS_PORT else 0
+        )
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        worker = ShardWorker(dp, bot, writer)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker.stop)
+        except NotImplementedError:  # Windows
+            pass
+        sync = asyncio.create_task(_sync_catalog())
+        await dp.emit_startup(bot=bot)
+        writer.write(_COUNT.pack(index))
+        logging.info(f"Worker {index}/{count} ready")
+        try:
+            await worker.serve(reader)
+        finally:
+            sync.cancel()
+            await dp.emit_shutdown(bot=bot)
+        logging.info(f"Worker {index} stopped after {worker.processed} updates")
+    finally:
+        await stop_services(metrics_runner)
+        await bot.session.close()
+
+
+def worker_main(index: int, count: int, port: int):
+    """Точка входа процесса-воркера."""
+    setup_logging(WORKER_LOG_FORMAT)
+    # Ctrl+C получает вся группа процессов; воркер останавливается, когда входной процесс закроет соединение
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(run_worker(index, count, port))
@@ -0,0 +1,57 @@
+"""Замер холодного старта по фазам.
+
+Модуль импортируется первым в main.py (только стандартная библиотека), поэтому
+отсчет идет почти с запуска интерпретатора. Фазы бывают последовательные
+(mark — от предыдущей отметки до текущего момента) и параллельные (phase/timed —
+свое начало и длительность). report() печатает таблицу: когда фаза началась
+от старта процесса и сколько длилась.
+"""
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        # (фаза, начало от старта, длительность) в секундах
+        self.phases: List[Tuple[str, float, float]] = []
+        self.ready_at = None
+
+    def mark(self, name: str):
+        """Последовательная фаза: от предыдущей отметки до сейчас."""
+        now = time.perf_counter()
+        self.phases.append((name, self._last - self.started, now - self._last))
+        self._last = now
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        """Фаза, которая может идти одновременно с другими."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.started, time.perf_counter() - start))
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        async with self.phase(name):
+            return await awaitable
+
+    def ready(self):
+        """Бот начинает принимать апдейты."""
+        self.ready_at = time.perf_counter() - self.started
+        self._last = time.perf_counter()
+
+    def report(self) -> str:
+        lines = [f"{'phase':<16} {'start ms':>9} {'took ms':>9}"]
+        for name, start, took in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"{name:<16} {start * 1000:>9.0f} {took * 1000:>9.0f}")
+        if self.ready_at is not None:
+            lines.append(f"{'ready':<16} {self.ready_at * 1000:>9.0f}")
+        return "\n".join(lines)
+
+
+startup = StartupTimer()
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import signal
+from typing import Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from core.config import (
+    WEBHOOK_BASE_URL, WEBHOOK_HOST, WEBHOOK_MAX_CONCURRENCY, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+)
+from utils.images import images
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Прием апдейтов через aiohttp вместо long polling.
+
+    Апдейт подтверждается сразу (200 OK), а обработка уходит в отдельную задачу.
+    Одновременно обрабатывается не больше max_concurrency апдейтов; если очередь
+    ожидающих переполнена, отвечаем 503 — Telegram повторит доставку позже.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: Optional[str] = WEBHOOK_SECRET,
+                 max_concurrency: int = WEBHOOK_MAX_CONCURRENCY, max_pending: Optional[int] = None):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.max_pending = max_pending or max_concurrency * 10
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._accepting = True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        if not self._accepting or len(self._tasks) >= self.max_pending:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logging.exception(f"Error processing webhook update {update.update_id}: {e}")
+
+    async def drain(self, timeout: float = 30.0):
+        """Перестает принимать апдейты и дожидается уже принятых."""
+        self._accepting = False
+        if self._tasks:
+            logging.info(f"Draining {len(self._tasks)} webhook updates...")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def build_app(self, path: str = WEBHOOK_PATH) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        # Миниатюры товаров для inline-режима
+        images.add_routes(app)
+        return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **workflow_data):
+    """Запускает aiohttp-сервер, регистрирует вебхук и работает до SIGINT/SIGTERM."""
+    server = WebhookServer(dp, bot)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100),
+    )
+    await dp.emit_startup(bot=bot, **workflow_data)
+    logging.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await server.drain()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()